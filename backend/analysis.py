@@ -1,13 +1,14 @@
 import json
-import datetime
 import re
-import math
+import threading
 import google.generativeai as genai
-import yfinance as yf
-import pandas as pd
 import numpy as np
 import warnings
-from config import GEMINI_API_KEY, VWAP_BANDS, RSI_PERIOD, MACRO_TICKERS, SECTOR_TICKERS, CALENDAR_EVENTS
+from config import GEMINI_API_KEY, PROMPT_VERSION, EMBEDDING_MODEL, EMBEDDING_DTYPE
+from llm_cache import LLM_CACHE, content_key
+from embeddings import encode_embedding
+from indicators import TickerIndicatorState
+from fetch_scheduler import SCHEDULER
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
@@ -25,23 +26,28 @@ def clean_json_string(text):
     return text
 
 def get_text_embedding(text):
+    """Returns the embedding as a binary blob (see embeddings.py), or None."""
     try:
         if not text: return None
-        result = genai.embed_content(model="models/text-embedding-004", content=text)
-        return json.dumps(result['embedding']) 
+        key = content_key("embedding", f"{EMBEDDING_MODEL}:{EMBEDDING_DTYPE}", text)
+        cached = LLM_CACHE.get("embedding", key)
+        if cached is not None: return cached
+        result = genai.embed_content(model=EMBEDDING_MODEL, content=text)
+        embedding = encode_embedding(result['embedding'])
+        LLM_CACHE.put("embedding", key, embedding)
+        return embedding
     except Exception: return None
 
-def get_gemini_analysis(title, body, source_app):
-    prompt = f"""
-    You are a Financial Data Labeling Engine & Analyst.
-    INPUT: Source: {source_app}, Title: "{title}", Body: "{body}"
-    
-    GOAL: 
-    1. Create a clean, objective dataset for training a future ML model.
-    2. Provide a quick, actionable overview for an intraday trader.
+def analysis_cache_key(title, body):
+    # Source app is left out on purpose: identical wire headlines from different apps share an entry
+    return content_key("analysis", PROMPT_VERSION, title, body)
 
-    OUTPUT JSON format (Strict):
-    {{
+def get_cached_analysis(title, body):
+    cached = LLM_CACHE.get("analysis", analysis_cache_key(title, body))
+    return json.loads(cached) if cached is not None else None
+
+# Fields every analysis object carries (shared by the single and batched prompts)
+ANALYSIS_FIELDS = """
       "headline": "<Concise, neutral summary of the event (max 15 words)>",
       "category": "EARNINGS" | "MACRO" | "CENTRAL_BANK" | "GEOPOLITICS" | "M_AND_A" | "REGULATION" | "TECHNICALS" | "SENTIMENT" | "CRYPTO" | "OTHER",
       "sentiment_label": "BULLISH" | "BEARISH" | "NEUTRAL",
@@ -51,19 +57,81 @@ def get_gemini_analysis(title, body, source_app):
       "key_takeaway": "<One sentence actionable takeaway for a trader>",
       "confidence": 1-10 (Confidence in your analysis),
       "ml_tags": ["earnings_beat", "guidance_raise", "fed_speak", "inflation_data"] (List of specific tags for ML filtering)
-    }}
+"""
+
+def get_gemini_analysis(title, body, source_app):
+    prompt = f"""
+    You are a Financial Data Labeling Engine & Analyst.
+    INPUT: Source: {source_app}, Title: "{title}", Body: "{body}"
+    
+    GOAL: 
+    1. Create a clean, objective dataset for training a future ML model.
+    2. Provide a quick, actionable overview for an intraday trader.
+
+    OUTPUT JSON format (Strict):
+    {{{ANALYSIS_FIELDS}    }}
     """
+    cached = get_cached_analysis(title, body)
+    if cached is not None: return cached, "cache"
     try:
         response = model.generate_content(prompt)
         raw_text = response.text
         cleaned_text = clean_json_string(raw_text)
         data = json.loads(cleaned_text)
         if isinstance(data, list): data = data[0] if data else {}
+        if data: LLM_CACHE.put("analysis", analysis_cache_key(title, body), json.dumps(data))
         return data, raw_text
     except Exception as e:
         print(f"❌ Gemini Error: {e}")
         return None, str(e)
 
+def get_gemini_analysis_batch(items):
+    """
+    Analyses several headlines in one request.
+    items: [(item_id, title, body, source_app)]
+    Returns ({item_id: analysis}, raw_text); ids missing from the reply (or an
+    unparseable reply) are simply absent, so the caller can retry them one by one.
+    Cached items are answered from the cache and left out of the request.
+    """
+    results = {}
+    payload = []
+    for item_id, title, body, source_app in items:
+        cached = get_cached_analysis(title, body)
+        if cached is not None:
+            results[str(item_id)] = cached
+        else:
+            payload.append({"id": str(item_id), "source": source_app, "title": title, "body": body})
+    if not payload: return results, "cache"
+    prompt = f"""
+    You are a Financial Data Labeling Engine & Analyst.
+    INPUT: A JSON array of {len(payload)} news items, each with an "id":
+    {json.dumps(payload, ensure_ascii=False)}
+    
+    GOAL: 
+    1. Create a clean, objective dataset for training a future ML model.
+    2. Provide a quick, actionable overview for an intraday trader.
+    Analyse every item independently.
+
+    OUTPUT JSON format (Strict): an array with exactly one object per input item:
+    [{{
+      "id": "<id of the input item>",{ANALYSIS_FIELDS}    }}]
+    """
+    try:
+        response = model.generate_content(prompt)
+        raw_text = response.text
+        data = json.loads(clean_json_string(raw_text))
+        if isinstance(data, dict): data = data.get("items", [data])
+        wanted = {p["id"]: p for p in payload}
+        for entry in data:
+            if isinstance(entry, dict) and str(entry.get("id")) in wanted:
+                item = wanted[str(entry.pop("id"))]
+                results[item["id"]] = entry
+                LLM_CACHE.put("analysis", analysis_cache_key(item["title"], item["body"]), json.dumps(entry))
+        return results, raw_text
+    except Exception as e:
+        print(f"❌ Gemini Batch Error: {e}")
+        return results, str(e)
+
 def calculate_rsi(series, period=14):
     delta = series.diff()
     gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
@@ -72,37 +140,38 @@ def calculate_rsi(series, period=14):
     rs = gain / loss
     return 100 - (100 / (1 + rs))
 
+# Rolling-VWAP state per ticker so repeated confluence checks only feed new bars
+CONFLUENCE_STATES = {}
+CONFLUENCE_LOCK = threading.Lock()
+CONFLUENCE_VWAP_WINDOW = 26
+
 def get_technical_confluence(ticker):
     try:
-        df = yf.download(ticker, period='5d', interval='15m', progress=False)
+        # Shares the monitor's 15m downloads (store includes pre/post-market bars)
+        df = SCHEDULER.get([ticker], '15m', '5d')
         if df.empty or len(df) < 50: return None
-        if isinstance(df.columns, pd.MultiIndex):
-            try: df.columns = df.columns.get_level_values(0)
-            except: pass
-
-        df['Typical_Price'] = (df['High'] + df['Low'] + df['Close']) / 3
-        df['TP_V'] = df['Typical_Price'] * df['Volume']
-        df['VWAP'] = (df['TP_V'].rolling(window=26).sum() / df['Volume'].rolling(window=26).sum())
-        
-        rolling_std = df['Close'].rolling(window=26).std()
-        df['Upper_Band'] = df['VWAP'] + (rolling_std * VWAP_BANDS)
-        df['Lower_Band'] = df['VWAP'] - (rolling_std * VWAP_BANDS)
-        df['RSI'] = calculate_rsi(df['Close'], RSI_PERIOD)
-        df['Avg_Vol'] = df['Volume'].rolling(window=20).mean()
-        df['RVOL'] = df['Volume'] / df['Avg_Vol']
-
-        current_date = df.index[-1].date()
-        day_data = df[df.index.date == current_date]
-        daily_change = 0.0
-        if not day_data.empty:
-            open_price = float(day_data['Open'].iloc[0])
-            close_price = float(day_data['Close'].iloc[-1])
-            if open_price != 0 and not math.isnan(open_price):
-                daily_change = ((close_price - open_price) / open_price) * 100
-
-        result = df.iloc[-1].to_dict()
-        result['daily_change'] = daily_change
-        return result
-    except Exception: return None
 
+        df = df[ticker][['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
+        # Callers run on several worker threads: one of them feeds a ticker's state at a time
+        with CONFLUENCE_LOCK:
+            state = CONFLUENCE_STATES.get(ticker)
+            if state is None or state.last_ts is None or state.last_ts < df.index[0]:
+                state = CONFLUENCE_STATES[ticker] = TickerIndicatorState(vwap_window=CONFLUENCE_VWAP_WINDOW)
+            else:
+                df = df[df.index >= state.last_ts]
 
+            for ts, row in zip(df.index, df.itertuples(index=False)):
+                state.update(ts, row.Open, row.High, row.Low, row.Close, row.Volume)
+            snap = state.snapshot()
+
+        if snap is None or snap['bars'] < 50: return None
+        return {
+            'Open': snap['open'], 'High': snap['high'], 'Low': snap['low'],
+            'Close': snap['close'], 'Volume': snap['volume'],
+            'VWAP': snap['vwap'],
+            'Upper_Band': snap['upper_band'], 'Lower_Band': snap['lower_band'],
+            'RSI': snap['rsi'],
+            'Avg_Vol': snap['avg_volume'], 'RVOL': snap['rvol'],
+            'daily_change': snap['daily_change'],
+        }
+    except Exception: return None
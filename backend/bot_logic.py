@@ -1,85 +1,359 @@
-import queue
 import time
 import threading
-from config import MIN_IMPACT_SCORE
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
+from config import (
+    MIN_IMPACT_SCORE, NOVELTY_GATE_SOURCE, NEWS_WORKERS, LLM_MAX_INFLIGHT, EMBEDDING_TIMEOUT, ANALYSIS_TIMEOUT,
+    GEMINI_BATCH_SIZE, GEMINI_BATCH_WAIT_MS
+)
 from database import log_news_event, safe_round
-from analysis import get_gemini_analysis, get_text_embedding
+from analysis import get_gemini_analysis, get_gemini_analysis_batch, get_text_embedding, get_cached_analysis
+from dedup import NearDuplicateIndex
+from vector_index import index_logged_item
+from embeddings import decode_embedding
+from novelty import NOVELTY
 from notifications import send_news_alert
+from news_queue import PriorityNewsQueue
+from inbox import NewsInbox
+from prefilter import PREFILTER
+from entities import task_entities
 import monitor
+import metrics
 
-NEWS_QUEUE = queue.Queue()
+# Every ingested item is recorded durably until enriched (see inbox.py)
+INBOX = NewsInbox()
+# Priority queue (see news_queue.py): breaking headlines jump ahead of app chatter
+NEWS_QUEUE = PriorityNewsQueue(on_shed=INBOX.shed, on_digest=INBOX.append)
 
-def process_news_queue():
-    print("👷 News Worker Thread Started")
-    while True:
+# Bounds concurrent Gemini/embedding calls across all workers (API quota)
+LLM_SLOTS = threading.BoundedSemaphore(LLM_MAX_INFLIGHT)
+# Runs each item's embedding and Gemini calls side by side
+ENRICH_POOL = ThreadPoolExecutor(max_workers=NEWS_WORKERS * 2, thread_name_prefix="enrich")
+
+# Items with the same ordering key (an updated notification for the same headline)
+# are processed one after another, in arrival order; everything else runs in parallel.
+LANES = {}        # key -> deque of tasks waiting behind the one in flight
+LANES_LOCK = threading.Lock()
+INFLIGHT = 0      # Items currently being enriched
+
+metrics.register_gauge("news.queue_depth", lambda: NEWS_QUEUE.qsize())
+metrics.register_gauge("news.queue_depth_by_priority", lambda: NEWS_QUEUE.depth_by_band())
+metrics.register_gauge("news.inflight", lambda: INFLIGHT)
+metrics.register_gauge("news.inbox", INBOX.counts)
+metrics.register_gauge("prefilter", PREFILTER.report)
+
+# Queue priority of items the pre-filter defers: behind everything else, first to be shed
+DEFERRED_PRIORITY = 0.0
+
+class RetryLater(Exception):
+    """Enrichment failed and the inbox will retry the item; nothing was logged."""
+
+def submit_news(task):
+    """Ingestor entry point: records the item in the inbox, pre-filters it, then queues it."""
+    INBOX.append(task)
+    decision, reason = PREFILTER.classify(task)
+    if decision == "skip":
+        INBOX.complete(task, "skipped")
+        print(f"🧹 Pre-filter skipped ({reason}): {task.get('source')} - {task.get('title', '')[:40]}")
+        return False
+    if decision == "defer": task["priority"] = DEFERRED_PRIORITY
+    return NEWS_QUEUE.put(task)
+
+def ordering_key(task):
+    return (task.get("source"), task.get("package"), task.get("title"))
+
+class GeminiBatcher:
+    """
+    Collects concurrent analysis requests into Gemini calls, with up to max_inflight calls
+    running at once on its own pool. When no call is in flight a request is sent straight
+    away; otherwise requests arriving during the round trip are grouped, and a batch is
+    sent once max_items are waiting or max_wait has passed since the first one arrived.
+    Each submit() future resolves to (analysis, raw), or to None when the item was
+    missing from the batch reply; the caller then makes a single call.
+    """
+
+    def __init__(self, max_items, max_wait, max_inflight=LLM_MAX_INFLIGHT):
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self.max_inflight = max_inflight
+        self._pending = []
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="gemini-batch")
+
+    def submit(self, title, body, source_app):
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="gemini-batcher", daemon=True)
+                self._thread.start()
+            self._pending.append((future, title, body, source_app, time.time()))
+            self._cond.notify_all()
+        return future
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending or self._inflight >= self.max_inflight:
+                self._cond.wait()
+            # Idle (nothing in flight): waiting would only add latency
+            deadline = self._pending[0][-1] + self.max_wait
+            while len(self._pending) < self.max_items and self._inflight and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+            batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+            self._inflight += 1
+        return batch
+
+    def _run(self):
+        while True:
+            self._pool.submit(self._call, self._take_batch())
+
+    def _call(self, batch):
         try:
-            # Task is now a DICTIONARY
-            task = NEWS_QUEUE.get()
-            
-            # --- EXTRACT RICH METADATA ---
-            title = task.get("title", "")
-            body = task.get("body", "")
-            source_app = task.get("source", "Unknown")
-            
-            if not title and body: title = body[:50]
-
-            vix, sector_json = monitor.get_market_regime_from_cache()
-            
-            # Get Macro Context
-            macro_data = {}
-            with monitor.DATA_LOCK:
-                macro_data = monitor.LATEST_MACRO_CONTEXT.copy()
-
-            session = monitor.get_session_phase()
-            full_text = f"{title} {body}"
-            embedding = get_text_embedding(full_text)
-            
-            print(f"🔍 Analyzing: {title[:40]}...")
-            analysis, raw_resp = get_gemini_analysis(title, body, source_app)
-            
-            micro_regime = {}
-            # Handle new list format for tickers
-            target_ticker = None
-            if analysis and analysis.get("tickers") and isinstance(analysis["tickers"], list) and len(analysis["tickers"]) > 0:
-                target_ticker = analysis["tickers"][0]
-            elif analysis and analysis.get("ticker"): # Fallback
-                target_ticker = analysis.get("ticker")
-
-            if target_ticker:
-                with monitor.DATA_LOCK:
-                    if target_ticker in monitor.LATEST_VWAP_DATA:
-                        td = monitor.LATEST_VWAP_DATA[target_ticker]
-                        vwap_dist = 0
-                        p, v = td.get('price', 0), td.get('vwap', 0)
-                        if v != 0: vwap_dist = (p - v) / v
-                        micro_regime = {
-                            "rsi": td.get('rsi'),
-                            "rvol": td.get('rvol'),
-                            "vwap_dist": safe_round(vwap_dist * 100, 2)
-                        }
-
-            if analysis:
-                log_news_event(
-                    task, 
-                    analysis,
-                    embedding=embedding,
-                    macro_context=macro_data,
-                    micro_regime=micro_regime,
-                    session_phase=session,
-                    sector_json=sector_json
-                )
-                if analysis.get("impact_score", 0) >= MIN_IMPACT_SCORE:
-                    # Filter: High Impact OR High Novelty
-                    impact = analysis.get("impact_score", 0)
-                    novelty = analysis.get("novelty_score", 0)
-                    
-                    from config import IMPACT_THRESHOLD_HIGH, NOVELTY_THRESHOLD_HIGH
-                    
-                    if impact >= IMPACT_THRESHOLD_HIGH or novelty >= NOVELTY_THRESHOLD_HIGH:
-                        send_news_alert(analysis, title, source_app)
-                    else:
-                        print(f"📉 Skipped Low Impact/Novelty: Impact={impact}, Novelty={novelty}")
-            time.sleep(0.5)
-            NEWS_QUEUE.task_done()
-        except Exception as e:
-            print(f"⚠️ Worker Error: {e}")
\ No newline at end of file
+            if len(batch) == 1:
+                future, title, body, source_app, _ = batch[0]
+                try:
+                    with LLM_SLOTS, metrics.timed("news.gemini"):
+                        future.set_result(get_gemini_analysis(title, body, source_app))
+                except Exception as e:
+                    future.set_exception(e)
+                return
+            results = {}
+            items = [(i, title, body, source_app) for i, (_, title, body, source_app, _) in enumerate(batch)]
+            try:
+                with LLM_SLOTS, metrics.timed("news.gemini_batch"):
+                    results, _ = get_gemini_analysis_batch(items)
+                metrics.incr("gemini.batch_calls")
+                metrics.incr("gemini.batched_items", len(results))
+            except Exception as e:
+                print(f"⚠️ Gemini batch failed, falling back to single calls: {e}")
+            for i, (future, *_) in enumerate(batch):
+                analysis = results.get(str(i))
+                future.set_result((analysis, "batch") if analysis else None)
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+GEMINI_BATCHER = GeminiBatcher(GEMINI_BATCH_SIZE, GEMINI_BATCH_WAIT_MS / 1000)
+
+# Rewordings of a story seen within DEDUP_WINDOW reuse its analysis instead of calling Gemini
+STORY_INDEX = NearDuplicateIndex()
+
+def _embed(text):
+    with LLM_SLOTS, metrics.timed("news.embedding"):
+        return get_text_embedding(text)
+
+def _analyze(title, body, source_app):
+    # Repeats of a known headline skip the batch wait entirely
+    cached = get_cached_analysis(title, body)
+    if cached is not None: return cached, "cache"
+    if GEMINI_BATCHER.max_items > 1:
+        result = GEMINI_BATCHER.submit(title, body, source_app).result()
+        if result is not None: return result
+    # Batching disabled, or the batch reply didn't cover it
+    with LLM_SLOTS, metrics.timed("news.gemini"):
+        return get_gemini_analysis(title, body, source_app)
+
+def _stage_result(future, deadline, stage, errors):
+    """Waits for a stage until deadline; a failure or timeout is recorded in errors."""
+    try:
+        return future.result(timeout=max(0, deadline - time.time()))
+    except FutureTimeout:
+        # The call keeps running in the pool; its result is dropped
+        errors.append(f"{stage}: timeout")
+        metrics.incr(f"news.{stage}_timeouts")
+    except Exception as e:
+        errors.append(f"{stage}: {e}")
+    return None
+
+def _reuse_cluster_analysis(cluster, title, body, source_app, deadline, errors):
+    """
+    Waits on the worker thread itself, never on ENRICH_POOL: a burst of near-duplicates
+    must not take the threads their leader's analysis needs.
+    """
+    analysis, _ = cluster.wait(max(0, deadline - time.time()))
+    if analysis is None and time.time() >= deadline:
+        errors.append("analysis: timeout")
+        metrics.incr("news.analysis_timeouts")
+        return None
+    if analysis is None:
+        # The cluster's first story got no analysis: analyse this copy instead
+        return _stage_result(ENRICH_POOL.submit(_analyze, title, body, source_app), deadline, "analysis", errors)
+    metrics.incr("news.near_duplicates")
+    return dict(analysis), "duplicate"
+
+def _micro_regime(snapshot, tickers):
+    """RSI/RVOL/VWAP distance of the first ticker with live VWAP data, and that ticker."""
+    for ticker in tickers:
+        td = snapshot.vwap.get(ticker)
+        if not td: continue
+        vwap_dist = 0
+        p, v = td.get('price', 0), td.get('vwap', 0)
+        if v != 0: vwap_dist = (p - v) / v
+        return {
+            "rsi": td.get('rsi'),
+            "rvol": td.get('rvol'),
+            "vwap_dist": safe_round(vwap_dist * 100, 2)
+        }, ticker
+    return {}, None
+
+def process_news_item(task):
+    cluster, is_leader = STORY_INDEX.assign(f"{task.get('title', '')} {task.get('body', '')}")
+    result = (None, None)
+    try:
+        result = enrich_news_item(task, cluster, is_leader)
+    finally:
+        # Near-duplicates waiting on this story get its analysis (or None, and analyse themselves)
+        if is_leader: cluster.resolve(*result)
+    return result
+
+def enrich_news_item(task, cluster, is_leader):
+    """Enriches, logs and alerts one item. Returns (analysis, log id)."""
+    # --- EXTRACT RICH METADATA ---
+    title = task.get("title", "")
+    body = task.get("body", "")
+    source_app = task.get("source", "Unknown")
+    
+    if not title and body: title = body[:50]
+
+    # Embedding and Gemini are independent round-trips: start both, then read the regime meanwhile
+    start = time.time()
+    full_text = f"{title} {body}"
+    embedding_future = ENRICH_POOL.submit(_embed, full_text)
+    if is_leader:
+        print(f"🔍 Analyzing: {title[:40]}...")
+        analysis_future = ENRICH_POOL.submit(_analyze, title, body, source_app)
+    else:
+        print(f"🔁 Near-duplicate, reusing cluster {cluster.id}: {title[:40]}...")
+
+    # One snapshot per item: regime, macro and micro context all come from the same cycle
+    snapshot = monitor.current_snapshot()
+    vix, sector_json = snapshot.vix, snapshot.heatmap_json
+    
+    # Get Macro Context
+    macro_data = dict(snapshot.macro)
+
+    session = monitor.get_session_phase()
+
+    # Tickers found locally give the micro regime without waiting for Gemini
+    local_tickers = [t for t in task_entities(task) if t != "MACRO"]
+    micro_regime, regime_ticker = _micro_regime(snapshot, local_tickers)
+
+    errors = []
+    embedding = _stage_result(embedding_future, start + EMBEDDING_TIMEOUT, "embedding", errors)
+    if embedding is None and not errors: errors.append("embedding: unavailable")
+    # Local novelty only needs the embedding, so it is ready before Gemini answers
+    vector = decode_embedding(embedding) if embedding is not None else None
+    local_novelty = NOVELTY.score(vector)
+    if is_leader:
+        analysis_result = _stage_result(analysis_future, start + ANALYSIS_TIMEOUT, "analysis", errors)
+    else:
+        analysis_result = _reuse_cluster_analysis(cluster, title, body, source_app, start + ANALYSIS_TIMEOUT, errors)
+    analysis, raw_resp = analysis_result or (None, None)
+    if analysis is None and raw_resp: errors.append(f"analysis: {raw_resp}")
+    if analysis is None and INBOX.will_retry(task):
+        # Logged once it succeeds (or as PARTIAL on its last attempt)
+        raise RetryLater("; ".join(errors) or "analysis unavailable")
+    NOVELTY.add(vector)
+    duplicate_of = cluster.log_id if raw_resp == "duplicate" else None
+    
+    # Handle new list format for tickers
+    target_ticker = None
+    if analysis and analysis.get("tickers") and isinstance(analysis["tickers"], list) and len(analysis["tickers"]) > 0:
+        target_ticker = analysis["tickers"][0]
+    elif analysis and analysis.get("ticker"): # Fallback
+        target_ticker = analysis.get("ticker")
+
+    # Gemini's primary ticker wins when it has live data
+    if target_ticker and target_ticker != regime_ticker and target_ticker in snapshot.vwap:
+        micro_regime, regime_ticker = _micro_regime(snapshot, [target_ticker])
+
+    # Partial items are still logged; error_msg names the missing stage(s)
+    log_id = log_news_event(
+        task, 
+        analysis or {},
+        embedding=embedding,
+        macro_context=macro_data,
+        micro_regime=micro_regime,
+        session_phase=session,
+        sector_json=sector_json,
+        status="SUCCESS" if analysis else "PARTIAL",
+        error_msg="; ".join(errors) or None,
+        cluster_id=cluster.id,
+        duplicate_of=duplicate_of,
+        local_novelty_score=local_novelty
+    )
+    if log_id and embedding: index_logged_item(log_id, embedding)
+    if errors:
+        print(f"⚠️ Partial enrichment for '{title[:40]}': {'; '.join(errors)}")
+
+    # Near-duplicates were alerted (or not) with their cluster's first story
+    if analysis and raw_resp != "duplicate" and analysis.get("impact_score", 0) >= MIN_IMPACT_SCORE:
+        # Filter: High Impact OR High Novelty
+        impact = analysis.get("impact_score", 0)
+        novelty = analysis.get("novelty_score", 0)
+        if NOVELTY_GATE_SOURCE == "local" and local_novelty is not None:
+            novelty = local_novelty
+        
+        from config import IMPACT_THRESHOLD_HIGH, NOVELTY_THRESHOLD_HIGH
+        
+        if impact >= IMPACT_THRESHOLD_HIGH or novelty >= NOVELTY_THRESHOLD_HIGH:
+            send_news_alert(analysis, title, source_app, tickers=local_tickers)
+        else:
+            print(f"📉 Skipped Low Impact/Novelty: Impact={impact}, Novelty={novelty}")
+    return analysis, log_id
+
+def _run_task(task, news_queue):
+    global INFLIGHT
+    with LANES_LOCK:
+        INFLIGHT += 1
+    try:
+        analysis, _ = process_news_item(task)
+        metrics.incr("news.processed")
+        if analysis is None: INBOX.fail(task, "analysis unavailable (logged as PARTIAL)")
+        else: INBOX.complete(task)
+    except RetryLater as e:
+        INBOX.fail(task, str(e))
+    except Exception as e:
+        metrics.incr("news.errors")
+        print(f"⚠️ Worker Error: {e}")
+        INBOX.fail(task, str(e))
+    finally:
+        with LANES_LOCK:
+            INFLIGHT -= 1
+        # End-to-end: from the ingestor receiving the notification to done
+        if task.get("received_at"):
+            metrics.observe("news.end_to_end", time.time() - task["received_at"])
+        news_queue.task_done()
+
+def _news_worker(news_queue):
+    while True:
+        task = news_queue.get()
+        key = ordering_key(task)
+        with LANES_LOCK:
+            if key in LANES:
+                # Same story already in flight on another worker: it picks this up next
+                LANES[key].append(task)
+                continue
+            LANES[key] = deque()
+
+        while task is not None:
+            _run_task(task, news_queue)
+            with LANES_LOCK:
+                lane = LANES[key]
+                if lane:
+                    task = lane.popleft()
+                else:
+                    del LANES[key]
+                    task = None
+
+def process_news_queue(workers=NEWS_WORKERS, news_queue=None):
+    """Runs the enrichment pool: workers-1 extra threads plus the calling thread."""
+    if news_queue is None: news_queue = NEWS_QUEUE
+    # Recovered items from a previous run and due retries re-enter the live queue
+    if news_queue is NEWS_QUEUE: INBOX.start_pump(news_queue)
+    print(f"👷 News Worker Pool Started ({workers} workers, {LLM_MAX_INFLIGHT} LLM calls in flight)")
+    for i in range(workers - 1):
+        threading.Thread(target=_news_worker, args=(news_queue,), name=f"news-worker-{i + 1}", daemon=True).start()
+    _news_worker(news_queue)
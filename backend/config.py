@@ -10,21 +10,149 @@ DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
 
 # Pushbullet Config
 PUSHBULLET_STREAM_URL = os.getenv("PUSHBULLET_STREAM_URL", "wss://stream.pushbullet.com/websocket/")
-PUSHBULLET_API_URL = os.getenv("PUSHBULLET_API_URL", "https://api.pushbullet.com/v2/pushes?limit=1")
+# Query strings (e.g. an old "?limit=1") are ignored: the ingestor pages with its own parameters
+PUSHBULLET_API_URL = os.getenv("PUSHBULLET_API_URL", "https://api.pushbullet.com/v2/pushes").split("?")[0]
+PUSHBULLET_PAGE_LIMIT = 100      # Pushes per page when catching up
+PUSHBULLET_FETCH_TIMEOUT = 10    # Seconds per request
+PUSHBULLET_SEEN_IDENS = 2000     # Recent push idens remembered for dedup
+PUSHBULLET_FETCH_WORKERS = 2     # Threads fetching pushes for tickles (off the websocket thread)
+PUSHBULLET_LOG_LEVEL = os.getenv("PUSHBULLET_LOG_LEVEL", "INFO")  # DEBUG also logs raw frames
+
+# Discord alert dispatcher (webhooks allow ~30 messages/minute and 10 embeds per message)
+ALERT_COALESCE_MS = 500       # Alerts queued within this window share one webhook call
+ALERT_MAX_EMBEDS = 10
+ALERT_MAX_CHARS = 6000        # Discord's limit on the total text of all embeds in one message
+ALERT_RATE_PER_SEC = 0.5      # Token bucket refill
+ALERT_BURST = 5               # Token bucket size
+ALERT_MAX_RETRIES = 3         # Transient failures (5xx, network) before an alert is dropped
+ALERT_RETRY_BACKOFF = 2.0     # Seconds, doubled per attempt
+ALERT_OUTBOX_SIZE = 200       # Alerts waiting to be sent; the oldest is dropped beyond this
+ALERT_TIMEOUT = 10            # Seconds per request
 
 # Database Config
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_FILE = os.path.join(BASE_DIR, "market_mind.db")
+DB_FILE = os.getenv("MARKET_MIND_DB", os.path.join(BASE_DIR, "market_mind.db"))
+# All writes go through one writer thread: requests arriving within DB_WRITE_BATCH_MS share a transaction
+DB_WRITE_BATCH_MS = 2
+DB_WRITE_MAX_BATCH = 500
+
+# Market Data Provider ("yfinance" or "replay" for offline load tests / benchmarks)
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+REPLAY_FILE = os.getenv("REPLAY_FILE", os.path.join(BASE_DIR, "replay_bars.csv"))
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "1.0"))  # <= 0: step mode, as fast as possible
+REPLAY_START = os.getenv("REPLAY_START")  # ISO timestamp; default 5 days after the first bar
 
 # Analysis Config
 MIN_IMPACT_SCORE = 6
 IMPACT_THRESHOLD_HIGH = 8
 NOVELTY_THRESHOLD_HIGH = 8
+# Novelty used by the alert gate: "llm" (Gemini's novelty_score) or, opt-in until
+# NOVELTY_BASELINE_SIM is calibrated against logged events, "local" (embedding distance
+# to recent items, instant). Local falls back to the LLM's when there's no embedding.
+NOVELTY_GATE_SOURCE = os.getenv("NOVELTY_GATE_SOURCE", "llm")
+NOVELTY_WINDOW = 72 * 3600      # Seconds of history compared against
+NOVELTY_HALF_LIFE = 6 * 3600    # A match this old counts half as much
+NOVELTY_BASELINE_SIM = 0.5      # Cosine similarity of unrelated headlines (scores 10)
 PUSHBULLET_HEARTBEAT_TIMEOUT = 60 # Seconds
 
-VWAP_CHECK_INTERVAL = 900
+# News queue: bounded priority queue in front of the enrichment pool
+NEWS_QUEUE_CAPACITY = int(os.getenv("NEWS_QUEUE_CAPACITY", "500"))
+NEWS_SHED_POLICY = os.getenv("NEWS_SHED_POLICY", "summarize")  # When full: "drop" or "summarize" low-priority items
+NEWS_LOW_PRIORITY = 2.0    # Below this an item may be shed when the queue is full
+NEWS_HIGH_PRIORITY = 4.0   # Reported as the "high" band in metrics
+NEWS_SOURCE_PRIORITY = {   # Base priority per source app (default 1.0)
+    "Bloomberg": 3.0, "Reuters": 3.0, "Dow Jones": 3.0, "WSJ": 2.5, "CNBC": 2.0,
+    "Financial Times": 2.0, "MarketWatch": 1.5, "Twitter": 1.5, "X": 1.5,
+}
+NEWS_PRIORITY_KEYWORDS = [
+    "breaking", "the fed", "fed chair", "fomc", "powell", "rate cut", "rate hike", "cpi", "pce", "inflation",
+    "payrolls", "nfp", "jobs report", "gdp", "halted", "trading halt", "guidance", "downgrade", "upgrade",
+    "tariff", "sanctions", "war", "default", "bankruptcy", "merger", "acquire", "earnings",
+]
+
+# Pre-filter: local triage before the LLM (skip / defer / analyze)
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "1") == "1"
+PREFILTER_ALLOW_SOURCES = ["Bloomberg", "Reuters", "Dow Jones", "WSJ", "CNBC", "Financial Times", "MarketWatch",
+                           "Pushbullet", "Twitter", "X"]
+PREFILTER_DENY_SOURCES = [s.strip() for s in os.getenv(
+    "PREFILTER_DENY_SOURCES",
+    "Amazon Shopping,Uber,Uber Eats,DoorDash,Instacart,Google Play Store,Android System,Clock,Digital Wellbeing"
+).split(",") if s.strip()]
+PREFILTER_NOISE_PATTERNS = [
+    r"\byour (order|package|parcel|delivery|ride|driver)\b", r"\bout for delivery\b", r"\bhas (shipped|been delivered)\b",
+    r"\b\d{1,2}% off\b", r"\bpromo code\b", r"\bcoupon\b", r"\bflash sale\b", r"\bfree shipping\b",
+    r"\bverification code\b", r"\bone-time (pass)?code\b", r"\botp\b", r"\bsign-in attempt\b", r"\bpassword reset\b",
+    r"\bliked your\b", r"\bcommented on your\b", r"\bstarted following you\b", r"\bsent you a (message|photo|video)\b",
+    r"\bbattery (low|saver)\b", r"\bbackup complete\b", r"\bsoftware update\b",
+]
+PREFILTER_SKIP_BELOW = 0.05     # Model probability of relevance below which items are skipped (upper bound)
+PREFILTER_DEFER_BELOW = 0.2     # ...and below which they are deferred behind everything else
+PREFILTER_MAX_MISSED = 0.02     # Share of held-out relevant items the skip threshold may lose
+PREFILTER_MIN_TRAIN_ROWS = 200  # Labelled logs needed before the model is used
+PREFILTER_TRAIN_ROWS = 20_000   # Latest logs used for training
+PREFILTER_RETRAIN_INTERVAL = 86400
+
+# Durable news inbox (SQLite): every notification is kept until enriched, so restarts lose nothing
+INBOX_FLUSH_INTERVAL = 0.05    # Seconds writes wait to share one commit (group commit)
+INBOX_GROUP_SIZE = 64          # ...or commit as soon as this many writes are buffered
+INBOX_MAX_BUFFER = 10_000      # Writes held in memory while the DB is unavailable
+INBOX_CLAIM_BATCH = 50         # Rows claimed per pump cycle (recovered items, due retries)
+INBOX_POLL_INTERVAL = 2.0      # Seconds between pump cycles
+INBOX_MAX_ATTEMPTS = 5         # Failed enrichments are retried, then dead-lettered
+INBOX_RETRY_BASE = 30          # Seconds before the first retry, doubled per attempt
+INBOX_RETRY_MAX = 1800
+INBOX_RETENTION = 3 * 86400    # Seconds finished rows are kept
+
+# News enrichment pool
+NEWS_WORKERS = int(os.getenv("NEWS_WORKERS", "4"))
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "3"))  # Concurrent Gemini/embedding calls
+EMBEDDING_TIMEOUT = 10  # Seconds; item is logged without an embedding after this
+ANALYSIS_TIMEOUT = 30   # Seconds; item is logged as PARTIAL (no analysis, no alert) after this
+# Micro-batching: up to GEMINI_BATCH_SIZE headlines per Gemini request. With no call in flight a
+# headline is sent at once; otherwise arrivals wait at most GEMINI_BATCH_WAIT_MS for the batch to
+# fill. At most LLM_MAX_INFLIGHT requests run at once. GEMINI_BATCH_SIZE=1 disables batching.
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "8"))
+GEMINI_BATCH_WAIT_MS = int(os.getenv("GEMINI_BATCH_WAIT_MS", "200"))
+
+# LLM cache: identical headlines reuse earlier analyses/embeddings.
+# Bump PROMPT_VERSION whenever the analysis prompt changes so old answers aren't reused.
+PROMPT_VERSION = "v1"
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")  # Stored precision: float32 or float16
+LLM_CACHE_TTL = 7 * 86400      # Seconds
+LLM_CACHE_SIZE = 4096          # Entries kept in memory (LRU)
+
+# Near-duplicate stories (MinHash/LSH): rewordings within the window reuse the first analysis
+DEDUP_WINDOW = 600        # Seconds a story stays matchable
+DEDUP_THRESHOLD = 0.6     # Estimated Jaccard similarity of the word sets
+DEDUP_NUM_PERM = 32
+DEDUP_BANDS = 16          # 2 rows per band: candidates from ~0.25 similarity upward
+
+# Vector index (similar past events): brute force until VECTOR_IVF_THRESHOLD rows, then IVF
+VECTOR_IVF_THRESHOLD = 100_000
+VECTOR_IVF_NPROBE = 8     # Lists scanned per query in IVF mode
+
+VWAP_CHECK_INTERVAL = 900       # Default poll interval (phases/classes missing from POLL_INTERVALS)
 VWAP_BANDS = 2.0
 RSI_PERIOD = 14
+# "streaming" keeps O(1)-per-bar indicator state between cycles, "batch" recomputes the full window
+INDICATOR_MODE = os.getenv("INDICATOR_MODE", "streaming")
+
+# Fetch scheduler: minimum spacing between batch calls to Yahoo (rate limiting)
+FETCH_MIN_GAP = 2.0
+# Intraday bars are indexed in exchange time so pre/post-market bars group with their session
+MARKET_TIMEZONE = "America/New_York"
+
+# Per-ticker fallback downloads (tickers missing from the batch call)
+FALLBACK_WORKERS = 6
+FALLBACK_TIMEOUT = 10            # Seconds per request
+FALLBACK_RETRIES = 2             # Extra attempts, exponential backoff with jitter
+FALLBACK_BACKOFF = 1.0           # Seconds, doubled per attempt
+FALLBACK_FAILURE_THRESHOLD = 3   # Consecutive failed cycles before a ticker is parked
+FALLBACK_COOLDOWN = 1800         # Seconds a parked ticker is skipped
+
+# Local bar store: how long raw bars are kept per interval (days)
+BAR_STORE_RETENTION_DAYS = {"15m": 30, "1d": 800}
 
 # Asset Universe
 TICKER_MAP = {
@@ -40,6 +168,42 @@ TICKER_MAP = {
 
 VWAP_WATCHLIST = list(TICKER_MAP.keys())
 
+# Local entity extraction (entities.py): aliases -> symbol(s) or "MACRO", matched case-insensitively.
+# Symbols outside the watchlist can be followed by a proxy that has live VWAP data.
+ENTITY_ALIASES = {
+    "powell": "MACRO", "the fed": "MACRO", "fed chair": "MACRO", "fed rate": "MACRO", "fed minutes": "MACRO",
+    "federal reserve": "MACRO", "fomc": "MACRO", "ecb": "MACRO", "boj": "MACRO",
+    "cpi": "MACRO", "payrolls": "MACRO", "nonfarm": "MACRO",
+    "s&p": "SPY", "nasdaq": "QQQ", "russell 2000": "IWM", "the dow": "DIA", "dow jones": "DIA",
+    "semiconductors": "SMH", "chipmakers": "SMH", "biotech": "XBI", "homebuilders": "ITB", "junk bonds": "JNK",
+    "gold prices": "GLD", "bullion": "GLD", "silver prices": "SLV", "crude oil": "USO", "long bond": "TLT",
+    "vix": "^VIX", "10-year yield": "^TNX", "10-year treasury": "^TNX", "treasury yields": "^TNX",
+    "dxy": "DX-Y.NYB", "dollar index": "DX-Y.NYB",
+    "bitcoin": "BTC-USD", "btc": "BTC-USD", "ethereum": "ETH-USD",
+    "oil prices": "USO", "oil futures": "USO", "brent": "USO", "wti": "USO", "opec": "USO",
+    # Consumer brands also send app pushes ("Your Amazon package", "Apple Music"): only their market context counts
+    "nvidia": ["NVDA", "SMH"], "amd": ["AMD", "SMH"], "tsmc": ["TSM", "SMH"],
+    "apple shares": ["AAPL", "XLK"], "apple stock": ["AAPL", "XLK"], "apple earnings": ["AAPL", "XLK"],
+    "microsoft shares": ["MSFT", "XLK"], "microsoft stock": ["MSFT", "XLK"], "microsoft earnings": ["MSFT", "XLK"],
+    "tesla shares": ["TSLA", "XLY"], "tesla stock": ["TSLA", "XLY"], "tesla earnings": ["TSLA", "XLY"],
+    "amazon shares": ["AMZN", "XLY"], "amazon stock": ["AMZN", "XLY"], "amazon earnings": ["AMZN", "XLY"],
+    "jpmorgan": ["JPM", "XLF"], "exxon": ["XOM", "XLE"],
+}
+
+# Adaptive polling: seconds between VWAP refreshes per session phase and asset class.
+# None = don't poll. WEEKEND applies Saturday/Sunday (ET) instead of the intraday phases.
+POLL_INTERVALS = {
+    "PRE_MARKET":  {"equity": 900,  "index": 900,  "crypto": 300},
+    "MARKET_OPEN": {"equity": 120,  "index": 120,  "crypto": 300},
+    "MORNING_KR":  {"equity": 300,  "index": 300,  "crypto": 300},
+    "LUNCH_LULL":  {"equity": 600,  "index": 600,  "crypto": 300},
+    "POWER_HOUR":  {"equity": 120,  "index": 120,  "crypto": 300},
+    "AFTER_HOURS": {"equity": 900,  "index": 900,  "crypto": 300},
+    "OVN_FUTURES": {"equity": None, "index": 1800, "crypto": 300},
+    "WEEKEND":     {"equity": None, "index": None, "crypto": 600},
+}
+POLL_MAX_SLEEP = 60  # Upper bound on one loop sleep, so phase changes are picked up promptly
+
 # Macro Data Collection Config
 MACRO_TICKERS = ['SPY', 'QQQ', 'IWM', '^TNX', 'DX-Y.NYB', 'BTC-USD', '^VIX']
 SECTOR_TICKERS = ['XLE', 'XLF', 'XLK', 'XLV', 'XLP', 'XLU', 'XLY', 'XLI', 'XLB', 'XLRE', 'XLC']
@@ -2,7 +2,145 @@ import sqlite3
 import datetime
 import math
 import json
-from config import DB_FILE
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from config import DB_FILE, DB_WRITE_BATCH_MS, DB_WRITE_MAX_BATCH
+from embeddings import decode_many
+import metrics
+
+# Pragmas of the writer's connection. synchronous=NORMAL is durable across app crashes
+# in WAL mode (only an OS crash can lose the last commits) and skips an fsync per commit.
+WRITER_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+]
+
+class DBWriter:
+    """
+    Single writer thread owning the one long-lived write connection. Callers submit a
+    function of the connection; requests queued within batch_window run in one
+    transaction (each in its own savepoint, so one failure doesn't undo the others).
+    submit(wait=True) returns the function's result or raises its error; wait=False
+    returns at once and failures are printed. Reads keep their own connections (WAL).
+    """
+
+    def __init__(self, batch_window=DB_WRITE_BATCH_MS / 1000, max_batch=DB_WRITE_MAX_BATCH):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._pending = deque()    # (db path, fn, label, wait, future)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._busy = False
+        self._conn = None
+        self._conn_path = None
+
+    def submit(self, fn, label, wait=True):
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            # The path is taken now, so a request always lands in the DB it was made for
+            self._pending.append((DB_FILE, fn, label, wait, future))
+            self._cond.notify()
+        return future.result() if wait else future
+
+    def flush(self, timeout=10):
+        """Waits (up to timeout) until every queued write is committed. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._pending or self._busy) and time.monotonic() < deadline:
+                self._cond.wait(0.05)
+            return not (self._pending or self._busy)
+
+    def pending(self):
+        return len(self._pending)
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.batch_window
+            while len(self._pending) < self.max_batch and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            path = self._pending[0][0]
+            batch = []
+            while self._pending and self._pending[0][0] == path and len(batch) < self.max_batch:
+                batch.append(self._pending.popleft())
+            self._busy = True
+        return path, batch
+
+    def _run(self):
+        while True:
+            path, batch = self._take_batch()
+            try:
+                self._apply(path, batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _connect(self, path):
+        if self._conn is not None and self._conn_path == path: return self._conn
+        self._close()
+        # Autocommit mode: transactions are opened and committed explicitly
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        for pragma in WRITER_PRAGMAS:
+            self._conn.execute(pragma)
+        self._conn_path = path
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn, self._conn_path = None, None
+
+    def _apply(self, path, batch):
+        start = time.perf_counter()
+        results = []
+        try:
+            conn = self._connect(path)
+            conn.execute("BEGIN IMMEDIATE")
+            for _, fn, label, wait, future in batch:
+                conn.execute("SAVEPOINT request")
+                try:
+                    results.append((future, fn(conn), None))
+                    conn.execute("RELEASE request")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO request")
+                    conn.execute("RELEASE request")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # The transaction itself failed: nothing in the batch was written
+            try:
+                if self._conn is not None and self._conn.in_transaction: self._conn.execute("ROLLBACK")
+            except Exception:
+                self._close()
+            results = [(item[4], None, e) for item in batch]
+            metrics.incr("db.failed_commits")
+
+        for (_, _, label, wait, _), (future, result, error) in zip(batch, results):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+                if not wait: print(f"⚠️ {label} Failed: {error}")
+        metrics.incr("db.commits")
+        metrics.incr("db.writes", len(batch))
+        metrics.observe("db.batch_commit", time.perf_counter() - start)
+
+DB_WRITER = DBWriter()
+metrics.register_gauge("db.write_queue", DB_WRITER.pending)
 
 def safe_round(val, digits=2):
     try:
@@ -13,6 +151,13 @@ def safe_round(val, digits=2):
     except Exception:
         return 0.0
 
+def _ensure_columns(cursor, table, columns):
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for col_name, col_type in columns:
+        if col_name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}")
+            print(f"✅ Added column: {table}.{col_name}")
+
 def init_db():
     try:
         with sqlite3.connect(DB_FILE) as conn:
@@ -25,7 +170,6 @@ def init_db():
                             timestamp TEXT,
                             source_app TEXT,
                             source_package TEXT,
-                            source_package TEXT,
                             title TEXT,
                             body TEXT,
                             ticker TEXT,
@@ -57,8 +201,14 @@ def init_db():
                             days_until_nfp INTEGER,
                             sector_rel_strength TEXT,
                             spy_200d_sma_dist REAL,
-                            market_breadth INTEGER
+                            market_breadth INTEGER,
+                            cluster_id TEXT,
+                            duplicate_of INTEGER,
+                            local_novelty_score REAL
                         )''')
+            # Columns added after the first release (older DBs get them here)
+            _ensure_columns(c, "logs", [("cluster_id", "TEXT"), ("duplicate_of", "INTEGER"),
+                                        ("local_novelty_score", "REAL")])
 
             # 2. Market Data (Time-Series)
             c.execute('''CREATE TABLE IF NOT EXISTS market_data (
@@ -88,6 +238,48 @@ def init_db():
                             ai_analysis_json TEXT,
                             embedding BLOB
                         )''')
+
+            # 4. OHLCV Bar Store (raw bars, so monitors only download what is new)
+            c.execute('''CREATE TABLE IF NOT EXISTS bars (
+                            ticker TEXT,
+                            interval TEXT,
+                            bar_start INTEGER,
+                            open REAL,
+                            high REAL,
+                            low REAL,
+                            close REAL,
+                            volume REAL,
+                            PRIMARY KEY (ticker, interval, bar_start)
+                        ) WITHOUT ROWID''')
+
+            # 5. Small key/value store for process state (indicator checkpoints etc.)
+            c.execute('''CREATE TABLE IF NOT EXISTS app_state (
+                            key TEXT PRIMARY KEY,
+                            value TEXT,
+                            updated_at TEXT
+                        )''')
+
+            # 6. LLM response cache (analyses + embeddings keyed by content hash)
+            c.execute('''CREATE TABLE IF NOT EXISTS llm_cache (
+                            key TEXT PRIMARY KEY,
+                            kind TEXT,
+                            value TEXT,
+                            created_at REAL
+                        ) WITHOUT ROWID''')
+
+            # 7. Durable news inbox: raw notifications until they are enriched (see inbox.py)
+            c.execute('''CREATE TABLE IF NOT EXISTS news_inbox (
+                            id TEXT PRIMARY KEY,
+                            received_at REAL,
+                            payload TEXT,
+                            status TEXT,
+                            attempts INTEGER DEFAULT 0,
+                            next_attempt_at REAL,
+                            claimed_at REAL,
+                            last_error TEXT,
+                            updated_at REAL
+                        )''')
+            c.execute("CREATE INDEX IF NOT EXISTS idx_news_inbox_due ON news_inbox (status, next_attempt_at)")
             
             conn.commit()
         print(f"✅ Database initialized: {DB_FILE}")
@@ -99,19 +291,18 @@ def log_market_data(timestamp, ticker_data):
     Logs a batch of market data.
     ticker_data: List of dicts with keys: ticker, open, high, low, close, volume, vwap, rsi, rvol
     """
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            c = conn.cursor()
-            c.executemany('''INSERT OR REPLACE INTO market_data 
-                             (timestamp, ticker, open, high, low, close, volume, vwap, rsi, rvol)
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                          [(timestamp, d['ticker'], d.get('open'), d.get('high'), d.get('low'), d.get('close'), 
-                            d.get('volume'), d.get('vwap'), d.get('rsi'), d.get('rvol')) for d in ticker_data])
-            conn.commit()
-    except Exception as e:
-        print(f"⚠️ Market Data Logging Failed: {e}")
+    rows = [(timestamp, d['ticker'], d.get('open'), d.get('high'), d.get('low'), d.get('close'), 
+             d.get('volume'), d.get('vwap'), d.get('rsi'), d.get('rvol')) for d in ticker_data]
+    def write(conn):
+        conn.executemany('''INSERT OR REPLACE INTO market_data 
+                            (timestamp, ticker, open, high, low, close, volume, vwap, rsi, rvol)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    # Nothing reads it back right away: the monitor loop doesn't wait for the commit
+    DB_WRITER.submit(write, "Market Data Logging", wait=False)
 
-def log_news_event(data_pack, analysis, embedding=None, macro_context=None, micro_regime=None, session_phase=None, sector_json=None):
+def log_news_event(data_pack, analysis, embedding=None, macro_context=None, micro_regime=None, session_phase=None, sector_json=None,
+                   status="SUCCESS", error_msg=None, cluster_id=None, duplicate_of=None, local_novelty_score=None):
+    """Logs an enriched news item; returns the new logs row id (None on failure)."""
     timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
     if macro_context is None: macro_context = {}
     if micro_regime is None: micro_regime = {}
@@ -137,7 +328,7 @@ def log_news_event(data_pack, analysis, embedding=None, macro_context=None, micr
         # Confidence
         confidence = analysis.get("confidence") or analysis.get("ai_confidence")
 
-        with sqlite3.connect(DB_FILE) as conn:
+        def write(conn):
             c = conn.cursor()
             c.execute('''INSERT INTO news_events 
                          (timestamp, source_app, title, body, sentiment, impact_score, related_ticker, ai_analysis_json, embedding)
@@ -150,8 +341,7 @@ def log_news_event(data_pack, analysis, embedding=None, macro_context=None, micr
                        analysis.get("impact_score", 0),
                        primary_ticker,
                        json.dumps(analysis),
-                       embedding))
-            conn.commit()
+                       None))  # Embedding is stored once, in logs.text_embedding
             
             # Also log to legacy table for now to keep frontend working
             c.execute('''INSERT INTO logs (
@@ -163,9 +353,10 @@ def log_news_event(data_pack, analysis, embedding=None, macro_context=None, micr
                             session_phase, event_category, novelty_score, ai_confidence,
                             price_spy, price_qqq, price_iwm, yield_10y, price_dxy, price_btc,
                             days_until_fomc, days_until_cpi, days_until_nfp,
-                            sector_rel_strength, spy_200d_sma_dist, market_breadth
+                            sector_rel_strength, spy_200d_sma_dist, market_breadth, error_msg,
+                            cluster_id, duplicate_of, local_novelty_score
                         )
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'SUCCESS', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
                       (timestamp, 
                        data_pack.get("source"),
                        data_pack.get("package"),
@@ -175,6 +366,7 @@ def log_news_event(data_pack, analysis, embedding=None, macro_context=None, micr
                        analysis.get("impact_score", 0), 
                        thesis, 
                        sentiment,
+                       status,
                        
                        macro_context.get("market_vix"),
                        sector_json,
@@ -202,12 +394,201 @@ def log_news_event(data_pack, analysis, embedding=None, macro_context=None, micr
                        
                        macro_context.get("sector_rel_strength"),
                        macro_context.get("spy_200d_sma_dist"),
-                       macro_context.get("market_breadth")
+                       macro_context.get("market_breadth"),
+                       error_msg,
+                       cluster_id,
+                       duplicate_of,
+                       local_novelty_score
                        ))
-            conn.commit()
+            return c.lastrowid
+
+        # Both rows are written in the same transaction
+        return DB_WRITER.submit(write, "News Logging")
             
     except Exception as e:
         print(f"⚠️ News Logging Failed: {e}")
+        return None
+
+def save_bars(interval, rows):
+    """
+    Upserts OHLCV bars.
+    rows: iterable of (ticker, bar_start_epoch, open, high, low, close, volume)
+    """
+    try:
+        DB_WRITER.submit(lambda conn: conn.executemany('''INSERT OR REPLACE INTO bars
+                                (ticker, interval, bar_start, open, high, low, close, volume)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                             [(r[0], interval, *r[1:]) for r in rows]), "Bar Store Write")
+    except Exception as e:
+        print(f"⚠️ Bar Store Write Failed: {e}")
+
+def get_latest_bar_times(tickers, interval):
+    """Returns {ticker: latest bar_start epoch} for tickers that have stored bars."""
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            placeholders = ",".join("?" * len(tickers))
+            rows = conn.execute(f'''SELECT ticker, MAX(bar_start) FROM bars
+                                    WHERE interval = ? AND ticker IN ({placeholders})
+                                    GROUP BY ticker''', (interval, *tickers)).fetchall()
+        return {t: ts for t, ts in rows}
+    except Exception as e:
+        print(f"⚠️ Bar Store Read Failed: {e}")
+        return {}
+
+def load_bar_rows(tickers, interval, since):
+    """Returns [(ticker, bar_start, open, high, low, close, volume)] with bar_start >= since."""
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            placeholders = ",".join("?" * len(tickers))
+            return conn.execute(f'''SELECT ticker, bar_start, open, high, low, close, volume FROM bars
+                                    WHERE interval = ? AND bar_start >= ? AND ticker IN ({placeholders})
+                                    ORDER BY bar_start''', (interval, since, *tickers)).fetchall()
+    except Exception as e:
+        print(f"⚠️ Bar Store Read Failed: {e}")
+        return []
+
+def prune_bars(interval, before):
+    DB_WRITER.submit(lambda conn: conn.execute("DELETE FROM bars WHERE interval = ? AND bar_start < ?", (interval, before)),
+                     "Bar Store Prune", wait=False)
+
+def save_app_state(key, value):
+    """Stores a JSON-serialisable value under key (upsert)."""
+    try:
+        params = (key, json.dumps(value), datetime.datetime.now(datetime.timezone.utc).isoformat())
+        DB_WRITER.submit(lambda conn: conn.execute('''INSERT OR REPLACE INTO app_state (key, value, updated_at)
+                                                      VALUES (?, ?, ?)''', params), "App State Save")
+    except Exception as e:
+        print(f"⚠️ App State Save Failed ({key}): {e}")
+
+def load_app_state(key, default=None):
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            row = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+    except Exception as e:
+        print(f"⚠️ App State Load Failed ({key}): {e}")
+        return default
+
+def load_llm_cache(key, min_created_at):
+    """Returns (value, created_at) for a cache entry newer than min_created_at, else None."""
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            return conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ? AND created_at >= ?",
+                                (key, min_created_at)).fetchone()
+    except Exception as e:
+        print(f"⚠️ LLM Cache Load Failed: {e}")
+        return None
+
+def save_llm_cache(key, kind, value, created_at):
+    # The in-memory LRU already serves this entry; the disk copy can trail
+    DB_WRITER.submit(lambda conn: conn.execute("INSERT OR REPLACE INTO llm_cache (key, kind, value, created_at) VALUES (?, ?, ?, ?)",
+                                               (key, kind, value, created_at)), "LLM Cache Save", wait=False)
+
+def prune_llm_cache(before):
+    DB_WRITER.submit(lambda conn: conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (before,)),
+                     "LLM Cache Prune", wait=False)
+
+def load_log_embeddings(min_id=0):
+    """
+    Loads logs embeddings with id > min_id.
+    Returns (ids, matrix): ids as an int64 array, one float32 row per id.
+    """
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            rows = conn.execute('''SELECT id, text_embedding FROM logs
+                                   WHERE id > ? AND text_embedding IS NOT NULL ORDER BY id''', (min_id,)).fetchall()
+    except Exception as e:
+        print(f"⚠️ Embedding Load Failed: {e}")
+        rows = []
+    matrix, kept = decode_many([r[1] for r in rows])
+    return np.array([rows[i][0] for i in kept], dtype=np.int64), matrix
+
+def load_recent_log_embeddings(since):
+    """Embeddings logged at or after the ISO timestamp since: (epoch times, float32 matrix)."""
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            rows = conn.execute('''SELECT timestamp, text_embedding FROM logs
+                                   WHERE timestamp >= ? AND text_embedding IS NOT NULL ORDER BY id''', (since,)).fetchall()
+    except Exception as e:
+        print(f"⚠️ Embedding Load Failed: {e}")
+        rows = []
+    matrix, kept = decode_many([r[1] for r in rows])
+    times = [datetime.datetime.fromisoformat(rows[i][0]).timestamp() for i in kept]
+    return np.array(times), matrix
+
+# Buffered inbox writes, applied in order by apply_inbox_ops
+_INBOX_SQL = {
+    # (id, received_at, payload, now, now, now): fresh items are owned by the process that received them
+    "insert": '''INSERT OR IGNORE INTO news_inbox
+                 (id, received_at, payload, status, attempts, next_attempt_at, claimed_at, updated_at)
+                 VALUES (?, ?, ?, 'processing', 0, ?, ?, ?)''',
+    # (status, updated_at, id)
+    "done": "UPDATE news_inbox SET status = ?, updated_at = ? WHERE id = ?",
+    # (status, attempts, next_attempt_at, last_error, updated_at, id)
+    "failed": '''UPDATE news_inbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+                 WHERE id = ?''',
+}
+
+def apply_inbox_ops(ops):
+    """Applies [(kind, params)] inbox writes in one transaction. Returns False if nothing was committed."""
+    def write(conn):
+        for kind, params in ops:
+            conn.execute(_INBOX_SQL[kind], params)
+    try:
+        DB_WRITER.submit(write, "Inbox Write")
+        return True
+    except Exception as e:
+        print(f"⚠️ Inbox Write Failed: {e}")
+        return False
+
+def claim_inbox_items(now, limit):
+    """Marks up to limit due pending rows as processing; returns [(id, payload, attempts)] oldest first."""
+    def claim(conn):
+        # Select and mark in the writer's transaction: no other write can interleave
+        rows = conn.execute('''SELECT id, payload, attempts FROM news_inbox
+                               WHERE status = 'pending' AND next_attempt_at <= ?
+                               ORDER BY next_attempt_at, received_at LIMIT ?''', (now, limit)).fetchall()
+        conn.executemany("UPDATE news_inbox SET status = 'processing', claimed_at = ?, updated_at = ? WHERE id = ?",
+                         [(now, now, r[0]) for r in rows])
+        return rows
+    try:
+        return DB_WRITER.submit(claim, "Inbox Claim")
+    except Exception as e:
+        print(f"⚠️ Inbox Claim Failed: {e}")
+        return []
+
+def recover_inbox_items(claimed_before, now):
+    """Returns rows a previous process left in processing to pending; returns how many."""
+    try:
+        return DB_WRITER.submit(lambda conn: conn.execute('''UPDATE news_inbox SET status = 'pending', next_attempt_at = ?, updated_at = ?
+                                                             WHERE status = 'processing' AND claimed_at < ?''',
+                                                          (now, now, claimed_before)).rowcount, "Inbox Recovery")
+    except Exception as e:
+        print(f"⚠️ Inbox Recovery Failed: {e}")
+        return 0
+
+def prune_inbox(before):
+    DB_WRITER.submit(lambda conn: conn.execute("DELETE FROM news_inbox WHERE status IN ('done', 'shed', 'skipped') AND updated_at < ?",
+                                               (before,)), "Inbox Prune", wait=False)
+
+def load_labelled_logs(limit):
+    """Latest analysed logs as (title, body, source_app, source_package, impact_score), for the pre-filter."""
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            return conn.execute('''SELECT title, body, source_app, source_package, impact_score FROM logs
+                                   WHERE status = 'SUCCESS' AND impact_score IS NOT NULL
+                                   ORDER BY id DESC LIMIT ?''', (limit,)).fetchall()
+    except Exception as e:
+        print(f"⚠️ Labelled Logs Load Failed: {e}")
+        return []
+
+def count_inbox_items():
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM news_inbox GROUP BY status").fetchall())
+    except Exception as e:
+        print(f"⚠️ Inbox Count Failed: {e}")
+        return {}
 
 # Deprecated but kept for compatibility if needed elsewhere
 def log_transaction(*args, **kwargs):
@@ -1,20 +1,16 @@
-import yfinance as yf
-import pandas as pd
 from config import VWAP_WATCHLIST
+from providers import get_provider
 
 print(f"Downloading data for {len(VWAP_WATCHLIST)} tickers...")
 try:
-    df = yf.download(VWAP_WATCHLIST, period='5d', interval='15m', progress=False, group_by='ticker', auto_adjust=True, prepost=True, threads=False)
+    df = get_provider().download(VWAP_WATCHLIST, '15m', period='5d')
     print("Download complete.")
     print(f"Shape: {df.shape}")
     print(f"Columns: {df.columns}")
     
     for ticker in VWAP_WATCHLIST:
         try:
-            if len(VWAP_WATCHLIST) > 1:
-                t_df = df[ticker].copy()
-            else:
-                t_df = df.copy()
+            t_df = df[ticker].copy()
             
             last_idx = t_df['Close'].last_valid_index()
             print(f"Ticker: {ticker}, Last Index: {last_idx}")
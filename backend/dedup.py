@@ -0,0 +1,103 @@
+import re
+import time
+import uuid
+import hashlib
+import threading
+from collections import deque
+import numpy as np
+from config import DEDUP_WINDOW, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS
+
+# Words that carry no signal for "is this the same story"
+STOP_WORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "to", "for", "by", "with", "and", "or",
+    "is", "are", "was", "were", "be", "as", "from", "its", "it", "that", "this", "after",
+}
+_MERSENNE = (1 << 61) - 1
+_rng = np.random.default_rng(20240501)
+_PERM_A = _rng.integers(1, 1 << 30, DEDUP_NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 30, DEDUP_NUM_PERM, dtype=np.uint64)
+
+def story_tokens(text):
+    words = re.findall(r"[a-z0-9][a-z0-9.%$'-]*", (text or "").lower())
+    return {w.rstrip(".'-") for w in words if w not in STOP_WORDS}
+
+def minhash(tokens):
+    """DEDUP_NUM_PERM-long MinHash signature of a token set (uint64 array)."""
+    if not tokens:
+        return np.full(DEDUP_NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    # 30-bit token hashes x 30-bit coefficients stay well inside uint64
+    hashes = np.array([int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8).digest(), "little") & ((1 << 30) - 1)
+                       for t in tokens], dtype=np.uint64)
+    return ((hashes[:, None] * _PERM_A + _PERM_B) % np.uint64(_MERSENNE)).min(axis=0)
+
+class StoryCluster:
+    """A group of near-identical stories; the first one (leader) is analysed, the rest reuse it."""
+
+    def __init__(self, signature, created_at):
+        self.id = uuid.uuid4().hex[:12]
+        self.signature = signature
+        self.created_at = created_at
+        self.analysis = None
+        self.log_id = None
+        self._done = threading.Event()
+
+    def resolve(self, analysis, log_id):
+        self.analysis, self.log_id = analysis, log_id
+        self._done.set()
+
+    def wait(self, timeout):
+        """Leader's (analysis, log_id) once it is logged; (None, None) if it failed or timed out."""
+        if not self._done.wait(timeout): return None, None
+        return self.analysis, self.log_id
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH over a sliding time window. Signatures are split into DEDUP_BANDS
+    bands; stories sharing a band are candidates and match when their estimated
+    Jaccard similarity is at least threshold.
+    """
+
+    def __init__(self, window=DEDUP_WINDOW, threshold=DEDUP_THRESHOLD, bands=DEDUP_BANDS):
+        self.window = window
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = DEDUP_NUM_PERM // bands
+        self._clusters = deque()   # clusters in creation order, for expiry
+        self._buckets = {}         # (band, band bytes) -> [clusters]
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature):
+        return [(b, signature[b * self.rows:(b + 1) * self.rows].tobytes()) for b in range(self.bands)]
+
+    def _expire(self, now):
+        while self._clusters and now - self._clusters[0].created_at > self.window:
+            old = self._clusters.popleft()
+            for key in self._band_keys(old.signature):
+                bucket = self._buckets.get(key)
+                if bucket is None: continue
+                bucket[:] = [c for c in bucket if c is not old]
+                if not bucket: del self._buckets[key]
+
+    def assign(self, text, now=None):
+        """Returns (cluster, is_leader). New stories start a cluster and lead it."""
+        if now is None: now = time.time()
+        signature = minhash(story_tokens(text))
+        with self._lock:
+            self._expire(now)
+            best, best_sim = None, self.threshold
+            seen = set()
+            for key in self._band_keys(signature):
+                for cluster in self._buckets.get(key, ()):
+                    if id(cluster) in seen: continue
+                    seen.add(id(cluster))
+                    sim = float(np.mean(cluster.signature == signature))
+                    if sim >= best_sim:
+                        best, best_sim = cluster, sim
+            if best is not None:
+                return best, False
+
+            cluster = StoryCluster(signature, now)
+            self._clusters.append(cluster)
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(cluster)
+            return cluster, True
@@ -0,0 +1,52 @@
+import json
+import struct
+import numpy as np
+from config import EMBEDDING_DTYPE
+
+# Binary embedding layout: 12-byte header + little-endian values.
+#   magic "MMEB" | format version (1 byte) | dtype code (1 byte) | 2 pad bytes | dimension (uint32)
+# The header size is a multiple of 4, so the float32 payload stays aligned for frombuffer.
+MAGIC = b"MMEB"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBxxI")
+DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+DTYPE_CODES = {"float32": 0, "float16": 1}
+
+def encode_embedding(vector, dtype=EMBEDDING_DTYPE):
+    """List/array of floats -> header + packed values (bytes), or None for no vector."""
+    if vector is None: return None
+    code = DTYPE_CODES[dtype]
+    values = np.asarray(vector, dtype=DTYPES[code])
+    return HEADER.pack(MAGIC, FORMAT_VERSION, code, values.size) + values.tobytes()
+
+def is_binary_embedding(blob):
+    return isinstance(blob, (bytes, bytearray, memoryview)) and bytes(blob[:4]) == MAGIC
+
+def decode_embedding(blob):
+    """
+    Stored embedding -> float32 vector (None if empty/unreadable).
+    Accepts the binary format and the legacy JSON text rows.
+    """
+    if blob is None or len(blob) == 0: return None
+    if is_binary_embedding(blob):
+        magic, version, code, dim = HEADER.unpack_from(blob)
+        if version != FORMAT_VERSION or code not in DTYPES: return None
+        values = np.frombuffer(blob, dtype=DTYPES[code], count=dim, offset=HEADER.size)
+        return values if code == 0 else values.astype(np.float32)
+    try:
+        text = blob.decode() if isinstance(blob, (bytes, bytearray)) else blob
+        return np.asarray(json.loads(text), dtype=np.float32)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+def decode_many(blobs):
+    """Decodes several embeddings into one (n x dim) float32 matrix, plus the indices kept."""
+    vectors, kept = [], []
+    for i, blob in enumerate(blobs):
+        vec = decode_embedding(blob)
+        if vec is None: continue
+        if vectors and vec.size != vectors[0].size: continue  # Mixed models: keep the first dimension
+        vectors.append(vec)
+        kept.append(i)
+    if not vectors: return np.empty((0, 0), dtype=np.float32), kept
+    return np.vstack(vectors), kept
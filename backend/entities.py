@@ -0,0 +1,101 @@
+from collections import deque
+from config import TICKER_MAP, ENTITY_ALIASES
+
+MACRO = "MACRO"   # Pseudo-entity for macro/central-bank stories (no single ticker)
+
+class AhoCorasick:
+    """Multi-pattern matcher: one pass over the text finds every pattern occurrence."""
+
+    def __init__(self, patterns):
+        # patterns: {string: value}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]   # node -> [(pattern length, value)]
+        for pattern, value in patterns.items():
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = nxt
+                node = nxt
+            self._out[node].append((len(pattern), value))
+
+        # Breadth-first failure links; outputs of the fallback node are inherited
+        todo = deque(self._goto[0].values())
+        while todo:
+            node = todo.popleft()
+            for ch, nxt in self._goto[node].items():
+                todo.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def finditer(self, text):
+        """Yields (start, end, value) for every match, overlapping ones included."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, value in self._out[node]:
+                yield i + 1 - length, i + 1, value
+
+def _is_boundary(text, start, end):
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not (before.isalnum() or after.isalnum())
+
+class EntityIndex:
+    """
+    Instant ticker extraction, built once at import: watchlist symbols match case-sensitively
+    (with or without $), ENTITY_ALIASES case-insensitively, whole words only. Aliases can point at symbols outside the watchlist (Nvidia -> NVDA, SMH) or
+    at MACRO.
+    """
+
+    def __init__(self, ticker_map=TICKER_MAP, aliases=ENTITY_ALIASES):
+        symbols = {}
+        for symbol in ticker_map:
+            symbols[symbol] = (symbol,)
+            symbols[f"${symbol}"] = (symbol,)
+        # TICKER_MAP names are mostly plain words ("Energy", "Gold"): only aliases are matched as names
+        names = {}
+        for alias, targets in aliases.items():
+            names[alias.lower()] = tuple(targets) if isinstance(targets, (list, tuple)) else (targets,)
+        self._symbols = AhoCorasick(symbols)
+        self._names = AhoCorasick(names)
+
+    def _symbol_hits(self, text):
+        return [(s, e, v) for s, e, v in self._symbols.finditer(text) if _is_boundary(text, s, e)]
+
+    def has_symbol(self, text):
+        """True if text names a watchlist symbol outright (SPY, $NVDA), as opposed to an alias."""
+        return bool(text) and bool(self._symbol_hits(text))
+
+    def extract(self, text):
+        """Entities mentioned in text, in order of first mention (may include MACRO)."""
+        if not text: return []
+        hits = self._symbol_hits(text)
+        lowered = text.lower()
+        hits += [(s, e, v) for s, e, v in self._names.finditer(lowered) if _is_boundary(lowered, s, e)]
+        found = []
+        for _, _, targets in sorted(hits, key=lambda h: (h[0], -h[1])):
+            for target in targets:
+                if target not in found: found.append(target)
+        return found
+
+    def extract_tickers(self, text):
+        return [e for e in self.extract(text) if e != MACRO]
+
+ENTITIES = EntityIndex()
+
+def task_entities(task):
+    """Entities of a news task, extracted once and kept on the task."""
+    if "entities" not in task:
+        task["entities"] = ENTITIES.extract(f"{task.get('title') or ''} {task.get('body') or ''}")
+    return task["entities"]
@@ -0,0 +1,107 @@
+import threading
+from market_data import refresh_bars, load_bars
+from providers import get_provider, period_to_days
+
+def _tickers_with_bars(df):
+    if df is None or df.empty: return set()
+    return {t for t in df.columns.get_level_values(0).unique() if not df[t].dropna(how='all').empty}
+
+class FetchScheduler:
+    """
+    Single entry point for bar downloads shared by all loops.
+    Subscribers register the tickers they care about per interval; a get() that finds
+    stale tickers refreshes the union of every subscriber's tickers for that interval
+    in one batch call, and concurrent callers wait for that call instead of issuing
+    their own. Calls to the provider are spaced by its min_request_gap.
+    Ages and spacing are measured on the provider's clock, so replay runs go stale too;
+    a ticker the batch returned nothing for stays stale and is retried on the next get().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._interest = {}   # interval -> {subscriber: (tickers, period)}
+        self._fetched_at = {} # (interval, ticker) -> epoch of the last refresh that covered it
+        self._inflight = {}   # interval -> threading.Event
+        self._last_call = 0.0
+        self.stats = {"requests": 0, "served_from_store": 0, "batch_calls": 0, "coalesced_waits": 0, "failed_tickers": 0}
+
+    def register(self, subscriber, tickers, interval, period):
+        with self._lock:
+            self._interest.setdefault(interval, {})[subscriber] = (list(tickers), period)
+
+    def unregister(self, subscriber, interval):
+        with self._lock:
+            self._interest.get(interval, {}).pop(subscriber, None)
+
+    def _union(self, interval, extra_tickers, extra_period):
+        tickers = list(dict.fromkeys(extra_tickers))
+        period = extra_period
+        for subs_tickers, subs_period in self._interest.get(interval, {}).values():
+            tickers.extend(t for t in subs_tickers if t not in tickers)
+            if period_to_days(subs_period) > period_to_days(period):
+                period = subs_period
+        return tickers, period
+
+    def _throttle(self, provider):
+        gap = getattr(provider, "min_request_gap", 0)
+        with self._lock:
+            now = provider.now()
+            wait = self._last_call + gap - now
+            self._last_call = max(self._last_call + gap, now)
+        if wait > 0:
+            provider.sleep(wait)
+
+    def get(self, tickers, interval, period, max_age=60):
+        """
+        Returns a group_by='ticker' frame for tickers, refreshing the bar store only if
+        one of them was last refreshed more than max_age seconds ago.
+        """
+        downloaded = None
+        provider = get_provider()
+        with self._lock:
+            self.stats["requests"] += 1
+        while True:
+            with self._lock:
+                now = provider.now()
+                stale = [t for t in tickers if now - self._fetched_at.get((interval, t), 0) > max_age]
+                if not stale:
+                    self.stats["served_from_store"] += 1
+                    break
+                inflight = self._inflight.get(interval)
+                if inflight is None:
+                    batch, batch_period = self._union(interval, stale, period)
+                    event = self._inflight[interval] = threading.Event()
+            if inflight is not None:
+                # Someone is already fetching this interval: share their result
+                with self._lock:
+                    self.stats["coalesced_waits"] += 1
+                inflight.wait()
+                continue
+
+            try:
+                self._throttle(provider)
+                with self._lock:
+                    self.stats["batch_calls"] += 1
+                downloaded = refresh_bars(batch, interval, batch_period)
+                received = _tickers_with_bars(downloaded)
+                with self._lock:
+                    done = provider.now()
+                    for t in batch:
+                        if t in received:
+                            self._fetched_at[(interval, t)] = done
+                    if len(received) < len(batch):
+                        self.stats["failed_tickers"] += len(batch) - len(received)
+            finally:
+                with self._lock:
+                    self._inflight.pop(interval, None)
+                event.set()
+            break
+
+        df = load_bars(tickers, interval, period)
+        if df.empty and downloaded is not None and not downloaded.empty:
+            # Store unavailable (e.g. init_db not run): hand back the download itself
+            present = [t for t in tickers if t in downloaded.columns.get_level_values(0)]
+            return downloaded[present] if present else df
+        return df
+
+SCHEDULER = FetchScheduler()
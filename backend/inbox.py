@@ -0,0 +1,161 @@
+import json
+import time
+import uuid
+import threading
+from config import (
+    INBOX_FLUSH_INTERVAL, INBOX_GROUP_SIZE, INBOX_MAX_BUFFER, INBOX_CLAIM_BATCH, INBOX_POLL_INTERVAL,
+    INBOX_MAX_ATTEMPTS, INBOX_RETRY_BASE, INBOX_RETRY_MAX, INBOX_RETENTION
+)
+from database import apply_inbox_ops, claim_inbox_items, recover_inbox_items, prune_inbox, count_inbox_items
+import metrics
+
+PRUNE_EVERY = 3600  # Seconds between sweeps of finished rows
+
+class NewsInbox:
+    """
+    Durable record (news_inbox table) of every ingested notification until it is enriched.
+
+    Fresh items go straight to the in-memory queue; their rows are written by a background
+    thread that commits everything buffered within flush_interval in one transaction, so
+    the ingestor never waits on the disk. Rows start as "processing" (owned by this process)
+    and end as "done", "skipped" (pre-filter), "shed" (queue backpressure) or "dead" (dead-letter after
+    max_attempts); a failed enrichment goes back to "pending" with exponential backoff.
+    The pump re-queues due retries and, after a restart, the rows the previous process
+    still owned.
+    """
+
+    def __init__(self, flush_interval=INBOX_FLUSH_INTERVAL, group_size=INBOX_GROUP_SIZE, max_attempts=INBOX_MAX_ATTEMPTS):
+        self.flush_interval = flush_interval
+        self.group_size = group_size
+        self.max_attempts = max_attempts
+        self.started_at = time.time()
+        self._ops = []          # [(kind, params)] not yet committed, in order
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._writer = None
+        self._pump = None
+        self._last_prune = time.time()
+
+    # --- producers (ingestor, workers) ---
+
+    def append(self, task):
+        """Gives task an inbox id and buffers its insert; returns immediately."""
+        now = time.time()
+        task["inbox_id"] = uuid.uuid4().hex
+        task.setdefault("attempts", 0)
+        payload = json.dumps({k: v for k, v in task.items() if k not in ("inbox_id", "attempts", "priority")})
+        self._write("insert", (task["inbox_id"], task.get("received_at", now), payload, now, now, now))
+        return task
+
+    def complete(self, task, status="done"):
+        if task.get("inbox_id"):
+            self._write("done", (status, time.time(), task["inbox_id"]))
+
+    def shed(self, tasks):
+        for task in tasks:
+            self.complete(task, "shed")
+
+    def will_retry(self, task):
+        """True if a failure of this task would be retried rather than dead-lettered."""
+        return bool(task.get("inbox_id")) and task.get("attempts", 0) + 1 < self.max_attempts
+
+    def fail(self, task, error):
+        """Schedules a retry with exponential backoff, or dead-letters the item after max_attempts."""
+        if not task.get("inbox_id"): return
+        now = time.time()
+        attempts = task.get("attempts", 0) + 1
+        title = task.get("title", "")[:40]
+        if attempts < self.max_attempts:
+            delay = min(INBOX_RETRY_MAX, INBOX_RETRY_BASE * 2 ** (attempts - 1))
+            self._write("failed", ("pending", attempts, now + delay, error, now, task["inbox_id"]))
+            metrics.incr("news.inbox.retried")
+            print(f"🔁 Retrying '{title}' in {int(delay)}s (attempt {attempts}/{self.max_attempts}): {error}")
+        else:
+            self._write("failed", ("dead", attempts, None, error, now, task["inbox_id"]))
+            metrics.incr("news.inbox.dead")
+            print(f"☠️ Dead-lettered '{title}' after {attempts} attempts: {error}")
+
+    # --- group commit ---
+
+    def _write(self, kind, params):
+        with self._cond:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="inbox-writer", daemon=True)
+                self._writer.start()
+            if len(self._ops) >= INBOX_MAX_BUFFER:
+                # DB unavailable for a long time: the oldest write is lost
+                self._ops.pop(0)
+                metrics.incr("news.inbox.lost_writes")
+            self._ops.append((kind, params))
+            self._cond.notify()
+
+    def _run_writer(self):
+        while True:
+            with self._cond:
+                while not self._ops:
+                    self._cond.wait()
+                # Writes arriving within flush_interval share the transaction
+                deadline = time.time() + self.flush_interval
+                while len(self._ops) < self.group_size and time.time() < deadline:
+                    self._cond.wait(deadline - time.time())
+            if not self.flush():
+                time.sleep(1)
+            now = time.time()
+            if now - self._last_prune > PRUNE_EVERY:
+                self._last_prune = now
+                prune_inbox(now - INBOX_RETENTION)
+
+    def flush(self):
+        """Commits buffered writes now, in one transaction. Returns False if the DB write failed."""
+        with self._flush_lock:
+            with self._cond:
+                ops, self._ops = self._ops, []
+            if not ops: return True
+            if apply_inbox_ops(ops):
+                metrics.incr("news.inbox.commits")
+                metrics.incr("news.inbox.writes", len(ops))
+                return True
+            with self._cond:
+                # Kept (in order) for the next attempt
+                self._ops[:0] = ops
+            return False
+
+    # --- recovery and retries ---
+
+    def start_pump(self, news_queue):
+        """Recovers rows left by a previous run, then keeps feeding due retries into news_queue."""
+        if self._pump is not None: return
+        self.recover()
+        self._pump = threading.Thread(target=self._run_pump, args=(news_queue,), name="inbox-pump", daemon=True)
+        self._pump.start()
+
+    def recover(self):
+        """Makes rows still processing from before this inbox started claimable again."""
+        recovered = recover_inbox_items(self.started_at, time.time())
+        if recovered:
+            metrics.incr("news.inbox.recovered", recovered)
+            print(f"♻️ Recovered {recovered} unfinished news items from the inbox")
+        return recovered
+
+    def _run_pump(self, news_queue):
+        while True:
+            try:
+                self.claim_into(news_queue)
+            except Exception as e:
+                print(f"⚠️ Inbox Pump Error: {e}")
+            time.sleep(INBOX_POLL_INTERVAL)
+
+    def claim_into(self, news_queue, limit=INBOX_CLAIM_BATCH):
+        """Claims a batch of due rows and queues them; returns how many."""
+        room = news_queue.capacity // 2 - news_queue.qsize()
+        if room <= 0: return 0  # Backlogged: live items go first
+        self.flush()
+        claimed = claim_inbox_items(time.time(), min(room, limit))
+        for inbox_id, payload, attempts in claimed:
+            task = json.loads(payload)
+            task["inbox_id"], task["attempts"] = inbox_id, attempts
+            news_queue.put(task)
+        return len(claimed)
+
+    def counts(self):
+        return count_inbox_items()
@@ -0,0 +1,476 @@
+import numpy as np
+import pandas as pd
+from config import VWAP_BANDS, RSI_PERIOD
+
+OHLCV_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+O, H, L, C, V = range(len(OHLCV_FIELDS))
+
+RVOL_WINDOW = 20
+BAND_WINDOW = 26
+MIN_BARS = 50
+
+def is_index_ticker(ticker):
+    # Indices (^VIX, ^TNX) and the dollar index report no volume
+    return ticker.startswith('^') or ticker == 'DX-Y.NYB'
+
+def ohlcv_block(df, tickers):
+    """
+    Stacks a group_by='ticker' download into one (bars x tickers x fields) float array.
+    Tickers missing from the frame come back as all-NaN columns.
+    """
+    if df is None or df.empty:
+        return pd.DatetimeIndex([]), np.full((0, len(tickers), len(OHLCV_FIELDS)), np.nan)
+
+    if isinstance(df.columns, pd.MultiIndex):
+        cols = pd.MultiIndex.from_product([tickers, OHLCV_FIELDS])
+        values = df.reindex(columns=cols).to_numpy(dtype=float)
+    else:
+        # Single ticker download (no ticker level)
+        values = df.reindex(columns=OHLCV_FIELDS).to_numpy(dtype=float)
+    return df.index, values.reshape(len(df.index), len(tickers), len(OHLCV_FIELDS))
+
+def missing_tickers(df, tickers):
+    """Tickers with no usable Close in the batch frame (absent or all-NaN)."""
+    _, block = ohlcv_block(df, tickers)
+    has_close = (~np.isnan(block[:, :, C])).any(axis=0) if len(block) else np.zeros(len(tickers), bool)
+    return [t for t, ok in zip(tickers, has_close) if not ok]
+
+def clean_bar_mask(block, tickers):
+    """
+    Per-ticker mask of the bars used for technicals.
+    Mirrors the old per-row scan: find the latest bar with a price (and volume for
+    non-index tickers), then keep every complete (no NaN) bar up to and including it.
+    Returns (mask[bars x tickers], has_valid[tickers]).
+    """
+    n = block.shape[0]
+    close, volume = block[:, :, C], block[:, :, V]
+    index_cols = np.array([is_index_ticker(t) for t in tickers], dtype=bool)
+
+    priced = ~np.isnan(close) & (close != 0)
+    candidate = priced & (index_cols[None, :] | (volume > 0))
+    has_valid = candidate.any(axis=0)
+    last_pos = n - 1 - np.argmax(candidate[::-1], axis=0)
+
+    rows = np.arange(n)[:, None]
+    mask = ~np.isnan(block).any(axis=2) & (rows <= last_pos[None, :]) & has_valid[None, :]
+    return mask, has_valid
+
+def compute_latest_indicators(index, block, tickers, min_bars=MIN_BARS):
+    """
+    Computes VWAP, RSI, RVOL, VWAP bands and daily change on the latest clean bar
+    of every ticker in one batched pass.
+    Returns (results, skipped): results maps ticker -> dict of values,
+    skipped maps ticker -> reason.
+    """
+    results, skipped = {}, {}
+    n, n_tickers = block.shape[0], block.shape[1]
+    if n == 0:
+        return results, {t: "has no data in the fetched period" for t in tickers}
+
+    mask, has_valid = clean_bar_mask(block, tickers)
+    counts = mask.sum(axis=0)
+
+    # Compact each column so its clean bars sit at the bottom, in time order.
+    # After this the last row is every ticker's latest clean bar and the
+    # rolling windows are plain slices across all tickers at once.
+    order = np.argsort(mask, axis=0, kind='stable')
+    bars = np.take_along_axis(block, order[:, :, None], axis=0)
+    valid = np.arange(n)[:, None] >= (n - counts)[None, :]
+
+    opens, highs, lows = bars[:, :, O], bars[:, :, H], bars[:, :, L]
+    closes, volumes = bars[:, :, C], bars[:, :, V]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        typical = (highs + lows + closes) / 3
+        pv_sum = np.where(valid, typical * volumes, 0.0).sum(axis=0)
+        v_sum = np.where(valid, volumes, 0.0).sum(axis=0)
+        vwap = pv_sum / v_sum
+
+        # Windows below only read rows inside the clean block because counts >= min_bars
+        delta = np.diff(closes[-(RSI_PERIOD + 1):], axis=0)
+        gain = np.clip(delta, 0, None).mean(axis=0)
+        loss = np.clip(-delta, 0, None).mean(axis=0)
+        rsi = 100 - (100 / (1 + gain / loss))
+
+        rvol = volumes[-1] / volumes[-RVOL_WINDOW:].mean(axis=0)
+
+        rolling_std = closes[-BAND_WINDOW:].std(axis=0, ddof=1)
+        upper = vwap + rolling_std * VWAP_BANDS
+        lower = vwap - rolling_std * VWAP_BANDS
+
+    # Daily change: first clean bar of the latest bar's calendar day
+    day_ids = np.asarray(index.normalize().asi8)[order]
+    in_day = valid & (day_ids == day_ids[-1][None, :])
+    first_in_day = np.argmax(in_day, axis=0)
+    day_open = opens[first_in_day, np.arange(n_tickers)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_change = np.where(day_open != 0, (closes[-1] - day_open) / day_open * 100, 0.0)
+
+    for j, ticker in enumerate(tickers):
+        if not has_valid[j]:
+            skipped[ticker] = "has no valid data (Price > 0 and Volume > 0) in the fetched period"
+            continue
+        if counts[j] < min_bars:
+            skipped[ticker] = f"skipped due to insufficient data points ({counts[j]})"
+            continue
+
+        results[ticker] = {
+            "timestamp": index[order[-1, j]],
+            "open": opens[-1, j],
+            "high": highs[-1, j],
+            "low": lows[-1, j],
+            "close": closes[-1, j],
+            "volume": volumes[-1, j],
+            "vwap": vwap[j],
+            "rsi": rsi[j],
+            "rvol": rvol[j],
+            "upper_band": upper[j],
+            "lower_band": lower[j],
+            "daily_change": daily_change[j],
+            "bars": int(counts[j]),
+        }
+    return results, skipped
+
+def compute_watchlist_indicators(df, tickers, min_bars=MIN_BARS):
+    """Convenience wrapper: group_by='ticker' frame in, per-ticker latest indicators out."""
+    index, block = ohlcv_block(df, tickers)
+    return compute_latest_indicators(index, block, tickers, min_bars=min_bars)
+
+def vwap_status(price, upper_band, lower_band):
+    if price > upper_band: return "OVERBOUGHT"
+    if price < lower_band: return "OVERSOLD"
+    return "NEUTRAL"
+
+# --- STREAMING STATE ---
+
+VWAP_ANCHOR_DAYS = 5  # Same anchor as the period='5d' batch download
+
+class RollingWindow:
+    """Fixed-size window with running sum and sum of squares; O(1) per push."""
+
+    def __init__(self, size, values=None):
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0
+        self.pos = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        for v in values or []:
+            self.push(v)
+
+    def push(self, value):
+        if self.count == self.size:
+            old = self.values[self.pos]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.values[self.pos] = value
+        self.total += value
+        self.total_sq += value * value
+        self.pos = (self.pos + 1) % self.size
+        if self.pos == 0:
+            # Re-sum once per lap so float drift from add/subtract stays bounded
+            self.total = sum(self.values)
+            self.total_sq = sum(v * v for v in self.values)
+
+    @property
+    def full(self):
+        return self.count == self.size
+
+    def mean(self):
+        return self.total / self.size if self.full else np.nan
+
+    def std(self):
+        # Sample std (ddof=1), like pandas rolling().std()
+        if not self.full or self.size < 2: return np.nan
+        var = (self.total_sq - self.total * self.total / self.size) / (self.size - 1)
+        return float(np.sqrt(max(var, 0.0)))
+
+    def replace_last(self, value):
+        """Overwrites the most recently pushed value (a revised bar)."""
+        last = (self.pos - 1) % self.size
+        old = self.values[last]
+        self.values[last] = value
+        self.total += value - old
+        self.total_sq += value * value - old * old
+
+    def ordered(self):
+        if self.count < self.size: return self.values[:self.count]
+        return self.values[self.pos:] + self.values[:self.pos]
+
+class TickerIndicatorState:
+    """
+    Incremental VWAP / RSI / RVOL / band state for one ticker.
+    Each bar costs O(1). Re-sending the last bar (same timestamp) revises it in place,
+    which is how the still-forming bar of the current interval is handled; all a
+    revision needs is the close before that bar and whether it opened its day.
+
+    vwap_window=None anchors VWAP over the last VWAP_ANCHOR_DAYS calendar days
+    (matching the cumulative VWAP over a period='5d' download); an integer
+    gives a rolling VWAP over that many bars instead.
+    """
+
+    def __init__(self, vwap_window=None, vwap_days=VWAP_ANCHOR_DAYS):
+        self.vwap_window = vwap_window
+        self.vwap_days = vwap_days
+        self.bars = 0
+        self.last_ts = None
+        self.last_bar = None
+        self.prev_close = None
+        self.day = None
+        self.day_open = None
+        self.day_buckets = []  # [day, pv_sum, v_sum], oldest first
+        self.pv_window = RollingWindow(vwap_window) if vwap_window else None
+        self.v_window = RollingWindow(vwap_window) if vwap_window else None
+        self.gains = RollingWindow(RSI_PERIOD)
+        self.losses = RollingWindow(RSI_PERIOD)
+        self.volumes = RollingWindow(RVOL_WINDOW)
+        self.closes = RollingWindow(BAND_WINDOW)
+        self._undo = None      # {"prev_close", "first_of_day"} of the last bar, for revisions
+
+    def update(self, ts, o, h, l, c, v):
+        """Feeds one bar. Returns False if the bar is older than the last one seen."""
+        ts = pd.Timestamp(ts)
+        bar = (float(o), float(h), float(l), float(c), float(v))
+        if self.last_ts is not None:
+            if ts < self.last_ts: return False
+            if ts == self.last_ts:
+                if self._undo is None: return False
+                self._revise(*bar)
+                return True
+        self._apply(ts, *bar)
+        return True
+
+    def _revise(self, o, h, l, c, v):
+        prev_close, first_of_day = self._undo["prev_close"], self._undo["first_of_day"]
+        _, old_h, old_l, old_c, old_v = self.last_bar
+        if first_of_day: self.day_open = o
+
+        pv = (h + l + c) / 3 * v
+        if self.vwap_window:
+            self.pv_window.replace_last(pv)
+            self.v_window.replace_last(v)
+        else:
+            self.day_buckets[-1][1] += pv - (old_h + old_l + old_c) / 3 * old_v
+            self.day_buckets[-1][2] += v - old_v
+
+        delta = 0.0 if prev_close is None else c - prev_close
+        self.gains.replace_last(max(delta, 0.0))
+        self.losses.replace_last(max(-delta, 0.0))
+        self.volumes.replace_last(v)
+        self.closes.replace_last(c)
+
+        self.prev_close = c
+        self.last_bar = (o, h, l, c, v)
+
+    def _apply(self, ts, o, h, l, c, v):
+        day = ts.date().isoformat()
+        self._undo = {"prev_close": self.prev_close, "first_of_day": day != self.day}
+        if day != self.day:
+            self.day, self.day_open = day, o
+            if not self.vwap_window:
+                self.day_buckets.append([day, 0.0, 0.0])
+                if len(self.day_buckets) > self.vwap_days:
+                    self.day_buckets.pop(0)
+
+        pv = (h + l + c) / 3 * v
+        if self.vwap_window:
+            self.pv_window.push(pv)
+            self.v_window.push(v)
+        else:
+            self.day_buckets[-1][1] += pv
+            self.day_buckets[-1][2] += v
+
+        delta = 0.0 if self.prev_close is None else c - self.prev_close
+        self.gains.push(max(delta, 0.0))
+        self.losses.push(max(-delta, 0.0))
+        self.volumes.push(v)
+        self.closes.push(c)
+
+        self.prev_close = c
+        self.last_ts = ts
+        self.last_bar = (o, h, l, c, v)
+        self.bars += 1
+
+    def vwap(self):
+        if self.vwap_window:
+            if not self.v_window.full: return np.nan
+            pv, vol = self.pv_window.total, self.v_window.total
+        else:
+            pv = sum(b[1] for b in self.day_buckets)
+            vol = sum(b[2] for b in self.day_buckets)
+        return pv / vol if vol else np.nan
+
+    def rsi(self):
+        if not self.gains.full: return np.nan
+        gain, loss = self.gains.mean(), self.losses.mean()
+        if loss == 0: return 100.0 if gain > 0 else np.nan
+        return 100 - (100 / (1 + gain / loss))
+
+    def snapshot(self):
+        """Latest values in the same shape as compute_latest_indicators results."""
+        if self.last_bar is None: return None
+        o, h, l, c, v = self.last_bar
+        vwap = self.vwap()
+        std = self.closes.std()
+        avg_vol = self.volumes.mean()
+        return {
+            "timestamp": self.last_ts,
+            "open": o, "high": h, "low": l, "close": c, "volume": v,
+            "vwap": vwap,
+            "rsi": self.rsi(),
+            "rvol": v / avg_vol if avg_vol else np.nan,
+            "avg_volume": avg_vol,
+            "upper_band": vwap + std * VWAP_BANDS,
+            "lower_band": vwap - std * VWAP_BANDS,
+            "daily_change": (c - self.day_open) / self.day_open * 100 if self.day_open else 0.0,
+            "bars": self.bars,
+        }
+
+    # --- Checkpointing ---
+
+    def to_dict(self):
+        data = {
+            "vwap_window": self.vwap_window,
+            "vwap_days": self.vwap_days,
+            "bars": self.bars,
+            "last_ts": self.last_ts.isoformat() if self.last_ts is not None else None,
+            "last_bar": list(self.last_bar) if self.last_bar else None,
+            "prev_close": self.prev_close,
+            "day": self.day,
+            "day_open": self.day_open,
+            "day_buckets": [list(b) for b in self.day_buckets],
+            "pv_window": self.pv_window.ordered() if self.pv_window else None,
+            "v_window": self.v_window.ordered() if self.v_window else None,
+            "gains": self.gains.ordered(),
+            "losses": self.losses.ordered(),
+            "volumes": self.volumes.ordered(),
+            "closes": self.closes.ordered(),
+            # Keeps the forming bar revisable after a restore
+            "undo": self._undo,
+        }
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(vwap_window=data.get("vwap_window"), vwap_days=data.get("vwap_days", VWAP_ANCHOR_DAYS))
+        state._restore(data)
+        state._undo = data.get("undo")
+        return state
+
+    def _restore(self, data):
+        self.bars = data["bars"]
+        self.last_ts = pd.Timestamp(data["last_ts"]) if data["last_ts"] else None
+        self.last_bar = tuple(data["last_bar"]) if data["last_bar"] else None
+        self.prev_close = data["prev_close"]
+        self.day = data["day"]
+        self.day_open = data["day_open"]
+        self.day_buckets = [list(b) for b in data["day_buckets"]]
+        if self.vwap_window:
+            self.pv_window = RollingWindow(self.vwap_window, data["pv_window"])
+            self.v_window = RollingWindow(self.vwap_window, data["v_window"])
+        self.gains = RollingWindow(RSI_PERIOD, data["gains"])
+        self.losses = RollingWindow(RSI_PERIOD, data["losses"])
+        self.volumes = RollingWindow(RVOL_WINDOW, data["volumes"])
+        self.closes = RollingWindow(BAND_WINDOW, data["closes"])
+
+def update_indicator_states(states, df, tickers, min_bars=MIN_BARS, **state_kwargs):
+    """
+    Feeds only the bars newer than each ticker's state (plus the last one, which may
+    have been revised) and returns (results, skipped) like compute_latest_indicators.
+    States whose last bar predates the frame (restart after a gap) are rebuilt.
+    """
+    index, block = ohlcv_block(df, tickers)
+    results, skipped = {}, {}
+    if len(index) == 0:
+        return results, {t: "has no data in the fetched period" for t in tickers}
+
+    mask, has_valid = clean_bar_mask(block, tickers)
+    for j, ticker in enumerate(tickers):
+        if not has_valid[j]:
+            skipped[ticker] = "has no valid data (Price > 0 and Volume > 0) in the fetched period"
+            continue
+
+        rows = np.flatnonzero(mask[:, j])
+        state = states.get(ticker)
+        if state is None or state.last_ts is None or state.last_ts < index[rows[0]]:
+            state = states[ticker] = TickerIndicatorState(**state_kwargs)
+        else:
+            rows = rows[index[rows] >= state.last_ts]
+
+        for r in rows:
+            state.update(index[r], *block[r, j])
+
+        if state.bars < min_bars:
+            skipped[ticker] = f"skipped due to insufficient data points ({state.bars})"
+            continue
+        results[ticker] = state.snapshot()
+    return results, skipped
+
+# --- DAILY HISTORY ---
+
+class DailyHistoryCache:
+    """
+    Daily closes for the macro universe, loaded once per day and patched intraday.
+    Rows dated before `today` are completed; today's row (if any ticker traded) is
+    the live row, forward-filled like the full-frame version so quiet tickers read
+    as unchanged. The SMA keeps the sum of the last window-1 completed closes, so
+    patching a live price is O(1).
+    """
+
+    def __init__(self, window=200):
+        self.window = window
+        self.loaded_for = None
+        self.completed = {}   # ticker -> np.array of completed closes (leading NaN dropped)
+        self.tail_sum = {}    # ticker -> sum of the last window-1 completed closes
+        self.live = {}        # ticker -> today's price
+        self.has_live_row = False
+
+    def load(self, closes, today):
+        """closes: forward-filled daily Close frame (one column per ticker)."""
+        dates = np.array(closes.index.date)
+        past = closes[dates < today]
+        current = closes[dates == today]
+
+        self.completed, self.tail_sum, self.live = {}, {}, {}
+        for ticker in closes.columns:
+            series = past[ticker].dropna().to_numpy(dtype=float)
+            self.completed[ticker] = series
+            self.tail_sum[ticker] = float(series[-(self.window - 1):].sum()) if len(series) else 0.0
+            if len(current) and not np.isnan(current[ticker].iloc[-1]):
+                self.live[ticker] = float(current[ticker].iloc[-1])
+        self.has_live_row = len(current) > 0
+        self.loaded_for = today
+
+    def set_live(self, ticker, price):
+        if ticker not in self.completed or price is None or price != price: return
+        self.live[ticker] = float(price)
+        self.has_live_row = True
+
+    def latest(self, ticker):
+        hist = self.completed.get(ticker)
+        if hist is None: return None
+        if self.has_live_row and ticker in self.live: return self.live[ticker]
+        return hist[-1] if len(hist) else None
+
+    def previous(self, ticker):
+        hist = self.completed.get(ticker)
+        if hist is None: return None
+        if self.has_live_row: return hist[-1] if len(hist) else None
+        return hist[-2] if len(hist) >= 2 else None
+
+    def sma(self, ticker):
+        """Window SMA ending at the latest value (live row included), or None."""
+        hist = self.completed.get(ticker)
+        if hist is None: return None
+        if self.has_live_row:
+            if len(hist) + 1 < self.window: return None
+            return (self.tail_sum[ticker] + self.latest(ticker)) / self.window
+        if len(hist) < self.window: return None
+        return (self.tail_sum[ticker] + hist[-self.window]) / self.window
+
+    def rows(self):
+        """Number of rows the full frame would have (completed + live)."""
+        longest = max((len(h) for h in self.completed.values()), default=0)
+        return longest + (1 if self.has_live_row else 0)
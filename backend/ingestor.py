@@ -1,68 +1,179 @@
 import time
 import json
+import queue
 import websocket
 import requests
 import threading
 import logging
-from config import PUSHBULLET_API_KEY, PUSHBULLET_STREAM_URL, PUSHBULLET_API_URL, PUSHBULLET_HEARTBEAT_TIMEOUT
+from collections import OrderedDict
+from config import (
+    PUSHBULLET_API_KEY, PUSHBULLET_STREAM_URL, PUSHBULLET_API_URL, PUSHBULLET_HEARTBEAT_TIMEOUT,
+    PUSHBULLET_PAGE_LIMIT, PUSHBULLET_FETCH_TIMEOUT, PUSHBULLET_SEEN_IDENS, PUSHBULLET_FETCH_WORKERS,
+    PUSHBULLET_LOG_LEVEL
+)
+from database import load_app_state, save_app_state
 import bot_logic
 from notifications import send_system_alert
+import metrics
 
-# Heartbeat State
+# Heartbeat State (a float store is atomic: the websocket thread never takes a lock for it)
 LAST_HEARTBEAT_TIME = time.time()
-HEARTBEAT_LOCK = threading.Lock()
+
+# Tickles are handed to the fetcher pool and mirrored notifications to the mirror
+# consumer; the websocket thread never does HTTP or touches the inbox/queue
+TICKLES = queue.SimpleQueue()
+MIRRORS = queue.SimpleQueue()
+FETCHERS = []
+MIRROR_CONSUMER = None
+metrics.register_gauge("pushbullet.pending_tickles", lambda: TICKLES.qsize())
+metrics.register_gauge("pushbullet.pending_mirrors", lambda: MIRRORS.qsize())
+
+# Push retrieval: one pooled HTTPS session, a persisted modified_after cursor and
+# the idens already handed on (pushes come back when they are edited or dismissed)
+SESSION = requests.Session()
+SESSION.headers.update({"Access-Token": PUSHBULLET_API_KEY or ""})
+CURSOR_KEY = "pushbullet_modified_after"
+PUSH_CURSOR = None
+SEEN_IDENS = OrderedDict()
+FETCH_LOCK = threading.Lock()
 
 # Configure Logging
 logging.basicConfig(
     filename='pushbullet_debug.log',
-    level=logging.DEBUG,
+    level=getattr(logging, PUSHBULLET_LOG_LEVEL.upper(), logging.INFO),
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def fetch_latest_push():
-    time.sleep(2)
+def _remember_iden(iden):
+    """True the first time an iden is seen."""
+    if iden in SEEN_IDENS: return False
+    SEEN_IDENS[iden] = True
+    while len(SEEN_IDENS) > PUSHBULLET_SEEN_IDENS:
+        SEEN_IDENS.popitem(last=False)
+    return True
+
+def fetch_new_pushes():
+    """
+    Every push modified since the cursor, oldest first, following the API's paging cursor.
+    Returns (new pushes, cursor after them); the caller holds FETCH_LOCK and advances
+    PUSH_CURSOR, so a failed fetch is retried in full on the next tickle or reconnect.
+    """
+    pushes, page_cursor = [], None
     try:
-        headers = {"Access-Token": PUSHBULLET_API_KEY}
-        resp = requests.get(PUSHBULLET_API_URL, headers=headers)
-        if resp.status_code == 200:
-            pushes = resp.json().get("pushes", [])
-            if pushes:
-                logging.debug(f"Latest Push Fetched: {json.dumps(pushes[0])}")
-                return pushes[0]
+        while True:
+            params = {"modified_after": PUSH_CURSOR, "limit": PUSHBULLET_PAGE_LIMIT}
+            if page_cursor: params["cursor"] = page_cursor
+            resp = SESSION.get(PUSHBULLET_API_URL, params=params, timeout=PUSHBULLET_FETCH_TIMEOUT)
+            if resp.status_code != 200:
+                logging.error(f"Push fetch failed: HTTP {resp.status_code} {resp.text[:200]}")
+                return [], PUSH_CURSOR
+            data = resp.json()
+            pushes.extend(data.get("pushes", []))
+            page_cursor = data.get("cursor")
+            if not page_cursor: break
     except Exception as e:
-        logging.error(f"Error fetching latest push: {e}")
-    return None
+        logging.error(f"Error fetching pushes: {e}")
+        return [], PUSH_CURSOR
+
+    cursor = max([PUSH_CURSOR] + [p.get("modified", 0) for p in pushes])
+    fresh = [p for p in sorted(pushes, key=lambda p: p.get("modified", 0))
+             if p.get("active", True) and _remember_iden(p.get("iden"))]
+    logging.debug(f"Fetched {len(pushes)} pushes, {len(fresh)} new (cursor {cursor})")
+    return fresh, cursor
+
+def submit_fetched_pushes():
+    global PUSH_CURSOR
+    with FETCH_LOCK:
+        if PUSH_CURSOR is None:
+            # First run: start from now instead of replaying the whole account history
+            PUSH_CURSOR = load_app_state(CURSOR_KEY) or time.time()
+        pushes, cursor = fetch_new_pushes()
+        for latest in pushes:
+            if latest.get('type') in ["mirror", "note", "link"]:
+                logging.info(f"Processing Tickle Push: {latest.get('title')}")
+                bot_logic.submit_news({
+                    "title": latest.get('title', ''),
+                    "body": latest.get('body', ''),
+                    "source": latest.get("application_name", "Pushbullet"),
+                    "package": None,
+                    "icon": None,
+                    "received_at": time.time()
+                })
+            else:
+                logging.info(f"Ignored Tickle Push Type: {latest.get('type')}")
+        if cursor <= PUSH_CURSOR: return
+        # The cursor only moves past these pushes once their inbox rows are on disk:
+        # a crash before that re-fetches them on restart
+        if not bot_logic.INBOX.flush():
+            logging.error("Inbox flush failed; push cursor not advanced")
+            return
+        PUSH_CURSOR = cursor
+        save_app_state(CURSOR_KEY, PUSH_CURSOR)
+
+def _fetch_worker():
+    while True:
+        TICKLES.get()
+        # One fetch covers every tickle queued so far
+        coalesced = 0
+        while True:
+            try:
+                TICKLES.get_nowait()
+                coalesced += 1
+            except queue.Empty:
+                break
+        if coalesced: metrics.incr("pushbullet.tickles_coalesced", coalesced)
+        try:
+            with metrics.timed("pushbullet.fetch"):
+                submit_fetched_pushes()
+        except Exception as e:
+            print(f"⚠️ Pushbullet Fetch Error: {e}")
+            logging.error(f"Pushbullet Fetch Error: {e}")
+
+def _mirror_worker():
+    # One consumer, so mirrors reach submit_news in arrival order
+    while True:
+        task = MIRRORS.get()
+        try:
+            bot_logic.submit_news(task)
+            print(f"📱 Mirror: {task['source']} ({task['package']})")
+        except Exception as e:
+            print(f"⚠️ Pushbullet Mirror Error: {e}")
+            logging.error(f"Pushbullet Mirror Error: {e}")
+
+def start_mirror_consumer():
+    global MIRROR_CONSUMER
+    if MIRROR_CONSUMER is None:
+        MIRROR_CONSUMER = threading.Thread(target=_mirror_worker, name="push-mirrors", daemon=True)
+        MIRROR_CONSUMER.start()
+
+def start_fetchers(workers=PUSHBULLET_FETCH_WORKERS):
+    while len(FETCHERS) < workers:
+        t = threading.Thread(target=_fetch_worker, name=f"push-fetcher-{len(FETCHERS) + 1}", daemon=True)
+        t.start()
+        FETCHERS.append(t)
 
 def on_message(ws, message):
+    # Runs on the websocket thread: parse and hand off only, so frames and heartbeats never back up
+    start = time.perf_counter()
+    kind = "invalid"
     try:
-        print(f"📩 Raw Message: {message}")
-        logging.info(f"Raw Message Received: {message}")
         data = json.loads(message)
+        kind = data.get("type", "unknown")
         
         # Update Heartbeat on ANY message (including 'nop')
         global LAST_HEARTBEAT_TIME
-        with HEARTBEAT_LOCK:
-            LAST_HEARTBEAT_TIME = time.time()
+        LAST_HEARTBEAT_TIME = time.time()
+        if kind == "nop": return
+
+        logging.debug(f"Raw Message Received: {message}")
         
         # 1. SERVER PUSHES (Notes/Links) - No Icon usually
-        if data.get("type") == "tickle" and data.get("subtype") == "push":
-            logging.info("Tickle received, fetching latest push...")
-            latest = fetch_latest_push()
-            if latest:
-                if latest.get('type') in ["mirror", "note", "link"]:
-                    logging.info(f"Processing Tickle Push: {latest.get('title')}")
-                    bot_logic.NEWS_QUEUE.put({
-                        "title": latest.get('title', ''),
-                        "body": latest.get('body', ''),
-                        "source": latest.get("application_name", "Pushbullet"),
-                        "package": None,
-                        "icon": None 
-                    })
-                else:
-                    logging.info(f"Ignored Tickle Push Type: {latest.get('type')}")
+        if kind == "tickle" and data.get("subtype") == "push":
+            logging.info("Tickle received, queued for the fetcher pool")
+            TICKLES.put(time.time())
 
         # 2. EPHEMERALS (Mirrored Notifications) - HAS ICON & PACKAGE
-        elif data.get("type") == "push":
+        elif kind == "push":
             push = data.get("push", {})
             logging.debug(f"Ephemeral Push Data: {json.dumps(push)}")
             
@@ -71,15 +182,15 @@ def on_message(ws, message):
                 app_name = push.get("application_name", "Unknown App")
                 package = push.get("package_name", None) # Normalize source
                 
-                logging.info(f"Processing Mirror: {app_name} - {push.get('title')}")
-                bot_logic.NEWS_QUEUE.put({
+                logging.info(f"Queued Mirror: {app_name} - {push.get('title')}")
+                MIRRORS.put({
                     "title": push.get('title', ''),
                     "body": push.get('body', ''),
                     "source": app_name,
                     "package": package,
-                    "icon": None
+                    "icon": None,
+                    "received_at": time.time()
                 })
-                print(f"📱 Mirror: {app_name} ({package})")
             else:
                 logging.info(f"Ignored Ephemeral Push Type: {push.get('type')}")
 
@@ -89,20 +200,31 @@ def on_message(ws, message):
     except Exception as e:
         print(f"⚠️ Pushbullet Message Error: {e}")
         logging.error(f"Pushbullet Message Error: {e}")
+    finally:
+        metrics.incr(f"pushbullet.frames.{kind}")
+        metrics.observe("pushbullet.frame", time.perf_counter() - start)
 
 def on_error(ws, error):
     print(f"⚠️ Pushbullet WebSocket Error: {error}")
     logging.error(f"WebSocket Error: {error}")
 
+def on_open(ws):
+    # Catch up on pushes sent while the stream was down
+    logging.info("WebSocket Opened, fetching pushes since the cursor...")
+    TICKLES.put(time.time())
+
 def on_close(ws, close_status_code, close_msg):
     print(f"🔌 Pushbullet WebSocket Closed: {close_status_code} - {close_msg}")
     logging.info(f"WebSocket Closed: {close_status_code} - {close_msg}")
 
 def start_listening():
     ws_url = f"{PUSHBULLET_STREAM_URL}{PUSHBULLET_API_KEY}"
+    start_fetchers()
+    start_mirror_consumer()
     while True:
         try:
             ws = websocket.WebSocketApp(ws_url, 
+                                      on_open=on_open,
                                       on_message=on_message,
                                       on_error=on_error,
                                       on_close=on_close)
@@ -119,10 +241,7 @@ def heartbeat_monitor():
     alert_sent = False
     while True:
         time.sleep(10)
-        with HEARTBEAT_LOCK:
-            last_time = LAST_HEARTBEAT_TIME
-        
-        elapsed = time.time() - last_time
+        elapsed = time.time() - LAST_HEARTBEAT_TIME
         if elapsed > PUSHBULLET_HEARTBEAT_TIMEOUT:
             if not alert_sent:
                 print(f"⚠️ Pushbullet Heartbeat Lost! ({int(elapsed)}s)")
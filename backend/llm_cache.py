@@ -0,0 +1,78 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from config import LLM_CACHE_TTL, LLM_CACHE_SIZE
+from database import load_llm_cache, save_llm_cache, prune_llm_cache
+import metrics
+
+PRUNE_EVERY = 3600  # Seconds between TTL sweeps of the SQLite table
+
+def normalize_text(text):
+    """Case/whitespace-insensitive form, so re-pushed copies of a headline hash the same."""
+    return re.sub(r"\s+", " ", (text or "")).strip().lower()
+
+def content_key(kind, version, *parts):
+    digest = hashlib.sha256()
+    for part in (kind, version) + parts:
+        digest.update(normalize_text(part).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+class LLMCache:
+    """
+    Persistent cache for LLM outputs: an in-memory LRU in front of the llm_cache table.
+    Values are strings (JSON analyses) or bytes (binary embeddings); entries older
+    than ttl seconds are treated as missing.
+    """
+
+    def __init__(self, max_items=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (value, created_at)
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def get(self, kind, key):
+        start = time.perf_counter()
+        now = time.time()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._items.move_to_end(key)
+                    metrics.incr(f"llm_cache.{kind}.hit")
+                    metrics.observe("llm_cache.memory_hit", time.perf_counter() - start)
+                    return entry[0]
+                del self._items[key]
+
+        row = load_llm_cache(key, now - self.ttl)
+        if row is None:
+            metrics.incr(f"llm_cache.{kind}.miss")
+            return None
+        self._remember(key, row[0], row[1])
+        metrics.incr(f"llm_cache.{kind}.hit")
+        metrics.observe("llm_cache.disk_hit", time.perf_counter() - start)
+        return row[0]
+
+    def put(self, kind, key, value):
+        now = time.time()
+        self._remember(key, value, now)
+        save_llm_cache(key, kind, value, now)
+        if now - self._last_prune > PRUNE_EVERY:
+            self._last_prune = now
+            prune_llm_cache(now - self.ttl)
+
+    def _remember(self, key, value, created_at):
+        with self._lock:
+            self._items[key] = (value, created_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear_memory(self):
+        with self._lock:
+            self._items.clear()
+
+LLM_CACHE = LLMCache()
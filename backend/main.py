@@ -8,14 +8,21 @@ import datetime
 import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 from contextlib import asynccontextmanager
 
 # --- IMPORT MODULES ---
 import bot_logic
 import ingestor
 import monitor
-from database import init_db, DB_FILE
+import metrics
+from database import init_db, DB_FILE, DB_WRITER
+from vector_index import VECTOR_INDEX
+from novelty import NOVELTY
+from prefilter import PREFILTER
+from notifications import DISPATCHER
+from analysis import get_text_embedding
+from embeddings import decode_embedding
 
 # --- LIFECYCLE MANAGER ---
 @asynccontextmanager
@@ -26,8 +33,14 @@ async def lifespan(app: FastAPI):
     threading.Thread(target=ingestor.start_listening, daemon=True).start()
     threading.Thread(target=monitor.vwap_monitor_loop, daemon=True).start()
     threading.Thread(target=monitor.macro_monitor_loop, daemon=True).start()
+    threading.Thread(target=VECTOR_INDEX.load, daemon=True).start()
+    threading.Thread(target=NOVELTY.load_recent, daemon=True).start()
+    threading.Thread(target=PREFILTER.run_training_loop, daemon=True).start()
     yield
     print("🛑 Shutting down engine...")
+    bot_logic.INBOX.flush()
+    DISPATCHER.flush()
+    DB_WRITER.flush()
 
 # --- APP CONFIGURATION ---
 app = FastAPI(title="Market Mind API", lifespan=lifespan)
@@ -54,7 +67,7 @@ def get_intelligence_feed(before_id: int = None, limit: int = 50):
                        timestamp, impact_score, sentiment, body, ticker, thesis,
                        market_vix, market_sector_json, 
                        ticker_rsi, ticker_rvol, session_phase,
-                       event_category, ai_confidence, novelty_score
+                       event_category, ai_confidence, novelty_score, local_novelty_score
                 FROM logs 
                 WHERE status = 'SUCCESS'
             """
@@ -109,7 +122,8 @@ def get_intelligence_feed(before_id: int = None, limit: int = 50):
                         "session": row["session_phase"],
                         "sectors": sector_data,
                         "confidence": row["ai_confidence"],
-                        "novelty": row["novelty_score"]
+                        "novelty": row["novelty_score"],
+                        "local_novelty": row["local_novelty_score"]
                     },
                     "novelty_score": row["novelty_score"]
                 })
@@ -197,9 +211,64 @@ def get_weekly_analysis():
         print(f"Analysis API Error: {e}")
         return {"error": str(e)}
 
+def _similar_events(hits):
+    """Attaches log details to [(id, score)] search hits, keeping their order."""
+    if not hits: return []
+    scores = dict(hits)
+    with sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True) as conn:
+        conn.row_factory = sqlite3.Row
+        placeholders = ",".join("?" * len(scores))
+        rows = conn.execute(f"""
+            SELECT id, timestamp, title, body, source_app, ticker, impact_score,
+                   sentiment, event_category, thesis, cluster_id
+            FROM logs WHERE id IN ({placeholders})
+        """, list(scores)).fetchall()
+    results = [dict(row, similarity=round(scores[row["id"]], 4)) for row in rows]
+    return sorted(results, key=lambda r: -r["similarity"])
+
+@app.get("/api/similar/{event_id}")
+def get_similar_events(event_id: int, k: int = 10):
+    """Past events closest to a logged event (cosine similarity of their embeddings)."""
+    try:
+        vector = VECTOR_INDEX.vector(event_id)
+        if vector is None:
+            # Not indexed yet (e.g. index still loading): read it from the DB
+            with sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True) as conn:
+                row = conn.execute("SELECT text_embedding FROM logs WHERE id = ?", (event_id,)).fetchone()
+            vector = decode_embedding(row[0]) if row else None
+        if vector is None:
+            return {"error": f"No embedding for event {event_id}"}
+        return _similar_events(VECTOR_INDEX.search(vector, k=k, exclude_id=event_id))
+    except Exception as e:
+        print(f"Similar API Error: {e}")
+        return {"error": str(e)}
+
+@app.get("/api/similar")
+def search_similar_events(q: str, k: int = 10):
+    """Past events closest to a free-text query."""
+    try:
+        vector = decode_embedding(get_text_embedding(q))
+        if vector is None:
+            return {"error": "Could not embed query"}
+        return _similar_events(VECTOR_INDEX.search(vector, k=k))
+    except Exception as e:
+        print(f"Similar API Error: {e}")
+        return {"error": str(e)}
+
 @app.get("/api/signals")
 def get_active_signals():
-    return list(monitor.LATEST_VWAP_DATA.values())
+    # Serialized once per monitor cycle; serving it is a pointer read
+    snapshot = monitor.current_snapshot()
+    return Response(content=snapshot.signals_json, media_type="application/json",
+                    headers={"X-Snapshot-Version": str(snapshot.version)})
+
+@app.get("/api/metrics")
+def get_metrics():
+    return metrics.snapshot()
+
+def _embedding_json(blob):
+    vector = decode_embedding(blob)
+    return json.dumps(vector.tolist()) if vector is not None else None
 
 @app.get("/api/export")
 def export_dataset():
@@ -210,6 +279,10 @@ def export_dataset():
             cursor.execute("SELECT * FROM logs")
             headers = [d[0] for d in cursor.description]
             rows = cursor.fetchall()
+            # Embeddings are stored packed: export them as JSON lists, like the legacy text rows
+            emb_col = headers.index("text_embedding") if "text_embedding" in headers else None
+            if emb_col is not None:
+                rows = [row[:emb_col] + (_embedding_json(row[emb_col]),) + row[emb_col + 1:] for row in rows]
             
             output = io.StringIO()
             writer = csv.writer(output)
@@ -0,0 +1,167 @@
+import threading
+import random
+import datetime
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import (
+    BAR_STORE_RETENTION_DAYS, FALLBACK_WORKERS, FALLBACK_TIMEOUT, FALLBACK_RETRIES,
+    FALLBACK_BACKOFF, FALLBACK_FAILURE_THRESHOLD, FALLBACK_COOLDOWN
+)
+from database import save_bars, get_latest_bar_times, load_bar_rows, prune_bars
+from indicators import OHLCV_FIELDS
+from providers import get_provider, is_intraday, period_to_days, to_epoch, rows_to_frame
+
+PRUNE_EVERY = 3600  # Seconds between retention sweeps per interval
+_LAST_PRUNE = {}
+
+FALLBACK_POOL = ThreadPoolExecutor(max_workers=FALLBACK_WORKERS, thread_name_prefix="fallback")
+TICKER_FAILURES = {}  # ticker -> {"failures": consecutive failed cycles, "cooldown_until": epoch}
+FAILURES_LOCK = threading.Lock()
+
+def _store_frame(df, tickers, interval):
+    """Writes every bar with a Close into the store."""
+    if df.empty: return
+    epochs = to_epoch(df.index)
+    rows = []
+    for ticker in tickers:
+        if ticker not in df.columns.get_level_values(0): continue
+        values = df[ticker].reindex(columns=OHLCV_FIELDS).to_numpy(dtype=float)
+        for ts, (o, h, l, c, v) in zip(epochs, values):
+            if c != c: continue  # NaN close: no bar
+            rows.append((ticker, int(ts), o, h, l, c, v))
+    if rows:
+        save_bars(interval, rows)
+
+def _start_arg(epoch, interval):
+    start = datetime.datetime.fromtimestamp(epoch, tz=datetime.timezone.utc)
+    return start if is_intraday(interval) else start.strftime("%Y-%m-%d")
+
+def refresh_bars(tickers, interval, period):
+    """
+    Brings the local bar store up to date.
+    Tickers with recent bars only download from their last stored bar onward (the last
+    bar is re-fetched because it may still have been forming); the rest get the full period.
+    Returns what was downloaded, as a group_by='ticker' frame.
+    """
+    provider = get_provider()
+    now = provider.now()
+    window_start = now - period_to_days(period) * 86400
+    latest = get_latest_bar_times(tickers, interval)
+
+    warm = [t for t in tickers if latest.get(t, 0) >= window_start]
+    cold = [t for t in tickers if t not in warm]
+    frames = []
+
+    if cold:
+        try:
+            df = provider.download(cold, interval, period=period)
+            _store_frame(df, cold, interval)
+            frames.append(df)
+        except Exception as e:
+            print(f"⚠️ Download failed for {len(cold)} tickers ({interval}): {e}")
+
+    if warm:
+        start = _start_arg(min(latest[t] for t in warm), interval)
+        try:
+            df = provider.download(warm, interval, start=start)
+            _store_frame(df, warm, interval)
+            frames.append(df)
+        except Exception as e:
+            print(f"⚠️ Delta download failed for {len(warm)} tickers ({interval}): {e}")
+
+    _maybe_prune(interval, now)
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+# --- PER-TICKER FALLBACK ---
+
+def _record_fetch(ticker, ok):
+    with FAILURES_LOCK:
+        if ok:
+            TICKER_FAILURES.pop(ticker, None)
+            return
+        entry = TICKER_FAILURES.setdefault(ticker, {"failures": 0, "cooldown_until": 0})
+        entry["failures"] += 1
+        if entry["failures"] >= FALLBACK_FAILURE_THRESHOLD:
+            entry["cooldown_until"] = get_provider().now() + FALLBACK_COOLDOWN
+            print(f"🧊 {ticker} failed {entry['failures']} times in a row, skipping for {FALLBACK_COOLDOWN}s")
+
+def in_cooldown(ticker):
+    with FAILURES_LOCK:
+        entry = TICKER_FAILURES.get(ticker)
+        return bool(entry) and entry["cooldown_until"] > get_provider().now()
+
+def _fetch_one(provider, ticker, interval, kwargs):
+    """One ticker with retries (exponential backoff + jitter). Stores what it gets."""
+    error = "no data"
+    for attempt in range(FALLBACK_RETRIES + 1):
+        try:
+            df = provider.history(ticker, interval, timeout=FALLBACK_TIMEOUT, **kwargs)
+            if not df.empty:
+                _store_frame(df, [ticker], interval)
+                _record_fetch(ticker, True)
+                return df
+        except Exception as e:
+            error = e
+        if attempt < FALLBACK_RETRIES:
+            provider.sleep(FALLBACK_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+    _record_fetch(ticker, False)
+    raise RuntimeError(f"{ticker}: {error}")
+
+def fetch_missing(tickers, interval, period):
+    """
+    Fetches tickers the batch call missed on the bounded FALLBACK_POOL.
+    Tickers parked after repeated failures are skipped until their cooldown ends.
+    Returns the set of tickers that received bars.
+    """
+    provider = get_provider()
+    window_start = provider.now() - period_to_days(period) * 86400
+    latest = get_latest_bar_times(tickers, interval)
+
+    futures = {}
+    for ticker in tickers:
+        if in_cooldown(ticker): continue
+        last = latest.get(ticker, 0)
+        kwargs = {"start": _start_arg(last, interval)} if last >= window_start else {"period": period}
+        futures[FALLBACK_POOL.submit(_fetch_one, provider, ticker, interval, kwargs)] = ticker
+    if not futures: return set()
+
+    # Worst case per ticker: every attempt times out plus the largest backoffs
+    budget = (FALLBACK_RETRIES + 1) * FALLBACK_TIMEOUT + FALLBACK_BACKOFF * 1.5 * (2 ** FALLBACK_RETRIES)
+    done, pending = wait(futures, timeout=budget)
+    received = set()
+    for fut in done:
+        try:
+            fut.result()
+            received.add(futures[fut])
+        except Exception as e:
+            print(f"❌ Failed to download {e}")
+    for fut in pending:
+        print(f"⏱️ Fallback download for {futures[fut]} still running, not waiting")
+    return received
+
+def _maybe_prune(interval, now):
+    if now - _LAST_PRUNE.get(interval, 0) < PRUNE_EVERY: return
+    _LAST_PRUNE[interval] = now
+    retention = BAR_STORE_RETENTION_DAYS.get(interval)
+    if retention:
+        prune_bars(interval, int(now - retention * 86400))
+
+def load_bars(tickers, interval, period):
+    """
+    Serves bars from the local store as a group_by='ticker' frame (see rows_to_frame for its index).
+    Intraday 'Nd' periods keep each ticker's last N distinct days, like yfinance does.
+    """
+    days = period_to_days(period)
+    # Intraday windows skip weekends/holidays, so look back further and trim per ticker
+    lookback = days * 2 + 4 if is_intraday(interval) else days
+    now = get_provider().now()
+    rows = [r for r in load_bar_rows(tickers, interval, int(now - lookback * 86400)) if r[1] <= now]
+    return rows_to_frame(rows, interval, period)
+
+def get_bars(tickers, interval, period):
+    """Delta-refreshes the store, then serves the full period from disk."""
+    downloaded = refresh_bars(tickers, interval, period)
+    df = load_bars(tickers, interval, period)
+    # Store unavailable (e.g. init_db not run): fall back to what was just downloaded
+    return df if not df.empty else downloaded
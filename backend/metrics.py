@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import deque
+
+# In-process counters, gauges and latency samples, served by /api/metrics.
+_LOCK = threading.Lock()
+COUNTERS = {}
+GAUGES = {}        # name -> zero-arg callable, evaluated on read
+LATENCIES = {}     # name -> deque of recent samples (seconds)
+LATENCY_SAMPLES = 1000
+STARTED_AT = time.time()
+
+def incr(name, n=1):
+    with _LOCK:
+        COUNTERS[name] = COUNTERS.get(name, 0) + n
+
+def observe(name, seconds):
+    with _LOCK:
+        samples = LATENCIES.get(name)
+        if samples is None:
+            samples = LATENCIES[name] = deque(maxlen=LATENCY_SAMPLES)
+        samples.append(seconds)
+
+def register_gauge(name, fn):
+    with _LOCK:
+        GAUGES[name] = fn
+
+class timed:
+    """with timed("stage"): ... records the block's duration under that name."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+def _summary(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.50) * 1000, 1),
+        "p95_ms": round(pick(0.95) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+def snapshot():
+    with _LOCK:
+        counters = dict(COUNTERS)
+        gauges = dict(GAUGES)
+        latencies = {name: list(s) for name, s in LATENCIES.items() if s}
+    values = {}
+    for name, fn in gauges.items():
+        try: values[name] = fn()
+        except Exception as e: values[name] = f"error: {e}"
+    return {
+        "uptime_s": round(time.time() - STARTED_AT),
+        "counters": counters,
+        "gauges": values,
+        "latency": {name: _summary(s) for name, s in latencies.items()},
+    }
@@ -1,22 +1,63 @@
 import threading
-import time
 import json
+import time
 import datetime
 import math
-import yfinance as yf
-import pandas as pd
+from types import MappingProxyType
 from config import (
     VWAP_WATCHLIST, VWAP_CHECK_INTERVAL, TICKER_MAP, 
-    MACRO_TICKERS, SECTOR_TICKERS, CALENDAR_EVENTS, VWAP_BANDS, RSI_PERIOD
+    MACRO_TICKERS, SECTOR_TICKERS, CALENDAR_EVENTS, INDICATOR_MODE,
+    POLL_INTERVALS, POLL_MAX_SLEEP
+)
+from database import safe_round, log_market_data, save_app_state, load_app_state
+from market_data import load_bars, fetch_missing
+from fetch_scheduler import SCHEDULER
+from providers import get_provider
+from indicators import (
+    compute_watchlist_indicators, missing_tickers, vwap_status,
+    update_indicator_states, TickerIndicatorState, DailyHistoryCache, is_index_ticker
 )
-from database import safe_round, log_market_data
-from analysis import calculate_rsi
 
 # --- STATE ---
-DATA_LOCK = threading.Lock()
-DOWNLOAD_LOCK = threading.Lock()
-LATEST_VWAP_DATA = {}
-LATEST_MACRO_CONTEXT = {}
+
+class MarketSnapshot:
+    """
+    Immutable view of the monitors' latest output. A new one is published per cycle;
+    readers grab SNAPSHOT once and never lock. The API payload and the news heatmap
+    are serialized once at publish time.
+    """
+    __slots__ = ("version", "published_at", "vwap", "macro", "vix", "signals_json", "heatmap_json")
+
+    def __init__(self, version=0, vwap=None, macro=None):
+        vwap = {t: MappingProxyType(dict(d)) for t, d in (vwap or {}).items()}
+        heatmap = {t: d.get('daily_change', 0.0) for t, d in vwap.items()}
+        fields = {
+            "version": version,
+            "published_at": time.time(),
+            "vwap": MappingProxyType(vwap),
+            "macro": MappingProxyType(dict(macro or {})),
+            "vix": vwap['^VIX'].get('price', 0.0) if '^VIX' in vwap else 0.0,
+            "signals_json": json.dumps([dict(d) for d in vwap.values()]),
+            "heatmap_json": json.dumps(heatmap),
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MarketSnapshot is immutable")
+
+SNAPSHOT = MarketSnapshot()
+PUBLISH_LOCK = threading.Lock()  # Serialises the two publishing loops; readers never take it
+INDICATOR_STATES = {}  # ticker -> TickerIndicatorState (only touched by the VWAP loop)
+DAILY_HISTORY = DailyHistoryCache(window=200)  # only touched by the macro loop
+
+# Shared downloads: overlapping requests for the same interval are merged by the scheduler
+SCHEDULER.register("vwap", VWAP_WATCHLIST, "15m", "5d")
+SCHEDULER.register("macro", MACRO_TICKERS + SECTOR_TICKERS, "1d", "1y")
+VWAP_MAX_AGE = 60       # Seconds a 15m refresh by another caller can be reused
+DAILY_MAX_AGE = 3600
+STATE_CHECKPOINT_KEY = "indicator_state:15m"
+LAST_POLL = {}  # asset class -> provider epoch of its last VWAP refresh (only touched by the VWAP loop)
 
 # --- HELPERS ---
 
@@ -35,8 +76,8 @@ def get_days_until(event_name):
     future_dates.sort()
     return (future_dates[0] - today).days
 
-def get_session_phase():
-    now = datetime.datetime.now(datetime.timezone.utc)
+def get_session_phase(now=None):
+    if now is None: now = datetime.datetime.now(datetime.timezone.utc)
     est_hour = (now.hour - 5) % 24 
     if 4 <= est_hour < 9: return "PRE_MARKET"
     if 9 <= est_hour < 10: return "MARKET_OPEN"
@@ -46,14 +87,88 @@ def get_session_phase():
     if 16 <= est_hour < 20: return "AFTER_HOURS"
     return "OVN_FUTURES"
 
+def asset_class(ticker):
+    if ticker.endswith('-USD'): return "crypto"
+    if is_index_ticker(ticker): return "index"
+    return "equity"
+
+def get_poll_phase(now):
+    """Session phase used for polling; equities don't trade on weekends (ET)."""
+    dt = datetime.datetime.fromtimestamp(now, tz=datetime.timezone.utc)
+    if (dt - datetime.timedelta(hours=5)).weekday() >= 5: return "WEEKEND"
+    return get_session_phase(dt)
+
+def poll_interval(cls, phase):
+    return POLL_INTERVALS.get(phase, {}).get(cls, VWAP_CHECK_INTERVAL)
+
+def due_tickers(now, tickers=VWAP_WATCHLIST):
+    """Tickers whose asset class is due for a refresh at epoch now (marks them polled)."""
+    phase = get_poll_phase(now)
+    due_classes = set()
+    for cls in {asset_class(t) for t in tickers}:
+        interval = poll_interval(cls, phase)
+        if interval is not None and now - LAST_POLL.get(cls, 0) >= interval:
+            due_classes.add(cls)
+            LAST_POLL[cls] = now
+    return [t for t in tickers if asset_class(t) in due_classes]
+
+def seconds_until_next_poll(now, tickers=VWAP_WATCHLIST):
+    phase = get_poll_phase(now)
+    waits = [LAST_POLL.get(cls, 0) + interval - now
+             for cls in {asset_class(t) for t in tickers}
+             for interval in [poll_interval(cls, phase)] if interval is not None]
+    # Re-check at least every POLL_MAX_SLEEP: the next phase may poll sooner
+    return max(1, min(waits + [POLL_MAX_SLEEP]))
+
+def current_snapshot():
+    return SNAPSHOT
+
+def publish_snapshot(vwap_updates=None, macro_updates=None):
+    """Builds the next snapshot from the current one plus the updates and swaps it in."""
+    global SNAPSHOT
+    with PUBLISH_LOCK:
+        current = SNAPSHOT
+        vwap = dict(current.vwap)
+        vwap.update(vwap_updates or {})
+        macro = dict(current.macro)
+        macro.update(macro_updates or {})
+        SNAPSHOT = MarketSnapshot(current.version + 1, vwap, macro)
+    return SNAPSHOT
+
 def get_market_regime_from_cache():
-    heatmap = {}
-    vix_val = 0.0
-    with DATA_LOCK:
-        for ticker, data in LATEST_VWAP_DATA.items():
-            heatmap[ticker] = data.get('daily_change', 0.0)
-            if ticker == "^VIX": vix_val = data.get('price', 0.0)
-    return vix_val, json.dumps(heatmap)
+    snapshot = SNAPSHOT
+    return snapshot.vix, snapshot.heatmap_json
+
+def _utc_today():
+    return datetime.datetime.fromtimestamp(get_provider().now(), tz=datetime.timezone.utc).date()
+
+def refresh_daily_history():
+    """
+    Loads 1y of daily closes into DAILY_HISTORY once per (UTC) day.
+    Daily history does not change intraday, so the other cycles skip this entirely.
+    """
+    today = _utc_today()
+    if DAILY_HISTORY.loaded_for == today: return True
+
+    df = SCHEDULER.get(MACRO_TICKERS + SECTOR_TICKERS, "1d", "1y", max_age=DAILY_MAX_AGE)
+    if df.empty: return DAILY_HISTORY.loaded_for is not None
+
+    # (ticker, field) columns -> one Close column per ticker
+    # Fill missing values to avoid NaNs in calculations
+    closes = df.xs('Close', level=1, axis=1).ffill()
+    DAILY_HISTORY.load(closes, today)
+    print(f"📚 Daily history loaded: {len(closes.columns)} tickers, {len(closes)} days")
+    return True
+
+def patch_live_prices():
+    """Patches today's row with the VWAP monitor's latest prices (no download)."""
+    today = _utc_today()
+    prices = {t: (d.get('price'), d.get('bar_time')) for t, d in SNAPSHOT.vwap.items()}
+    for ticker, (price, bar_time) in prices.items():
+        if not price or not bar_time: continue
+        bar_day = datetime.datetime.fromisoformat(bar_time).astimezone(datetime.timezone.utc).date()
+        if bar_day == today:
+            DAILY_HISTORY.set_live(ticker, price)
 
 def get_macro_context():
     """
@@ -67,83 +182,51 @@ def get_macro_context():
     context['days_until_cpi'] = get_days_until("CPI")
     context['days_until_nfp'] = get_days_until("NFP")
     
-    # 2. Fetch Market Data (Batch Download)
-    all_tickers = MACRO_TICKERS + SECTOR_TICKERS
+    # 2. Daily history (cached per day) patched with the latest intraday prices
     try:
-        # Download 1 year of data to calculate 200d SMA
-        # yfinance download returns a MultiIndex DataFrame if multiple tickers are requested
-        with DOWNLOAD_LOCK:
-            df = yf.download(all_tickers, period="1y", interval="1d", progress=False)
-        
-        # Handle MultiIndex columns if present
-        if isinstance(df.columns, pd.MultiIndex):
-            # We want 'Close' prices
-            try:
-                closes = df['Close']
-            except KeyError:
-                # Fallback if 'Close' is not at top level (sometimes structure varies)
-                closes = df.xs('Close', level=0, axis=1)
-        else:
-            closes = df # Should not happen with multiple tickers but safe to handle
-            
-        if closes.empty: return context
-        
-        # Fill missing values to avoid NaNs in calculations
-        closes = closes.ffill()
+        if not refresh_daily_history(): return context
+        patch_live_prices()
+        hist = DAILY_HISTORY
 
-        # Get latest prices (last row)
-        latest = closes.iloc[-1]
-        
         # 3. Macro Prices & Yields
-        context['price_spy'] = latest.get('SPY')
-        context['price_qqq'] = latest.get('QQQ')
-        context['price_iwm'] = latest.get('IWM')
-        context['yield_10y'] = latest.get('^TNX')
-        context['price_dxy'] = latest.get('DX-Y.NYB')
-        context['price_btc'] = latest.get('BTC-USD')
-        context['market_vix'] = latest.get('^VIX')
+        context['price_spy'] = hist.latest('SPY')
+        context['price_qqq'] = hist.latest('QQQ')
+        context['price_iwm'] = hist.latest('IWM')
+        context['yield_10y'] = hist.latest('^TNX')
+        context['price_dxy'] = hist.latest('DX-Y.NYB')
+        context['price_btc'] = hist.latest('BTC-USD')
+        context['market_vix'] = hist.latest('^VIX')
         
-        # 4. Regime Filters: SPY 200d SMA Distance
-        if 'SPY' in closes:
-            spy_series = closes['SPY'].dropna()
-            if len(spy_series) >= 200:
-                sma_200 = spy_series.rolling(window=200).mean().iloc[-1]
-                current_spy = latest.get('SPY')
-                if not math.isnan(sma_200) and current_spy and not math.isnan(current_spy):
-                    context['spy_200d_sma_dist'] = (current_spy - sma_200) / sma_200
+        # 4. Regime Filters: SPY 200d SMA Distance (running sum, no rolling() over the year)
+        sma_200 = hist.sma('SPY')
+        current_spy = hist.latest('SPY')
+        if sma_200 and current_spy and not math.isnan(current_spy):
+            context['spy_200d_sma_dist'] = (current_spy - sma_200) / sma_200
         
         # 5. Sector Rotation (Relative Strength vs SPY)
         # Calculate daily % change for the latest day
-        if len(closes) >= 2:
-            # Use iloc[-2] (yesterday) and iloc[-1] (today/latest)
-            prev = closes.iloc[-2]
-            curr = closes.iloc[-1]
-            
-            spy_ret = 0.0
-            if 'SPY' in closes:
-                p_spy = prev.get('SPY')
-                c_spy = curr.get('SPY')
-                if p_spy and not math.isnan(p_spy) and p_spy != 0:
-                    spy_ret = (c_spy - p_spy) / p_spy
-            
+        if hist.rows() >= 2:
+            def day_return(ticker):
+                p, c = hist.previous(ticker), hist.latest(ticker)
+                if p and not math.isnan(p) and p != 0 and c is not None:
+                    return (c - p) / p
+                return None
+
+            spy_ret = day_return('SPY') or 0.0
             sector_rel = {}
             for sec in SECTOR_TICKERS:
-                if sec in closes:
-                    p_sec = prev.get(sec)
-                    c_sec = curr.get(sec)
-                    if p_sec and not math.isnan(p_sec) and p_sec != 0:
-                        sec_ret = (c_sec - p_sec) / p_sec
-                        sector_rel[sec] = round((sec_ret - spy_ret) * 100, 2) # Excess return in %
-            
+                sec_ret = day_return(sec)
+                if sec_ret is not None:
+                    sector_rel[sec] = round((sec_ret - spy_ret) * 100, 2) # Excess return in %
             context['sector_rel_strength'] = json.dumps(sector_rel)
             
         # 6. Market Breadth (Approximation using Sector ETFs)
         # Count how many sectors are positive
         advancing_sectors = 0
         for sec in SECTOR_TICKERS:
-            if sec in closes and len(closes) >= 2:
-                if closes[sec].iloc[-1] > closes[sec].iloc[-2]:
-                    advancing_sectors += 1
+            p, c = hist.previous(sec), hist.latest(sec)
+            if p is not None and c is not None and c > p:
+                advancing_sectors += 1
         context['market_breadth'] = advancing_sectors
              
     except Exception as e:
@@ -159,166 +242,100 @@ def macro_monitor_loop():
         try:
             context = get_macro_context()
             if context:
-                with DATA_LOCK:
-                    LATEST_MACRO_CONTEXT.update(context)
+                publish_snapshot(macro_updates=context)
                 # print(f"✅ Macro Data Updated: SPY={context.get('price_spy')}")
         except Exception as e:
             print(f"⚠️ Macro Monitor Error: {e}")
-        time.sleep(900) # 15 minutes
+        get_provider().sleep(900) # 15 minutes
 
-from database import safe_round, log_market_data
-from analysis import calculate_rsi
+def restore_indicator_states():
+    saved = load_app_state(STATE_CHECKPOINT_KEY, {})
+    for ticker, data in saved.items():
+        try:
+            INDICATOR_STATES[ticker] = TickerIndicatorState.from_dict(data)
+        except Exception as e:
+            print(f"⚠️ Could not restore indicator state for {ticker}: {e}")
+    if INDICATOR_STATES:
+        print(f"♻️ Restored indicator state for {len(INDICATOR_STATES)} tickers")
+
+def checkpoint_indicator_states():
+    save_app_state(STATE_CHECKPOINT_KEY, {t: s.to_dict() for t, s in INDICATOR_STATES.items()})
+
+def run_vwap_cycle(tickers=VWAP_WATCHLIST):
+    """One monitor pass over tickers: delta download, fallback for gaps, indicators, publish."""
+    # Batch delta download into the bar store (shared via the scheduler), then serve the 5d window from disk
+    # Period='5d' to ensure enough data for RSI/VWAP calculation
+    df = SCHEDULER.get(tickers, '15m', '5d', max_age=VWAP_MAX_AGE)
+
+    timestamp = datetime.datetime.now().isoformat()
+
+    # Fallback: concurrent individual downloads for tickers the batch did not return
+    missing = missing_tickers(df, tickers)
+    if missing and fetch_missing(missing, '15m', '5d'):
+        df = load_bars(tickers, '15m', '5d')
 
-# ... (Previous code remains same until vwap_monitor_loop)
+    if INDICATOR_MODE == "batch":
+        results, skipped = compute_watchlist_indicators(df, tickers)
+    else:
+        # Only bars newer than each ticker's state are fed; checkpoint so restarts resume
+        results, skipped = update_indicator_states(INDICATOR_STATES, df, tickers)
+        checkpoint_indicator_states()
+    for ticker, reason in skipped.items():
+        print(f"⚠️ {ticker} {reason}")
+
+    batch_data = []
+    updates = {}
+    for ticker, ind in results.items():
+        data_obj = {
+            "ticker": ticker,
+            "open": safe_round(ind['open']),
+            "high": safe_round(ind['high']),
+            "low": safe_round(ind['low']),
+            "close": safe_round(ind['close']),
+            "volume": int(ind['volume']),
+            "vwap": safe_round(ind['vwap']),
+            "rsi": safe_round(ind['rsi'], 1),
+            "rvol": safe_round(ind['rvol'], 1)
+        }
+        batch_data.append(data_obj)
+        updates[ticker] = {
+            "ticker": ticker,
+            "name": TICKER_MAP.get(ticker, ticker),
+            "price": data_obj['close'],
+            "high": data_obj['high'],
+            "low": data_obj['low'],
+            "volume": data_obj['volume'],
+            "vwap": data_obj['vwap'],
+            "rsi": data_obj['rsi'],
+            "rvol": data_obj['rvol'],
+            "daily_change": safe_round(ind['daily_change'], 2),
+            "status": vwap_status(ind['close'], ind['upper_band'], ind['lower_band']),
+            "bar_time": ind['timestamp'].isoformat(),
+        }
+
+    # Publish State
+    if updates:
+        publish_snapshot(vwap_updates=updates)
+
+    # Log Batch to DB
+    if batch_data:
+        log_market_data(timestamp, batch_data)
+    return batch_data
 
 def vwap_monitor_loop():
     print(f"📈 Monitor Started: Tracking {len(VWAP_WATCHLIST)} Assets")
+    if INDICATOR_MODE != "batch":
+        restore_indicator_states()
+    provider = get_provider()
     while True:
         try:
-            # Batch Download with Fallback
-            # Period='5d' to ensure enough data for RSI/VWAP calculation
-            try:
-                with DOWNLOAD_LOCK:
-                    df = yf.download(VWAP_WATCHLIST, period='5d', interval='15m', progress=False, group_by='ticker', auto_adjust=True, prepost=True, threads=False)
-            except Exception as e:
-                print(f"⚠️ Batch download failed: {e}. Switching to individual downloads.")
-                df = pd.DataFrame()
-
-            timestamp = datetime.datetime.now().isoformat()
-            batch_data = []
-
-            for ticker in VWAP_WATCHLIST:
-                try:
-                    t_df = None
-                    
-                    # 1. Try to get data from batch
-                    if not df.empty:
-                        if len(VWAP_WATCHLIST) > 1:
-                            if ticker in df:
-                                t_df = df[ticker].copy()
-                        else:
-                            t_df = df.copy()
-
-                    # 2. Fallback: Individual Download if missing or empty
-                    if t_df is None or t_df.empty:
-                        # print(f"⚠️ Fetching {ticker} individually...")
-                        try:
-                            with DOWNLOAD_LOCK:
-                                t_df = yf.download(ticker, period='5d', interval='15m', progress=False, auto_adjust=True, prepost=True)
-                        except Exception as e:
-                            print(f"❌ Failed to download {ticker}: {e}")
-                            continue
-
-                    # FIX: Use last_valid_index to find the latest data point
-                    # This handles mixed asset classes (Crypto vs Stocks) where indices might not align
-                    # Find the latest VALID candle (with volume for stocks)
-                    # Iterate backwards from the last available data point
-                    latest = None
-                    valid_idx = None
-                    
-                    # Check if it's an index (starts with ^) or known index like DX-Y
-                    is_index = ticker.startswith('^') or ticker == 'DX-Y.NYB'
-                    
-                    # Iterate backwards through the dataframe
-                    for idx in reversed(t_df.index):
-                        row = t_df.loc[idx]
-                        
-                        # Check for valid price first
-                        if pd.isna(row['Close']) or row['Close'] == 0:
-                            continue
-
-                        # For indices, any data is valid. For stocks/ETFs, we need Volume > 0
-                        if is_index or (row['Volume'] > 0):
-                            latest = row
-                            valid_idx = idx
-                            break
-                    
-                    if latest is None:
-                        print(f"⚠️ {ticker} has no valid data (Price > 0 and Volume > 0) in the fetched period")
-                        continue
-
-                    # Clean data for technicals up to the valid index
-                    t_df_clean = t_df.loc[:valid_idx].dropna()
-
-                    if len(t_df_clean) < 50: 
-                        print(f"⚠️ {ticker} skipped due to insufficient data points ({len(t_df_clean)})")
-                        continue
-                    
-                    # Calculate Technicals on clean data
-                    t_df_clean['Typical_Price'] = (t_df_clean['High'] + t_df_clean['Low'] + t_df_clean['Close']) / 3
-                    t_df_clean['VWAP'] = (t_df_clean['Typical_Price'] * t_df_clean['Volume']).cumsum() / t_df_clean['Volume'].cumsum()
-                    
-                    # RSI
-                    delta = t_df_clean['Close'].diff()
-                    gain = (delta.where(delta > 0, 0)).rolling(window=RSI_PERIOD).mean()
-                    loss = (-delta.where(delta < 0, 0)).rolling(window=RSI_PERIOD).mean()
-                    rs = gain / loss
-                    t_df_clean['RSI'] = 100 - (100 / (1 + rs))
-                    
-                    # RVOL
-                    t_df_clean['RVOL'] = t_df_clean['Volume'] / t_df_clean['Volume'].rolling(window=20).mean()
-
-                    # VWAP Bands
-                    rolling_std = t_df_clean['Close'].rolling(window=26).std()
-                    t_df_clean['Upper_Band'] = t_df_clean['VWAP'] + (rolling_std * VWAP_BANDS)
-                    t_df_clean['Lower_Band'] = t_df_clean['VWAP'] - (rolling_std * VWAP_BANDS)
-
-                    # Re-assign latest from the calculated dataframe to get technicals
-                    latest = t_df_clean.iloc[-1]
-                    price = latest['Close']
-                    status = "NEUTRAL"
-                    if price > latest['Upper_Band']: status = "OVERBOUGHT"
-                    elif price < latest['Lower_Band']: status = "OVERSOLD"
-
-                    # Calculate Daily Change
-                    # FIX: Use t_df_clean to ensure we use valid data and correct date
-                    current_date = t_df_clean.index[-1].date()
-                    day_data = t_df_clean[t_df_clean.index.date == current_date]
-                    daily_change = 0.0
-                    if not day_data.empty:
-                        open_price = float(day_data['Open'].iloc[0])
-                        if open_price != 0:
-                            daily_change = ((price - open_price) / open_price) * 100
-
-                    # Prepare Data Object
-                    data_obj = {
-                        "ticker": ticker,
-                        "open": safe_round(latest['Open']),
-                        "high": safe_round(latest['High']),
-                        "low": safe_round(latest['Low']),
-                        "close": safe_round(latest['Close']),
-                        "volume": int(latest['Volume']),
-                        "vwap": safe_round(latest['VWAP']),
-                        "rsi": safe_round(latest['RSI'], 1),
-                        "rvol": safe_round(latest['RVOL'], 1)
-                    }
-                    batch_data.append(data_obj)
-
-                    # Update State
-                    with DATA_LOCK:
-                        LATEST_VWAP_DATA[ticker] = {
-                            "ticker": ticker,
-                            "name": TICKER_MAP.get(ticker, ticker),
-                            "price": data_obj['close'],
-                            "high": data_obj['high'],
-                            "low": data_obj['low'],
-                            "volume": data_obj['volume'],
-                            "vwap": data_obj['vwap'],
-                            "rsi": data_obj['rsi'],
-                            "rvol": data_obj['rvol'],
-                            "daily_change": safe_round(daily_change, 2),
-                            "status": status,
-                        }
-
-                except Exception as e:
-                    print(f"⚠️ Error processing {ticker}: {e}")
-                    continue
-            
-            # Log Batch to DB
-            if batch_data:
-                log_market_data(timestamp, batch_data)
-
+            # Cadence follows the session phase per asset class (see POLL_INTERVALS)
+            tickers = due_tickers(provider.now())
+            if tickers:
+                # Only due tickers ride along when another caller triggers a 15m refresh
+                SCHEDULER.register("vwap", tickers, "15m", "5d")
+                run_vwap_cycle(tickers)
         except Exception as e:
             print(f"⚠️ Monitor Loop Error: {e}")
             
-        time.sleep(VWAP_CHECK_INTERVAL)
+        provider.sleep(seconds_until_next_poll(provider.now()))
@@ -0,0 +1,174 @@
+import re
+import time
+import heapq
+import queue
+import threading
+from config import (
+    NEWS_QUEUE_CAPACITY, NEWS_SHED_POLICY, NEWS_SOURCE_PRIORITY,
+    NEWS_PRIORITY_KEYWORDS, NEWS_LOW_PRIORITY, NEWS_HIGH_PRIORITY
+)
+from entities import task_entities
+import metrics
+
+KEYWORD_RE = re.compile(r"\b(" + "|".join(re.escape(k) for k in NEWS_PRIORITY_KEYWORDS) + r")\b", re.IGNORECASE)
+
+def score_news_item(task, now=None):
+    """
+    Cheap enqueue-time priority (higher = sooner): source app weight, urgent keywords,
+    tickers/macro entities mentioned, minus a penalty for items that were already old on arrival.
+    """
+    if now is None: now = time.time()
+    text = f"{task.get('title', '')} {task.get('body', '')}"
+    score = NEWS_SOURCE_PRIORITY.get(task.get("source"), 1.0)
+    score += min(3, len(set(m.lower() for m in KEYWORD_RE.findall(text))))
+    score += min(2, len(task_entities(task)))
+    age = now - task.get("received_at", now)
+    if age > 300: score -= min(2, age / 1800)  # Re-fetched old pushes go behind live news
+    return round(score, 2)
+
+def priority_band(priority):
+    if priority >= NEWS_HIGH_PRIORITY: return "high"
+    if priority < NEWS_LOW_PRIORITY: return "low"
+    return "normal"
+
+class PriorityNewsQueue:
+    """
+    Bounded priority queue with the queue.Queue interface the workers already use
+    (put/get/task_done/join/qsize). Equal priorities stay FIFO. put() never blocks the
+    ingestor: when full, the lowest-priority (then oldest) item makes room. With the
+    "summarize" policy, low-priority items from that item's source are folded into one
+    digest item instead of being dropped. An incoming item that ranks below everything
+    queued is dropped itself. on_shed, if set, receives the list of tasks dropped or folded;
+    on_digest, if set, receives each digest item before its folded tasks are shed.
+    """
+
+    def __init__(self, capacity=NEWS_QUEUE_CAPACITY, policy=NEWS_SHED_POLICY, scorer=score_news_item, on_shed=None,
+                 on_digest=None):
+        self.capacity = capacity
+        self.policy = policy
+        self.scorer = scorer
+        self.on_shed = on_shed
+        self.on_digest = on_digest
+        self._heap = []   # [-priority, seq, task, enqueued_at]
+        self._seq = 0
+        self._unfinished = 0
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)
+        self._all_done = threading.Condition(self._mutex)
+
+    # --- queue.Queue interface ---
+
+    def put(self, task, block=True, timeout=None):
+        priority = task.get("priority")
+        if priority is None:
+            priority = task["priority"] = self.scorer(task)
+        with self._mutex:
+            if len(self._heap) >= self.capacity and not self._make_room(priority):
+                metrics.incr("news.shed.incoming")
+                self._shed([task])
+                print(f"🚮 News queue full, dropped: {task.get('title', '')[:40]} (priority {priority})")
+                return False
+            self._push(task, priority)
+            self._unfinished += 1
+            self._not_empty.notify()
+        return True
+
+    def put_nowait(self, task):
+        return self.put(task, block=False)
+
+    def get(self, block=True, timeout=None):
+        with self._not_empty:
+            if not block:
+                if not self._heap: raise queue.Empty
+            elif timeout is None:
+                while not self._heap:
+                    self._not_empty.wait()
+            else:
+                deadline = time.time() + timeout
+                while not self._heap:
+                    remaining = deadline - time.time()
+                    if remaining <= 0: raise queue.Empty
+                    self._not_empty.wait(remaining)
+            neg_priority, _, task, enqueued_at = heapq.heappop(self._heap)
+        metrics.observe(f"news.queue_wait.{priority_band(-neg_priority)}", time.time() - enqueued_at)
+        return task
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def task_done(self):
+        with self._all_done:
+            if self._unfinished <= 0: raise ValueError("task_done() called too many times")
+            self._unfinished -= 1
+            if self._unfinished == 0: self._all_done.notify_all()
+
+    def join(self):
+        with self._all_done:
+            while self._unfinished:
+                self._all_done.wait()
+
+    def qsize(self):
+        return len(self._heap)
+
+    def empty(self):
+        return not self._heap
+
+    def full(self):
+        return len(self._heap) >= self.capacity
+
+    def depth_by_band(self):
+        with self._mutex:
+            bands = {"high": 0, "normal": 0, "low": 0}
+            for entry in self._heap:
+                bands[priority_band(-entry[0])] += 1
+        return bands
+
+    # --- internals (caller holds the mutex) ---
+
+    def _push(self, task, priority, enqueued_at=None):
+        self._seq += 1
+        heapq.heappush(self._heap, [-priority, self._seq, task, enqueued_at or time.time()])
+
+    def _make_room(self, incoming_priority):
+        # Lowest priority first, oldest first among equals
+        victim = min(self._heap, key=lambda e: (-e[0], e[1]))
+        victim_priority = -victim[0]
+        if victim_priority > incoming_priority:
+            return False
+
+        if self.policy == "summarize" and victim_priority < NEWS_LOW_PRIORITY:
+            source = victim[2].get("source")
+            folded = [e for e in self._heap if -e[0] < NEWS_LOW_PRIORITY and e[2].get("source") == source]
+            if len(folded) > 1:
+                self._remove(folded)
+                tasks = [e[2] for e in sorted(folded, key=lambda e: e[1])]
+                digest = {
+                    "title": f"{len(tasks)} updates from {source}",
+                    "body": " | ".join(t.get("title") or t.get("body", "")[:80] for t in tasks)[:2000],
+                    "source": source,
+                    "package": tasks[-1].get("package"),
+                    "icon": None,
+                    "received_at": tasks[0].get("received_at"),
+                    "digest_of": len(tasks),
+                }
+                if self.on_digest is not None: self.on_digest(digest)
+                self._push(digest, max(-e[0] for e in folded), min(e[3] for e in folded))
+                # The folded items are accounted for by the digest
+                self._unfinished -= len(tasks) - 1
+                metrics.incr("news.shed.summarized", len(tasks))
+                self._shed(tasks)
+                return True
+
+        self._remove([victim])
+        self._unfinished -= 1
+        metrics.incr("news.shed.dropped")
+        self._shed([victim[2]])
+        return True
+
+    def _shed(self, tasks):
+        if self.on_shed is not None: self.on_shed(tasks)
+
+    def _remove(self, entries):
+        ids = {id(e) for e in entries}
+        self._heap = [e for e in self._heap if id(e) not in ids]
+        heapq.heapify(self._heap)
@@ -1,12 +1,210 @@
+import time
+import threading
+from collections import deque
 import requests
-from config import DISCORD_WEBHOOK_URL
+from config import (
+    DISCORD_WEBHOOK_URL, ALERT_COALESCE_MS, ALERT_MAX_EMBEDS, ALERT_MAX_CHARS, ALERT_RATE_PER_SEC, ALERT_BURST, ALERT_MAX_RETRIES,
+    ALERT_RETRY_BACKOFF, ALERT_OUTBOX_SIZE, ALERT_TIMEOUT
+)
+import metrics
 
-def send_news_alert(analysis, original_title, source_app):
+def embed_size(embed):
+    """Characters Discord counts towards a message's embed limit."""
+    fields = embed.get("fields") or []
+    return sum(len(str(v or "")) for v in (
+        embed.get("title"), embed.get("description"), (embed.get("footer") or {}).get("text"),
+        (embed.get("author") or {}).get("name"),
+        *(f.get("name") for f in fields), *(f.get("value") for f in fields),
+    ))
+
+class TokenBucket:
+    """rate tokens per second up to burst; pause_until() blocks everything until a Retry-After passes."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self):
+        """Seconds until a token can be taken (0 = take it now)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.paused_until: return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause_until(self, deadline):
+        self.paused_until = max(self.paused_until, deadline)
+        self.tokens = 0.0
+
+class AlertDispatcher:
+    """
+    Sends Discord alerts from its own thread so a slow or unavailable webhook never stalls
+    news enrichment. Alerts queued within coalesce_window (same username) go out as one
+    message of up to max_embeds embeds and max_chars characters, paced by a token bucket.
+    A 429 pauses sending for its Retry-After; 5xx/network failures are retried with
+    backoff, then dropped. A rejected (4xx) message is resent one embed at a time, so only
+    the bad alert is dropped. The outbox is bounded: when full, the oldest alert is dropped.
+    """
+
+    def __init__(self, url=DISCORD_WEBHOOK_URL, coalesce_window=ALERT_COALESCE_MS / 1000, max_embeds=ALERT_MAX_EMBEDS,
+                 max_chars=ALERT_MAX_CHARS, rate=ALERT_RATE_PER_SEC, burst=ALERT_BURST, outbox_size=ALERT_OUTBOX_SIZE,
+                 session=None):
+        self.url = url
+        self.coalesce_window = coalesce_window
+        self.max_embeds = max_embeds
+        self.max_chars = max_chars
+        self.bucket = TokenBucket(rate, burst)
+        self.outbox_size = outbox_size
+        self.session = session or requests.Session()
+        self._outbox = deque()   # [username, embed, attempts, not_before, alone]
+        self._cond = threading.Condition()
+        self._thread = None
+        self._sending = False
+
+    def enqueue(self, embed, username):
+        if not self.url: return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                self._thread.start()
+            if len(self._outbox) >= self.outbox_size:
+                self._outbox.popleft()
+                metrics.incr("alerts.dropped_overflow")
+            self._outbox.append([username, embed, 0, time.monotonic(), False])
+            self._cond.notify()
+        metrics.incr("alerts.queued")
+
+    def flush(self, timeout=5):
+        """Waits (up to timeout) until the outbox is empty, e.g. on shutdown."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._outbox or self._sending) and time.monotonic() < deadline:
+                self._cond.wait(0.05)
+            return not self._outbox
+
+    def _take_batch(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ready = [a for a in self._outbox if a[3] <= now]
+                if not ready:
+                    self._cond.wait(min(a[3] for a in self._outbox) - now if self._outbox else None)
+                    continue
+                # Let more alerts join the first one's message
+                deadline = ready[0][3] + self.coalesce_window
+                while len(self._outbox) < self.max_embeds and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                # Overflow may have evicted alerts meanwhile: batch only what is still queued
+                now = time.monotonic()
+                ready = [a for a in self._outbox if a[3] <= now]
+                if ready: break
+            first = ready[0]
+            username = first[0]
+            batch, chars = [first], embed_size(first[1])
+            if not first[4]:
+                for alert in ready[1:]:
+                    if alert[0] != username or alert[4]: continue
+                    size = embed_size(alert[1])
+                    if len(batch) >= self.max_embeds or chars + size > self.max_chars: break
+                    batch.append(alert)
+                    chars += size
+            for alert in batch:
+                self._outbox.remove(alert)
+            self._sending = True
+        return username, batch
+
+    def _run(self):
+        while True:
+            try:
+                username, batch = self._take_batch()
+                self._send(username, batch)
+            except Exception as e:
+                print(f"⚠️ Alert Dispatcher Error: {e}")
+            finally:
+                with self._cond:
+                    self._sending = False
+                    self._cond.notify_all()
+
+    def _send(self, username, batch):
+        wait = self.bucket.wait_time()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.bucket.wait_time()
+        self.bucket.take()
+
+        try:
+            with metrics.timed("alerts.webhook"):
+                resp = self.session.post(self.url, json={"embeds": [a[1] for a in batch], "username": username},
+                                         timeout=ALERT_TIMEOUT)
+            status = resp.status_code
+        except requests.RequestException as e:
+            resp, status = None, f"network error: {e}"
+
+        if resp is not None and status < 300:
+            metrics.incr("alerts.sent", len(batch))
+            metrics.incr("alerts.webhook_calls")
+            return
+        if resp is not None and status == 429:
+            retry_after = _retry_after(resp)
+            metrics.incr("alerts.rate_limited")
+            print(f"⏳ Discord rate limit, pausing alerts for {retry_after:.1f}s")
+            self.bucket.pause_until(time.monotonic() + retry_after)
+            self._requeue(batch, 0, count_attempt=False)
+            return
+        if resp is not None and status < 500 and len(batch) > 1:
+            # One bad embed rejects the whole message: resend them one by one
+            metrics.incr("alerts.split", len(batch))
+            for alert in batch: alert[4] = True
+            self._requeue(batch, 0, count_attempt=False)
+            return
+        if resp is not None and status < 500:
+            # Rejected payload: resending won't help
+            metrics.incr("alerts.rejected", len(batch))
+            print(f"⚠️ Discord rejected {len(batch)} alert(s): HTTP {status} {resp.text[:200]}")
+            return
+        retry = [a for a in batch if a[2] < ALERT_MAX_RETRIES]
+        if len(retry) < len(batch):
+            metrics.incr("alerts.failed", len(batch) - len(retry))
+            print(f"⚠️ Dropped {len(batch) - len(retry)} alert(s) after {ALERT_MAX_RETRIES} retries: {status}")
+        if retry:
+            self._requeue(retry, ALERT_RETRY_BACKOFF * 2 ** retry[0][2])
+
+    def _requeue(self, batch, delay, count_attempt=True):
+        not_before = time.monotonic() + delay
+        with self._cond:
+            for alert in reversed(batch):
+                if count_attempt: alert[2] += 1
+                alert[3] = not_before
+                self._outbox.appendleft(alert)
+            self._cond.notify()
+
+def _retry_after(resp):
+    """Seconds to wait from a 429: the Retry-After header, else Discord's JSON retry_after."""
+    try:
+        return float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(resp.json().get("retry_after", 1.0))
+    except Exception:
+        return 1.0
+
+DISPATCHER = AlertDispatcher()
+
+def send_news_alert(analysis, original_title, source_app, tickers=None):
     color_map = {"BULLISH": 0x00FF00, "BEARISH": 0xFF0000, "NEUTRAL": 0x3498DB}
     color = color_map.get(analysis.get("sentiment"), 0x95A5A6)
+    # Locally extracted tickers label the alert when Gemini named none
+    ticker = analysis.get('ticker') or ", ".join((analysis.get('tickers') or tickers or [])[:3]) or None
     
     embed = {
-        "title": f"{analysis.get('action')} {analysis.get('ticker')} | {analysis.get('impact_score')}/10",
+        "title": f"{analysis.get('action')} {ticker} | {analysis.get('impact_score')}/10",
         "description": f"**{analysis.get('headline', original_title)}**\n> *{analysis.get('thesis')}*",
         "color": color,
         "fields": [
@@ -15,9 +213,7 @@ def send_news_alert(analysis, original_title, source_app):
         ],
         "footer": {"text": "Market Mind AI"}
     }
-    try:
-        requests.post(DISCORD_WEBHOOK_URL, json={"embeds": [embed], "username": "Market Mind"})
-    except: pass
+    DISPATCHER.enqueue(embed, "Market Mind")
 
 def send_system_alert(title, message, color=0xFF0000):
     embed = {
@@ -26,6 +222,4 @@ def send_system_alert(title, message, color=0xFF0000):
         "color": color,
         "footer": {"text": "Market Mind System"}
     }
-    try:
-        requests.post(DISCORD_WEBHOOK_URL, json={"embeds": [embed], "username": "Market Mind System"})
-    except: pass
+    DISPATCHER.enqueue(embed, "Market Mind System")
@@ -0,0 +1,85 @@
+import threading
+import time
+import datetime
+import numpy as np
+from config import NOVELTY_WINDOW, NOVELTY_HALF_LIFE, NOVELTY_BASELINE_SIM
+from database import load_recent_log_embeddings
+
+class NoveltyTracker:
+    """
+    Deterministic 1-10 novelty from embedding distance to recently seen items.
+    Each past item's cosine similarity is discounted by its age (half-life decay), and
+    the best match decides: a fresh near-copy scores 1, anything no closer than
+    baseline_sim (typical similarity of unrelated headlines) scores 10.
+    """
+
+    def __init__(self, window=NOVELTY_WINDOW, half_life=NOVELTY_HALF_LIFE, baseline_sim=NOVELTY_BASELINE_SIM):
+        self.window = window
+        self.half_life = half_life
+        self.baseline_sim = baseline_sim
+        self._lock = threading.Lock()
+        self._vectors = None          # (capacity x dim) unit rows; live rows are [_head:_n]
+        self._times = np.zeros(0)
+        self._head = 0
+        self._n = 0
+
+    def __len__(self):
+        return self._n - self._head
+
+    def load_recent(self, now=None):
+        """Warms the window from the DB so novelty is meaningful right after a restart."""
+        if now is None: now = time.time()
+        since = datetime.datetime.fromtimestamp(now - self.window, tz=datetime.timezone.utc).isoformat()
+        times, matrix = load_recent_log_embeddings(since)
+        for ts, vec in zip(times, matrix):
+            self.add(vec, ts)
+        print(f"🆕 Novelty window warmed with {len(times)} recent items")
+
+    def score(self, vector, now=None):
+        """Novelty 1-10 (float) of vector against the window; 10 when the window is empty."""
+        if vector is None: return None
+        if now is None: now = time.time()
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1)
+        with self._lock:
+            self._expire(now)
+            if self._n == self._head or self._vectors.shape[1] != q.shape[0]: return 10.0
+            sims = self._vectors[self._head:self._n] @ q
+            ages = np.maximum(now - self._times[self._head:self._n], 0)
+        decayed = sims * np.power(0.5, ages / self.half_life)
+        closest = float(np.clip(decayed.max(), self.baseline_sim, 1.0))
+        return round(1 + 9 * (1 - closest) / (1 - self.baseline_sim), 1)
+
+    def add(self, vector, ts=None):
+        if vector is None: return
+        if ts is None: ts = time.time()
+        v = np.asarray(vector, dtype=np.float32)
+        v = v / (np.linalg.norm(v) or 1)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((256, v.shape[0]), dtype=np.float32)
+                self._times = np.zeros(256)
+            if v.shape[0] != self._vectors.shape[1]: return
+            if self._n == len(self._vectors):
+                # Compact expired rows away, grow if still full
+                live = self._n - self._head
+                capacity = max(256, 2 * live) if live * 2 > len(self._vectors) else len(self._vectors)
+                vectors, times = np.zeros((capacity, v.shape[0]), dtype=np.float32), np.zeros(capacity)
+                vectors[:live], times[:live] = self._vectors[self._head:self._n], self._times[self._head:self._n]
+                self._vectors, self._times, self._head, self._n = vectors, times, 0, live
+            self._vectors[self._n] = v
+            self._times[self._n] = ts
+            self._n += 1
+
+    def score_and_add(self, vector, now=None):
+        if now is None: now = time.time()
+        novelty = self.score(vector, now)
+        self.add(vector, now)
+        return novelty
+
+    def _expire(self, now):
+        # Items arrive roughly in time order, so expired rows sit at the head
+        while self._head < self._n and now - self._times[self._head] > self.window:
+            self._head += 1
+
+NOVELTY = NoveltyTracker()
@@ -0,0 +1,167 @@
+import re
+import time
+import zlib
+import threading
+from collections import Counter
+import numpy as np
+from config import (
+    MIN_IMPACT_SCORE, PREFILTER_ENABLED, PREFILTER_ALLOW_SOURCES, PREFILTER_DENY_SOURCES, PREFILTER_NOISE_PATTERNS,
+    PREFILTER_SKIP_BELOW, PREFILTER_DEFER_BELOW, PREFILTER_MAX_MISSED, PREFILTER_MIN_TRAIN_ROWS, PREFILTER_TRAIN_ROWS,
+    PREFILTER_RETRAIN_INTERVAL
+)
+from database import load_labelled_logs
+from news_queue import KEYWORD_RE
+from entities import ENTITIES, task_entities
+import metrics
+
+FEATURE_DIM = 1 << 14   # Hashed feature space
+_WORD_RE = re.compile(r"[a-z0-9$%']+")
+
+def item_features(title, body, source, package):
+    """Hashed bag of words plus source/package tokens, as sorted unique column indices."""
+    words = _WORD_RE.findall(f"{title or ''} {body or ''}".lower())
+    tokens = set(words) | {f"src:{source}", f"pkg:{package}"}
+    return sorted({zlib.crc32(t.encode("utf-8")) % FEATURE_DIM for t in tokens})
+
+class LogisticModel:
+    """Logistic regression on hashed sparse features, trained with full-batch gradient descent."""
+
+    def __init__(self, dim=FEATURE_DIM):
+        self.dim = dim
+        self.w = np.zeros(dim, dtype=np.float64)
+        self.b = 0.0
+
+    @staticmethod
+    def _flatten(rows):
+        row_ids = np.repeat(np.arange(len(rows)), [len(r) for r in rows])
+        cols = np.fromiter((c for r in rows for c in r), dtype=np.int64, count=len(row_ids))
+        return row_ids, cols
+
+    def predict(self, rows):
+        row_ids, cols = self._flatten(rows)
+        z = np.bincount(row_ids, weights=self.w[cols], minlength=len(rows)) + self.b
+        return 1 / (1 + np.exp(-z))
+
+    def fit(self, rows, labels, epochs=200, lr=0.5, l2=1e-4):
+        y = np.asarray(labels, dtype=np.float64)
+        # Balanced class weights: relevant items are the minority
+        pos = max(y.mean(), 1e-6)
+        weights = np.where(y > 0, 0.5 / pos, 0.5 / max(1 - pos, 1e-6)) / len(y)
+        row_ids, cols = self._flatten(rows)
+        for _ in range(epochs):
+            z = np.bincount(row_ids, weights=self.w[cols], minlength=len(rows)) + self.b
+            err = (1 / (1 + np.exp(-z)) - y) * weights
+            grad = np.bincount(cols, weights=err[row_ids], minlength=self.dim)
+            self.w -= lr * (grad + l2 * self.w)
+            self.b -= lr * err.sum()
+        return self
+
+class PreFilter:
+    """
+    Cheap local triage before any network call. Returns (decision, reason):
+    "analyze" (normal enrichment), "defer" (queued behind everything else) or "skip" (never sent to Gemini).
+
+    Rules first, in order: allow-listed sources and explicit ticker symbols are analysed,
+    deny-listed sources and noise patterns (deliveries, promos, OTPs, social chatter) are
+    skipped, then market keywords and entity aliases are analysed. Everything else goes to a linear model trained on our own logs
+    (relevant = impact_score >= MIN_IMPACT_SCORE); without enough history, it is analysed.
+    """
+
+    def __init__(self, enabled=PREFILTER_ENABLED, allow_sources=PREFILTER_ALLOW_SOURCES, deny_sources=PREFILTER_DENY_SOURCES,
+                 noise_patterns=PREFILTER_NOISE_PATTERNS, skip_below=PREFILTER_SKIP_BELOW, defer_below=PREFILTER_DEFER_BELOW):
+        self.enabled = enabled
+        self.allow_sources = {s.lower() for s in allow_sources}
+        self.deny_sources = {s.lower() for s in deny_sources}
+        self.noise_re = re.compile("|".join(f"(?:{p})" for p in noise_patterns), re.IGNORECASE) if noise_patterns else None
+        self.max_skip_below = skip_below
+        self.skip_below = skip_below
+        self.defer_below = defer_below
+        self.model = None
+        self.training = {}
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def classify(self, task):
+        decision, reason = self._classify(task)
+        with self._lock:
+            self._counts[decision] += 1
+        metrics.incr(f"prefilter.{decision}")
+        metrics.incr(f"prefilter.rule.{reason}")
+        return decision, reason
+
+    def _classify(self, task):
+        if not self.enabled: return "analyze", "disabled"
+        title, body = task.get("title") or "", task.get("body") or ""
+        source = (task.get("source") or "").lower()
+        text = f"{title} {body}"
+        if source in self.allow_sources: return "analyze", "allow_source"
+        if ENTITIES.has_symbol(text): return "analyze", "ticker_symbol"
+        if source in self.deny_sources: return "skip", "deny_source"
+        if self.noise_re is not None and self.noise_re.search(text): return "skip", "noise_pattern"
+        if KEYWORD_RE.search(text) or task_entities(task): return "analyze", "market_keyword"
+        model = self.model
+        if model is None: return "analyze", "no_model"
+        p = float(model.predict([item_features(title, body, task.get("source"), task.get("package"))])[0])
+        task["prefilter_score"] = round(p, 3)
+        if p < self.skip_below: return "skip", "model"
+        if p < self.defer_below: return "defer", "model"
+        return "analyze", "model"
+
+    def train(self, limit=PREFILTER_TRAIN_ROWS):
+        """
+        Fits the model on the latest labelled logs, holding out every 5th row to calibrate:
+        the skip threshold is lowered until at most PREFILTER_MAX_MISSED of held-out
+        relevant items would be skipped.
+        """
+        start = time.time()
+        rows = load_labelled_logs(limit)
+        labels = np.array([1.0 if (r[4] or 0) >= MIN_IMPACT_SCORE else 0.0 for r in rows])
+        if len(rows) < PREFILTER_MIN_TRAIN_ROWS or len(np.unique(labels)) < 2:
+            print(f"🧹 Pre-filter model not trained ({len(rows)} labelled logs, need {PREFILTER_MIN_TRAIN_ROWS} with both classes)")
+            return None
+        features = [item_features(*r[:4]) for r in rows]
+        holdout = np.arange(len(rows)) % 5 == 0
+        model = LogisticModel().fit([f for f, h in zip(features, holdout) if not h], labels[~holdout])
+
+        probs = model.predict([f for f, h in zip(features, holdout) if h])
+        y = labels[holdout]
+        skip_below = self.max_skip_below
+        if y.sum():
+            skip_below = min(skip_below, float(np.quantile(probs[y > 0], PREFILTER_MAX_MISSED)))
+        self.training = {
+            "rows": len(rows),
+            "relevant_share": round(float(labels.mean()), 3),
+            "holdout": int(holdout.sum()),
+            "holdout_skip_rate": round(float((probs < skip_below).mean()), 3),
+            "holdout_defer_rate": round(float(((probs >= skip_below) & (probs < self.defer_below)).mean()), 3),
+            "holdout_missed_relevant": round(float((probs[y > 0] < skip_below).mean()), 3) if y.sum() else None,
+            "trained_at": time.time(),
+            "seconds": round(time.time() - start, 2),
+        }
+        self.model, self.skip_below = model, skip_below
+        print(f"🧹 Pre-filter model trained on {len(rows)} logs: skip < {skip_below:.3f}, defer < {self.defer_below}, "
+              f"holdout skip rate {self.training['holdout_skip_rate']:.0%}, "
+              f"missed relevant {self.training['holdout_missed_relevant']}")
+        return model
+
+    def run_training_loop(self):
+        while True:
+            try:
+                self.train()
+            except Exception as e:
+                print(f"⚠️ Pre-filter Training Error: {e}")
+            time.sleep(PREFILTER_RETRAIN_INTERVAL)
+
+    def report(self):
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        return {
+            "enabled": self.enabled,
+            "thresholds": {"skip_below": round(self.skip_below, 4), "defer_below": self.defer_below},
+            "decisions": counts,
+            "hit_rates": {k: round(v / total, 3) for k, v in counts.items()} if total else {},
+            "model": self.training or None,
+        }
+
+PREFILTER = PreFilter()
@@ -0,0 +1,194 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+import re
+import csv
+import yfinance as yf
+import pandas as pd
+from config import MARKET_DATA_PROVIDER, REPLAY_FILE, REPLAY_SPEED, REPLAY_START, FETCH_MIN_GAP, MARKET_TIMEZONE
+from indicators import OHLCV_FIELDS
+
+# yf.download shares module-level state between calls, so batch downloads are serialised
+DOWNLOAD_LOCK = threading.Lock()
+
+REPLAY_COLUMNS = ['ticker', 'interval', 'bar_start', 'open', 'high', 'low', 'close', 'volume']
+
+# --- FRAME HELPERS ---
+
+def is_intraday(interval):
+    return interval.endswith('m') or interval.endswith('h')
+
+def period_to_days(period):
+    """'5d' -> 5, '1mo' -> 31, '1y' -> 366 (calendar days, rounded up)."""
+    m = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not m: raise ValueError(f"Unsupported period: {period}")
+    n, unit = int(m.group(1)), m.group(2)
+    return n * {"d": 1, "wk": 7, "mo": 31, "y": 366}[unit]
+
+def to_epoch(index):
+    index = pd.DatetimeIndex(index)
+    index = index.tz_convert('UTC') if index.tz is not None else index.tz_localize('UTC')
+    return (index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+
+def normalize_download(df, tickers):
+    """Coerces any yf.download result into (ticker, field) MultiIndex columns."""
+    if df is None or df.empty: return pd.DataFrame()
+    if not isinstance(df.columns, pd.MultiIndex):
+        return pd.concat({tickers[0]: df}, axis=1)
+    if set(df.columns.get_level_values(0)) & set(OHLCV_FIELDS):
+        df = df.swaplevel(axis=1)  # group_by='column' layout
+    return df
+
+def rows_to_frame(rows, interval, period=None):
+    """
+    [(ticker, bar_start, open, high, low, close, volume)] -> group_by='ticker' frame.
+    Intraday bars get a MARKET_TIMEZONE index, like yfinance's exchange-time index, so
+    day grouping keeps pre/post-market bars in their session; daily bars stay in UTC.
+    Intraday 'Nd' periods keep each ticker's last N distinct trading days, like yfinance does.
+    """
+    if len(rows) == 0: return pd.DataFrame()
+    intraday = is_intraday(interval)
+    long_df = pd.DataFrame(rows, columns=['ticker', 'bar_start'] + OHLCV_FIELDS)
+    if period and intraday and period.endswith('d'):
+        local = pd.to_datetime(long_df['bar_start'], unit='s', utc=True).dt.tz_convert(MARKET_TIMEZONE)
+        day = local.dt.tz_localize(None).dt.normalize()
+        rank = day.groupby(long_df['ticker']).rank(method='dense', ascending=False)
+        long_df = long_df[rank <= period_to_days(period)]
+
+    long_df = long_df.drop_duplicates(['ticker', 'bar_start'], keep='last')
+    wide = long_df.pivot(index='bar_start', columns='ticker', values=OHLCV_FIELDS)
+    wide = wide.swaplevel(axis=1).sort_index(axis=1)
+    wide.index = pd.to_datetime(wide.index, unit='s', utc=True)
+    if intraday: wide.index = wide.index.tz_convert(MARKET_TIMEZONE)
+    return wide
+
+# --- PROVIDERS ---
+
+class MarketDataProvider(ABC):
+    """
+    Source of OHLCV bars for the monitors.
+    download() always returns a group_by='ticker' frame ((ticker, field) columns).
+    now()/sleep() let replay providers run the loops on their own clock.
+    min_request_gap is the spacing the fetch scheduler keeps between batch calls.
+    """
+    name = "base"
+    min_request_gap = 0.0
+
+    @abstractmethod
+    def download(self, tickers, interval, period=None, start=None, prepost=None):
+        """Bars for tickers over period (or since start) as a group_by='ticker' frame."""
+
+    def history(self, ticker, interval, period=None, start=None, prepost=None, timeout=None):
+        """Single-ticker fetch that is safe to run concurrently (used for fallbacks)."""
+        return self.download([ticker], interval, period=period, start=start, prepost=prepost)
+
+    def now(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+    min_request_gap = FETCH_MIN_GAP
+
+    def download(self, tickers, interval, period=None, start=None, prepost=None):
+        if prepost is None: prepost = is_intraday(interval)
+        kwargs = {"start": start} if start is not None else {"period": period}
+        with DOWNLOAD_LOCK:
+            df = yf.download(tickers, interval=interval, progress=False, group_by='ticker',
+                             auto_adjust=True, prepost=prepost, threads=False, **kwargs)
+        return normalize_download(df, tickers)
+
+    def history(self, ticker, interval, period=None, start=None, prepost=None, timeout=None):
+        # Ticker.history keeps its state per object, so no DOWNLOAD_LOCK needed
+        if prepost is None: prepost = is_intraday(interval)
+        kwargs = {"start": start} if start is not None else {"period": period}
+        if timeout is not None: kwargs["timeout"] = timeout
+        df = yf.Ticker(ticker).history(interval=interval, auto_adjust=True, prepost=prepost,
+                                       raise_errors=True, **kwargs)
+        if df is None or df.empty: return pd.DataFrame()
+        return normalize_download(df.reindex(columns=OHLCV_FIELDS), [ticker])
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves recorded bars from a CSV file (see record_replay_file) on a replay clock.
+    speed=1 replays in wall-clock time, speed=60 runs an hour per minute, and
+    speed<=0 is step mode: sleep() returns immediately and jumps the clock forward,
+    so a loop runs as fast as the CPU allows (for benchmarks).
+    Bars whose bar_start is after the replay clock are not visible yet.
+    """
+    name = "replay"
+
+    def __init__(self, path, speed=1.0, start_at=None):
+        self.speed = speed
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            df = pd.DataFrame(list(reader), columns=REPLAY_COLUMNS)
+        df['bar_start'] = df['bar_start'].astype('int64')
+        for col in ['open', 'high', 'low', 'close', 'volume']:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        self.bars = {interval: g.sort_values('bar_start') for interval, g in df.groupby('interval')}
+
+        if start_at is None:
+            # Default: enough history behind the clock for a 5d window
+            first = int(df['bar_start'].min()) if len(df) else 0
+            start_at = first + 5 * 86400
+        self._clock = float(pd.Timestamp(start_at).timestamp()) if isinstance(start_at, str) else float(start_at)
+        self._wall_start = time.time()
+        self._clock_start = self._clock
+        self._lock = threading.Lock()
+
+    def now(self):
+        if self.speed <= 0:
+            return self._clock
+        return self._clock_start + (time.time() - self._wall_start) * self.speed
+
+    def sleep(self, seconds):
+        if self.speed <= 0:
+            # Advance to the caller's wake-up time; concurrent sleepers don't add up
+            with self._lock:
+                self._clock = max(self._clock, self.now() + seconds)
+            return
+        time.sleep(seconds / self.speed)
+
+    def download(self, tickers, interval, period=None, start=None, prepost=None):
+        bars = self.bars.get(interval)
+        if bars is None: return pd.DataFrame()
+        now = self.now()
+        if start is not None:
+            since = pd.Timestamp(start)
+            since = since.tz_localize('UTC') if since.tz is None else since
+            since = since.timestamp()
+        else:
+            since = now - period_to_days(period) * (3 if is_intraday(interval) else 1) * 86400
+        sel = bars[bars['ticker'].isin(tickers) & (bars['bar_start'] >= since) & (bars['bar_start'] <= now)]
+        rows = sel[['ticker', 'bar_start', 'open', 'high', 'low', 'close', 'volume']].itertuples(index=False, name=None)
+        return rows_to_frame(list(rows), interval, period if start is None else None)
+
+def record_replay_file(path, rows, interval):
+    """Writes [(ticker, bar_start, open, high, low, close, volume)] in ReplayProvider's format."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPLAY_COLUMNS)
+        for ticker, bar_start, o, h, l, c, v in rows:
+            writer.writerow([ticker, interval, bar_start, o, h, l, c, v])
+
+# --- ACTIVE PROVIDER ---
+
+_PROVIDER = None
+
+def get_provider():
+    global _PROVIDER
+    if _PROVIDER is None:
+        if MARKET_DATA_PROVIDER == "replay":
+            _PROVIDER = ReplayProvider(REPLAY_FILE, speed=REPLAY_SPEED, start_at=REPLAY_START)
+            print(f"⏪ Replaying market data from {REPLAY_FILE} at {REPLAY_SPEED}x")
+        else:
+            _PROVIDER = YFinanceProvider()
+    return _PROVIDER
+
+def set_provider(provider):
+    """Swaps the active provider (tests, benchmarks, alternative feeds)."""
+    global _PROVIDER
+    _PROVIDER = provider
@@ -1,4 +1,3 @@
-import yfinance as yf
 import pandas as pd
 import sys
 import os
@@ -6,8 +5,11 @@ import os
 # Add parent dir to path to import config
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config import VWAP_WATCHLIST
+from providers import get_provider
 
-print(f"🔍 Starting Market Data Diagnostic for {len(VWAP_WATCHLIST)} tickers...")
+provider = get_provider()
+
+print(f"🔍 Starting Market Data Diagnostic for {len(VWAP_WATCHLIST)} tickers ({provider.name})...")
 print("-" * 50)
 
 success_count = 0
@@ -17,7 +19,7 @@ skipped_count = 0
 # 1. Test Batch Download
 print("\n1️⃣ Testing Batch Download...")
 try:
-    df = yf.download(VWAP_WATCHLIST, period='5d', interval='15m', progress=True, group_by='ticker', auto_adjust=True, prepost=True, threads=False)
+    df = provider.download(VWAP_WATCHLIST, '15m', period='5d')
     print(f"✅ Batch Download Complete. Shape: {df.shape}")
 except Exception as e:
     print(f"❌ Batch Download Failed: {e}")
@@ -33,18 +35,15 @@ for ticker in VWAP_WATCHLIST:
         source = "BATCH"
         
         # Try batch first
-        if not df.empty:
-            if len(VWAP_WATCHLIST) > 1:
-                if ticker in df:
-                    t_df = df[ticker].copy()
-            else:
-                t_df = df.copy()
+        if not df.empty and ticker in df:
+            t_df = df[ticker].copy()
         
         # Fallback
         if t_df is None or t_df.empty:
             source = "INDIVIDUAL"
             # print(f"   ⚠️ Fetching {ticker} individually...")
-            t_df = yf.download(ticker, period='5d', interval='15m', progress=False, auto_adjust=True, prepost=True)
+            t_df = provider.download([ticker], '15m', period='5d')
+            t_df = t_df[ticker] if not t_df.empty else None
 
         # Validate
         if t_df is None or t_df.empty:
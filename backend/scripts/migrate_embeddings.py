@@ -0,0 +1,66 @@
+import sys
+import os
+import sqlite3
+
+# Add parent dir to path to import config
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import DB_FILE, EMBEDDING_DTYPE
+from embeddings import encode_embedding, decode_embedding, is_binary_embedding
+
+# Usage: python scripts/migrate_embeddings.py [--chunk N] [--vacuum]
+# Rewrites JSON text embeddings as binary blobs, in chunks of N rows (one commit per
+# chunk, so it can be stopped and re-run). news_events rows that duplicate a logs row
+# (same timestamp and title) lose their copy: embeddings live in logs.text_embedding.
+
+CHUNK = int(sys.argv[sys.argv.index("--chunk") + 1]) if "--chunk" in sys.argv else 500
+
+def convert_column(conn, table, column):
+    converted = skipped = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(f'''SELECT id, {column} FROM {table}
+                                WHERE id > ? AND {column} IS NOT NULL ORDER BY id LIMIT ?''',
+                            (last_id, CHUNK)).fetchall()
+        if not rows: break
+        updates = []
+        for row_id, value in rows:
+            if is_binary_embedding(value): continue
+            vec = decode_embedding(value)
+            if vec is None:
+                skipped += 1
+                continue
+            updates.append((encode_embedding(vec, EMBEDDING_DTYPE), row_id))
+        conn.executemany(f"UPDATE {table} SET {column} = ? WHERE id = ?", updates)
+        conn.commit()
+        converted += len(updates)
+        last_id = rows[-1][0]
+        print(f"   {table}.{column}: {converted} converted (up to id {last_id})")
+    return converted, skipped
+
+def migrate():
+    print(f"🔧 Migrating embeddings in {DB_FILE} to {EMBEDDING_DTYPE} blobs...")
+    try:
+        with sqlite3.connect(DB_FILE) as conn:
+            converted, skipped = convert_column(conn, "logs", "text_embedding")
+            print(f"✅ logs: {converted} converted, {skipped} unreadable left as-is")
+
+            cur = conn.execute('''UPDATE news_events SET embedding = NULL
+                                  WHERE embedding IS NOT NULL AND EXISTS (
+                                      SELECT 1 FROM logs WHERE logs.timestamp = news_events.timestamp
+                                      AND logs.title IS news_events.title AND logs.text_embedding IS NOT NULL)''')
+            conn.commit()
+            print(f"✅ news_events: dropped {cur.rowcount} copies already stored in logs")
+
+            converted, skipped = convert_column(conn, "news_events", "embedding")
+            print(f"✅ news_events: {converted} remaining embeddings converted, {skipped} unreadable")
+
+        if "--vacuum" in sys.argv:
+            print("🧹 VACUUM (reclaims the freed pages)...")
+            with sqlite3.connect(DB_FILE) as conn:
+                conn.execute("VACUUM")
+        print("Migration complete.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,19 @@
+import sys
+import os
+import time
+
+# Add parent dir to path to import config
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import VWAP_WATCHLIST, REPLAY_FILE
+from database import load_bar_rows
+from providers import record_replay_file
+
+# Usage: python scripts/record_replay.py [interval] [days] [output.csv]
+interval = sys.argv[1] if len(sys.argv) > 1 else "15m"
+days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+path = sys.argv[3] if len(sys.argv) > 3 else REPLAY_FILE
+
+rows = load_bar_rows(VWAP_WATCHLIST, interval, int(time.time() - days * 86400))
+record_replay_file(path, rows, interval)
+print(f"✅ Recorded {len(rows)} {interval} bars ({days}d) to {path}")
+print(f"   Replay with: MARKET_DATA_PROVIDER=replay REPLAY_FILE={path} REPLAY_SPEED=60 python main.py")
@@ -0,0 +1,99 @@
+import sys
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+import notifications
+from notifications import AlertDispatcher
+
+class FakeWebhook:
+    """Answers with the queued responses in order, then 204."""
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.calls = []
+
+    def post(self, url, json=None, timeout=None):
+        self.calls.append((time.monotonic(), json))
+        status, headers = self.responses.pop(0) if self.responses else (204, {})
+        if status == "down": raise requests.ConnectionError("connection refused")
+        return SimpleNamespace(status_code=status, headers=headers, text="", json=lambda: {})
+
+def embed(i):
+    return {"title": f"Alert {i}"}
+
+def test_alerts_are_coalesced_off_thread():
+    print("🚀 Testing batched alert dispatch...")
+    hook = FakeWebhook()
+    dispatcher = AlertDispatcher(url="https://discord.test/hook", coalesce_window=0.1, session=hook)
+    start = time.monotonic()
+    for i in range(12):
+        dispatcher.enqueue(embed(i), "Market Mind")
+    dispatcher.enqueue({"title": "Heartbeat lost"}, "Market Mind System")
+    assert time.monotonic() - start < 0.05  # The caller never waits on Discord
+    assert dispatcher.flush(2)
+    sizes = [(call["username"], len(call["embeds"])) for _, call in hook.calls]
+    assert sizes == [("Market Mind", 10), ("Market Mind", 2), ("Market Mind System", 1)]
+    print(f"✅ 13 alerts in {len(hook.calls)} webhook calls.")
+
+def test_rate_limit_and_retries():
+    print("🚀 Testing 429 / transient failure handling...")
+    hook = FakeWebhook([(429, {"Retry-After": "0.3"}), (502, {}), ("down", {})])
+    dispatcher = AlertDispatcher(url="https://discord.test/hook", coalesce_window=0.01, rate=50, session=hook)
+    with patch.object(notifications, 'ALERT_RETRY_BACKOFF', 0.05):
+        dispatcher.enqueue(embed(1), "Market Mind")
+        assert dispatcher.flush(3)
+    times = [t for t, _ in hook.calls]
+    assert len(hook.calls) == 4  # 429, 502, network error, then delivered
+    assert times[1] - times[0] >= 0.3  # Retry-After honoured
+    assert all(call["embeds"] == [embed(1)] for _, call in hook.calls)
+
+    # Past ALERT_MAX_RETRIES the alert is dropped, and a 4xx is never retried
+    hook = FakeWebhook([(400, {})])
+    dispatcher = AlertDispatcher(url="https://discord.test/hook", coalesce_window=0.01, session=hook)
+    dispatcher.enqueue(embed(2), "Market Mind")
+    assert dispatcher.flush(2) and len(hook.calls) == 1
+    print("✅ Retry-After respected, transient errors retried, bad payloads dropped.")
+
+def test_batches_respect_size_limit():
+    print("🚀 Testing embed size limit...")
+    hook = FakeWebhook([(400, {}), (204, {}), (400, {})])
+    dispatcher = AlertDispatcher(url="https://discord.test/hook", coalesce_window=0.1, rate=50, session=hook)
+    # Long theses: 4 x 2500 characters can't share one 6000-character message
+    for i in range(4):
+        dispatcher.enqueue({"title": f"Alert {i}", "description": "x" * 2500}, "Market Mind")
+    assert dispatcher.flush(2)
+    sizes = [len(call["embeds"]) for _, call in hook.calls]
+    assert sizes[:3] == [2, 1, 1] and sizes[3:] == [2]
+    # The rejected pair was resent one by one: only the bad embed was dropped
+    titles = [[e["title"] for e in call["embeds"]] for _, call in hook.calls]
+    assert titles == [["Alert 0", "Alert 1"], ["Alert 0"], ["Alert 1"], ["Alert 2", "Alert 3"]]
+    print(f"✅ Batches by size {sizes}, rejected batch split instead of dropped.")
+
+def test_overflow_while_batch_waits():
+    print("🚀 Testing outbox overflow during the coalesce window...")
+    hook = FakeWebhook()
+    dispatcher = AlertDispatcher(url="https://discord.test/hook", coalesce_window=0.2, outbox_size=3, rate=50,
+                                 session=hook)
+    dispatcher.enqueue(embed(0), "Market Mind")
+    time.sleep(0.05)  # The dispatcher has picked Alert 0 and is waiting for more
+    for i in range(1, 6):
+        dispatcher.enqueue(embed(i), "Market Mind")  # Evicts Alert 0, 1 and 2
+    assert dispatcher.flush(2)
+    titles = [e["title"] for _, call in hook.calls for e in call["embeds"]]
+    assert titles == ["Alert 3", "Alert 4", "Alert 5"]
+
+    # The dispatcher thread survived and keeps sending
+    dispatcher.enqueue(embed(6), "Market Mind")
+    assert dispatcher.flush(2) and hook.calls[-1][1]["embeds"] == [embed(6)]
+    assert dispatcher._thread.is_alive()
+    print("✅ Evicted alerts skipped, dispatcher still running.")
+
+if __name__ == "__main__":
+    test_alerts_are_coalesced_off_thread()
+    test_rate_limit_and_retries()
+    test_batches_respect_size_limit()
+    test_overflow_while_batch_waits()
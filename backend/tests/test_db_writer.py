@@ -0,0 +1,48 @@
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+import metrics
+from database import DBWriter
+
+def test_single_writer_group_commit():
+    print("🚀 Testing single-writer group commit...")
+    writer = DBWriter(batch_window=0.005)
+    with tempfile.TemporaryDirectory() as tmp, patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')):
+        writer.submit(lambda conn: conn.execute("CREATE TABLE t (worker INTEGER, n INTEGER)"), "Create")
+        before = metrics.snapshot()["counters"].get("db.commits", 0)
+
+        # 8 threads x 100 synchronous inserts: no "database is locked", far fewer commits than writes
+        def burst(worker):
+            for n in range(100):
+                rowid = writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (?, ?)", (worker, n)).lastrowid, "Insert")
+                assert rowid > 0
+        threads = [threading.Thread(target=burst, args=(w,)) for w in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        commits = metrics.snapshot()["counters"]["db.commits"] - before
+
+        # A failing request only loses its own writes; async failures are reported, not raised
+        def half_then_fail(conn):
+            conn.execute("INSERT INTO t VALUES (99, 0)")
+            raise ValueError("boom")
+        future = writer.submit(half_then_fail, "Bad Insert", wait=False)
+        writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (100, 0)"), "Insert", wait=False)
+        assert writer.flush(5)
+        assert isinstance(future.exception(), ValueError)
+
+        with sqlite3.connect(database.DB_FILE) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM t WHERE worker < 8").fetchone()[0] == 800
+            assert conn.execute("SELECT COUNT(*) FROM t WHERE worker = 99").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM t WHERE worker = 100").fetchone()[0] == 1
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert commits < 800
+        print(f"✅ 800 concurrent inserts in {commits} commits.")
+
+if __name__ == "__main__":
+    test_single_writer_group_commit()
@@ -0,0 +1,75 @@
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+import importlib.util
+import numpy as np
+from unittest.mock import patch
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+import embeddings
+
+def load_migration():
+    path = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'migrate_embeddings.py')
+    spec = importlib.util.spec_from_file_location("migrate_embeddings", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_binary_embedding_format():
+    print("🚀 Testing binary embeddings...")
+    vec = np.random.default_rng(0).normal(size=768).astype(np.float32)
+    legacy = json.dumps(vec.tolist())
+
+    blob = embeddings.encode_embedding(vec)
+    assert len(blob) == embeddings.HEADER.size + 768 * 4
+    assert np.array_equal(embeddings.decode_embedding(blob), vec)
+    print(f"   JSON {len(legacy)} bytes -> float32 blob {len(blob)} bytes")
+
+    half = embeddings.encode_embedding(vec, "float16")
+    assert len(half) == embeddings.HEADER.size + 768 * 2
+    assert np.allclose(embeddings.decode_embedding(half), vec, atol=1e-2)
+
+    # Legacy JSON rows (text or bytes) still decode
+    assert np.allclose(embeddings.decode_embedding(legacy), vec)
+    assert np.allclose(embeddings.decode_embedding(legacy.encode()), vec)
+    assert embeddings.decode_embedding(b"") is None and embeddings.decode_embedding("not json") is None
+    print("✅ Round trips for float32, float16 and legacy JSON.")
+
+def test_embedding_migration():
+    print("🚀 Testing embedding migration...")
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(7, 16)).astype(np.float32)
+    migration = load_migration()
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch.object(migration, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch.object(migration, 'CHUNK', 3):
+        database.init_db()
+        with sqlite3.connect(database.DB_FILE) as conn:
+            for i, vec in enumerate(vectors):
+                ts, title, emb = f"2025-01-0{i + 1}", f"Story {i}", json.dumps(vec.tolist())
+                conn.execute("INSERT INTO logs (timestamp, title, text_embedding) VALUES (?, ?, ?)", (ts, title, emb))
+                conn.execute("INSERT INTO news_events (timestamp, title, embedding) VALUES (?, ?, ?)", (ts, title, emb))
+            conn.execute("INSERT INTO news_events (timestamp, title, embedding) VALUES ('x', 'orphan', ?)",
+                         (json.dumps(vectors[0].tolist()),))
+
+        migration.migrate()
+        migration.migrate()  # Re-running is a no-op
+
+        ids, matrix = database.load_log_embeddings()
+        with sqlite3.connect(database.DB_FILE) as conn:
+            copies = conn.execute("SELECT title, embedding FROM news_events WHERE embedding IS NOT NULL").fetchall()
+
+    assert list(ids) == list(range(1, 8)) and matrix.dtype == np.float32
+    assert np.array_equal(matrix, vectors)
+    # Only the news_events row without a logs twin keeps (a converted) embedding
+    assert len(copies) == 1 and copies[0][0] == 'orphan' and embeddings.is_binary_embedding(copies[0][1])
+    print("✅ Chunked migration converted rows and dropped duplicate copies.")
+
+if __name__ == "__main__":
+    test_binary_embedding_format()
+    test_embedding_migration()
@@ -0,0 +1,46 @@
+import sys
+import os
+import time
+from types import SimpleNamespace
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import bot_logic
+from entities import AhoCorasick, EntityIndex, ENTITIES, MACRO
+
+def test_aho_corasick_overlaps():
+    print("🚀 Testing Aho-Corasick matcher...")
+    ac = AhoCorasick({"he": "he", "she": "she", "his": "his", "hers": "hers"})
+    assert sorted((s, e, v) for s, e, v in ac.finditer("ushers")) == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+    print("✅ Overlapping matches found in one pass.")
+
+def test_entity_extraction():
+    print("🚀 Testing entity extraction...")
+    assert ENTITIES.extract("Powell: Fed will cut; $SPY and QQQ rally") == [MACRO, "SPY", "QQQ"]
+    assert ENTITIES.extract_tickers("Nvidia beats, chipmakers up. Oil prices slide") == ["NVDA", "SMH", "USO"]
+    assert ENTITIES.extract("spyware DIAL and a spy novel") == []  # Whole words, symbols case-sensitive
+    assert ENTITIES.extract("Your energy is full, collect 50 gold") == []  # Plain words aren't entities
+    assert ENTITIES.extract("Your Amazon package is here; fed the dog; Apple Music trial; oil change due") == []
+
+    index = EntityIndex(ticker_map={"SPY": "S&P 500"}, aliases={"acme corp": ["ACME", "SPY"]})
+    assert index.extract("ACME CORP guides higher") == ["ACME", "SPY"]
+
+    text = "Nvidia beats estimates as the Fed holds rates; SPY up 1% and oil prices slide after OPEC meets " * 3
+    start = time.perf_counter()
+    for _ in range(1000): ENTITIES.extract(text)
+    per_call = (time.perf_counter() - start) / 1000
+    assert per_call < 0.005
+    print(f"✅ Entities extracted in {per_call * 1e6:.0f}µs per headline.")
+
+def test_micro_regime_without_llm():
+    print("🚀 Testing local micro-regime lookup...")
+    snapshot = SimpleNamespace(vwap={"SMH": {"price": 101.0, "vwap": 100.0, "rsi": 64, "rvol": 2.1}})
+    tickers = ENTITIES.extract_tickers("Nvidia raises guidance")
+    regime, ticker = bot_logic._micro_regime(snapshot, tickers)
+    assert ticker == "SMH" and regime == {"rsi": 64, "rvol": 2.1, "vwap_dist": 1.0}
+    assert bot_logic._micro_regime(snapshot, ["QQQ"]) == ({}, None)
+    print("✅ Micro regime from the sector proxy before Gemini answers.")
+
+if __name__ == "__main__":
+    test_aho_corasick_overlaps()
+    test_entity_extraction()
+    test_micro_regime_without_llm()
@@ -0,0 +1,79 @@
+import sys
+import os
+import time
+import sqlite3
+import tempfile
+from unittest.mock import patch
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+import metrics
+from inbox import NewsInbox
+from news_queue import PriorityNewsQueue
+
+def statuses():
+    with sqlite3.connect(database.DB_FILE) as conn:
+        return dict(conn.execute("SELECT json_extract(payload, '$.title'), status FROM news_inbox").fetchall())
+
+def test_inbox_survives_restart_and_retries():
+    print("🚀 Testing durable news inbox...")
+    with tempfile.TemporaryDirectory() as tmp, patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')):
+        database.init_db()
+
+        # 1. Group commit: a burst of items shares a handful of transactions
+        before = metrics.snapshot()["counters"].get("news.inbox.commits", 0)
+        inbox = NewsInbox(flush_interval=0.05)
+        for i in range(100):
+            inbox.append({"title": f"Burst {i}", "body": "", "source": "TestApp", "received_at": time.time()})
+        time.sleep(0.3)
+        commits = metrics.snapshot()["counters"]["news.inbox.commits"] - before
+        assert set(statuses().values()) == {"processing"} and len(statuses()) == 100
+        assert commits <= 5, commits
+        print(f"✅ 100 inserts in {commits} commits.")
+
+        # 2. "Crash": a new process recovers everything the old one still owned, oldest first
+        restarted = NewsInbox()
+        queue = PriorityNewsQueue(capacity=500, on_shed=restarted.shed)
+        assert restarted.recover() == 100
+        while restarted.claim_into(queue): pass  # What the pump does, batch by batch
+        assert queue.qsize() == 100
+        first = queue.get()
+        assert first["title"] == "Burst 0" and first["inbox_id"] and first["attempts"] == 0
+        print("✅ Unfinished items recovered after restart.")
+
+        # 3. Completion, retry with backoff, dead-letter
+        second, third = queue.get(), queue.get()
+        restarted.complete(first)
+        restarted.fail(second, "analysis: timeout")
+        third["attempts"] = restarted.max_attempts - 1
+        assert not restarted.will_retry(third)
+        restarted.fail(third, "analysis: timeout")
+        restarted.flush()
+        rows = statuses()
+        assert rows["Burst 0"] == "done" and rows["Burst 1"] == "pending" and rows["Burst 2"] == "dead"
+        assert restarted.claim_into(queue) == 0  # Retry isn't due yet
+        with sqlite3.connect(database.DB_FILE) as conn:
+            attempts, next_at, error = conn.execute(
+                "SELECT attempts, next_attempt_at, last_error FROM news_inbox WHERE id = ?", (second["inbox_id"],)).fetchone()
+        assert attempts == 1 and next_at > time.time() + 20 and error == "analysis: timeout"
+        print("✅ Done / retry backoff / dead-letter recorded.")
+
+        # 4. Items shed by queue backpressure are closed, not recovered again
+        small = PriorityNewsQueue(capacity=1, policy="drop", on_shed=restarted.shed)
+        for title in ("Promo A", "Promo B"):
+            small.put(restarted.append({"title": title, "body": "", "source": "TestApp", "received_at": time.time()}))
+        restarted.flush()
+        assert statuses()["Promo A"] == "shed" and statuses()["Promo B"] == "processing"
+
+        # 5. A digest replacing folded items gets its own row, so a restart doesn't lose it
+        folding = PriorityNewsQueue(capacity=2, policy="summarize", on_shed=restarted.shed, on_digest=restarted.append)
+        for title in ("Level up 1", "Level up 2", "Level up 3"):
+            folding.put(restarted.append({"title": title, "body": "", "source": "GameApp", "received_at": time.time()}))
+        restarted.flush()
+        rows = statuses()
+        assert rows["Level up 1"] == "shed" and rows["Level up 2"] == "shed"
+        assert rows["2 updates from GameApp"] == "processing"
+        print("✅ Shed items closed in the inbox, digests recorded.")
+
+if __name__ == "__main__":
+    test_inbox_survives_restart_and_retries()
@@ -0,0 +1,194 @@
+import sys
+import os
+import json
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import VWAP_BANDS, RSI_PERIOD
+from indicators import (
+    compute_watchlist_indicators, missing_tickers, is_index_ticker,
+    update_indicator_states, TickerIndicatorState, DailyHistoryCache
+)
+
+def legacy_latest(t_df, ticker):
+    """The original per-ticker row scan from monitor.vwap_monitor_loop, used as reference."""
+    is_index = is_index_ticker(ticker)
+    valid_idx = None
+    for idx in reversed(t_df.index):
+        row = t_df.loc[idx]
+        if pd.isna(row['Close']) or row['Close'] == 0: continue
+        if is_index or (row['Volume'] > 0):
+            valid_idx = idx
+            break
+    if valid_idx is None: return None
+    df = t_df.loc[:valid_idx].dropna().copy()
+    if len(df) < 50: return None
+
+    df['Typical_Price'] = (df['High'] + df['Low'] + df['Close']) / 3
+    df['VWAP'] = (df['Typical_Price'] * df['Volume']).cumsum() / df['Volume'].cumsum()
+    delta = df['Close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=RSI_PERIOD).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=RSI_PERIOD).mean()
+    df['RSI'] = 100 - (100 / (1 + gain / loss))
+    df['RVOL'] = df['Volume'] / df['Volume'].rolling(window=20).mean()
+    rolling_std = df['Close'].rolling(window=26).std()
+    df['Upper_Band'] = df['VWAP'] + (rolling_std * VWAP_BANDS)
+
+    latest = df.iloc[-1]
+    day_data = df[df.index.date == df.index[-1].date()]
+    open_price = float(day_data['Open'].iloc[0])
+    return {
+        "close": latest['Close'], "vwap": latest['VWAP'], "rsi": latest['RSI'],
+        "rvol": latest['RVOL'], "upper_band": latest['Upper_Band'],
+        "daily_change": (latest['Close'] - open_price) / open_price * 100,
+    }
+
+def make_batch(n=300, seed=7):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-02 09:00', periods=n, freq='15min', tz='UTC')
+    frames = {}
+    for ticker in ['SPY', 'QQQ', '^VIX', 'BTC-USD', 'XLK']:
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        frames[ticker] = pd.DataFrame({
+            'Open': close + rng.normal(0, 0.3, n),
+            'High': close + 1,
+            'Low': close - 1,
+            'Close': close,
+            'Volume': rng.integers(1_000, 50_000, n).astype(float),
+        }, index=index)
+
+    # Gaps, trailing zero-volume bars and a volume-less index
+    frames['SPY'].iloc[100:110] = np.nan
+    frames['SPY'].iloc[-5:, 4] = 0
+    frames['QQQ'].iloc[-3:] = np.nan
+    frames['^VIX']['Volume'] = 0.0
+    frames['XLK'].iloc[:-30] = np.nan  # too short
+    return pd.concat(frames, axis=1)
+
+def test_batched_engine_matches_row_scan():
+    print("🚀 Testing batched indicator engine...")
+    df = make_batch()
+    tickers = ['SPY', 'QQQ', '^VIX', 'BTC-USD', 'XLK', 'GLD']
+
+    assert missing_tickers(df, tickers) == ['GLD']
+
+    results, skipped = compute_watchlist_indicators(df, tickers)
+    assert set(skipped) == {'XLK', 'GLD'}
+
+    for ticker in ['SPY', 'QQQ', '^VIX', 'BTC-USD']:
+        expected = legacy_latest(df[ticker], ticker)
+        got = results[ticker]
+        for key, value in expected.items():
+            assert np.isclose(got[key], value, equal_nan=True), f"{ticker} {key}: {got[key]} != {value}"
+    print("✅ Batched indicators match the per-ticker implementation.")
+
+def test_streaming_state_matches_batch():
+    print("🚀 Testing streaming indicator state...")
+    df = make_batch()
+    tickers = ['SPY', 'QQQ', '^VIX', 'BTC-USD']
+    expected, _ = compute_watchlist_indicators(df, tickers)
+
+    # Cold start on most of the window, then a "forming" bar with wrong values
+    states = {}
+    update_indicator_states(states, df.iloc[:250], tickers)
+    forming = df.iloc[:251].copy()
+    forming.iloc[-1] = forming.iloc[-1] * 1.5
+    update_indicator_states(states, forming, tickers)
+
+    # Checkpoint / restore in the middle, then the remaining bars incl. the revised one
+    states = {t: TickerIndicatorState.from_dict(json.loads(json.dumps(s.to_dict()))) for t, s in states.items()}
+    results, _ = update_indicator_states(states, df, tickers)
+
+    for ticker in tickers:
+        for key in ['close', 'vwap', 'rsi', 'rvol', 'upper_band', 'lower_band', 'daily_change']:
+            assert np.isclose(results[ticker][key], expected[ticker][key], equal_nan=True), \
+                f"{ticker} {key}: {results[ticker][key]} != {expected[ticker][key]}"
+        assert results[ticker]['bars'] == expected[ticker]['bars']
+
+    # Revising a day's first bar on a rolling-VWAP state: same as never seeing the wrong values
+    spy = df['SPY'].dropna()
+    day_start = int(np.flatnonzero(spy.index.normalize() != spy.index.normalize()[0])[0])
+    revised, clean = TickerIndicatorState(vwap_window=26), TickerIndicatorState(vwap_window=26)
+    for ts, bar in zip(spy.index[:day_start + 1], spy.to_numpy()):
+        clean.update(ts, *bar)
+        revised.update(ts, *bar)
+    revised.update(spy.index[day_start], *(spy.iloc[day_start].to_numpy() * 1.5))
+    revised.update(spy.index[day_start], *spy.iloc[day_start].to_numpy())
+    for key, value in clean.snapshot().items():
+        if key != 'timestamp':
+            assert np.isclose(revised.snapshot()[key], value, equal_nan=True), key
+    print("✅ Streaming state matches the batched engine.")
+
+def test_confluence_feeds_new_bars_only():
+    print("🚀 Testing streaming technical confluence...")
+    import analysis
+    df = make_batch()
+    spy = df['SPY'].dropna()
+    reference = TickerIndicatorState(vwap_window=analysis.CONFLUENCE_VWAP_WINDOW)
+    for ts, bar in zip(spy.index, spy.to_numpy()):
+        reference.update(ts, *bar)
+
+    forming = df.iloc[:251].copy()
+    forming.iloc[-1] = forming.iloc[-1] * 1.5
+    with patch.object(analysis, 'CONFLUENCE_STATES', {}), \
+         patch.object(analysis.SCHEDULER, 'get', side_effect=[df.iloc[:250], forming, df]):
+        assert analysis.get_technical_confluence('SPY') is not None
+        analysis.get_technical_confluence('SPY')
+        # The forming bar is revised in place; only the newer bars are fed
+        got = analysis.get_technical_confluence('SPY')
+        assert analysis.CONFLUENCE_STATES['SPY'].bars == reference.bars
+
+    expected = reference.snapshot()
+    for key, name in [('close', 'Close'), ('vwap', 'VWAP'), ('rsi', 'RSI'), ('rvol', 'RVOL'),
+                      ('upper_band', 'Upper_Band'), ('daily_change', 'daily_change')]:
+        assert np.isclose(got[name], expected[key], equal_nan=True), f"{name}: {got[name]} != {expected[key]}"
+    print("✅ Confluence keeps one streaming state per ticker.")
+
+def make_daily(n=260, seed=3):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(end='2025-03-14', periods=n, freq='B', tz='UTC')
+    closes = pd.DataFrame({t: 100 + np.cumsum(rng.normal(0, 1, n)) for t in ['SPY', 'XLK', 'XLE']}, index=index)
+    closes.iloc[:10, 2] = np.nan  # Shorter history for one ticker
+    return closes
+
+def test_daily_history_cache():
+    print("🚀 Testing daily history cache...")
+    closes = make_daily()
+    today = closes.index[-1].date()
+
+    def full_frame(frame):
+        sma = frame['SPY'].dropna().rolling(window=200).mean().iloc[-1]
+        prev, curr = frame.iloc[-2], frame.iloc[-1]
+        return sma, (curr - prev) / prev
+
+    cache = DailyHistoryCache(window=200)
+
+    # 1. Today's daily bar exists: identical to the rolling() computation
+    cache.load(closes, today)
+    sma, rets = full_frame(closes)
+    assert np.isclose(cache.sma('SPY'), sma)
+    for t in closes.columns:
+        assert np.isclose((cache.latest(t) - cache.previous(t)) / cache.previous(t), rets[t])
+
+    # 2. Intraday patch only moves the live row
+    patched = closes.copy()
+    patched.iloc[-1, 0] = 123.45
+    cache.set_live('SPY', 123.45)
+    sma, rets = full_frame(patched)
+    assert np.isclose(cache.sma('SPY'), sma)
+    assert np.isclose(cache.latest('SPY'), 123.45)
+
+    # 3. Loaded before today's bar exists (weekend / pre-open): last two completed days
+    cache.load(closes.iloc[:-1], today)
+    sma, rets = full_frame(closes.iloc[:-1])
+    assert np.isclose(cache.sma('SPY'), sma)
+    assert np.isclose((cache.latest('XLK') - cache.previous('XLK')) / cache.previous('XLK'), rets['XLK'])
+    print("✅ Daily history cache matches the full-frame computation.")
+
+if __name__ == "__main__":
+    test_batched_engine_matches_row_scan()
+    test_streaming_state_matches_batch()
+    test_confluence_feeds_new_bars_only()
+    test_daily_history_cache()
@@ -1,6 +1,10 @@
+import os
 import queue
 import json
+import tempfile
+from unittest.mock import patch
 import bot_logic
+import database
 import ingestor
 
 def test_ingestor():
@@ -19,22 +23,28 @@ def test_ingestor():
         }
     })
     
-    print("1️⃣ Simulating WebSocket Message...")
-    ingestor.on_message(None, mock_msg)
+    # submit_news records the item in the inbox: keep it out of the real database
+    with tempfile.TemporaryDirectory() as tmp, patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')):
+        database.init_db()
+        print("1️⃣ Simulating WebSocket Message...")
+        ingestor.on_message(None, mock_msg)
+        ingestor.start_mirror_consumer()  # Hands it to bot_logic off the websocket thread
     
-    print("2️⃣ Checking News Queue...")
-    try:
-        item = bot_logic.NEWS_QUEUE.get(timeout=2)
-        print("✅ Item received in queue:")
-        print(json.dumps(item, indent=2))
+        print("2️⃣ Checking News Queue...")
+        try:
+            item = bot_logic.NEWS_QUEUE.get(timeout=2)
+            print("✅ Item received in queue:")
+            print(json.dumps(item, indent=2))
         
-        if item['source'] == "TestApp" and item['title'] == "Test Title":
-            print("✅ Data integrity verified.")
-        else:
-            print("❌ Data mismatch.")
+            if item['source'] == "TestApp" and item['title'] == "Test Title":
+                print("✅ Data integrity verified.")
+            else:
+                print("❌ Data mismatch.")
             
-    except queue.Empty:
-        print("❌ Queue is empty! Ingestor failed to put item.")
+        except queue.Empty:
+            print("❌ Queue is empty! Ingestor failed to put item.")
+        bot_logic.INBOX.flush()
+        database.DB_WRITER.flush()
 
 if __name__ == "__main__":
     test_ingestor()
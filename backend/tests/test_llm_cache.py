@@ -0,0 +1,71 @@
+import sys
+import os
+import time
+import json
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+import analysis
+import llm_cache
+import metrics
+import numpy as np
+from embeddings import decode_embedding
+
+def test_llm_cache_hits_and_expiry():
+    print("🚀 Testing LLM cache...")
+    calls = {"generate": 0, "embed": 0}
+
+    class FakeModel:
+        def generate_content(self, prompt):
+            calls["generate"] += 1
+            return SimpleNamespace(text=json.dumps({"headline": "Fed holds", "impact_score": 7}))
+
+    def fake_embed(model, content):
+        calls["embed"] += 1
+        return {"embedding": [0.1, 0.2, 0.3]}
+
+    cache = llm_cache.LLMCache(max_items=100, ttl=3600)
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch.object(analysis, 'model', FakeModel(), create=True), \
+         patch.object(analysis.genai, 'embed_content', side_effect=fake_embed), \
+         patch.object(analysis, 'LLM_CACHE', cache):
+        database.init_db()
+
+        # Mirror + tickle copy of the same story (different app, spacing and case): one API call each
+        first, _ = analysis.get_gemini_analysis("Fed holds rates", "Powell: data dependent.", "Bloomberg")
+        t0 = time.perf_counter()
+        second, raw = analysis.get_gemini_analysis("  FED holds rates ", "Powell:  data dependent.", "Pushbullet")
+        hit_ms = (time.perf_counter() - t0) * 1000
+        assert calls["generate"] == 1 and raw == "cache" and second == first
+        assert hit_ms < 1.0, hit_ms
+
+        analysis.get_text_embedding("Fed holds rates Powell")
+        assert np.allclose(decode_embedding(analysis.get_text_embedding("fed holds rates powell")), [0.1, 0.2, 0.3])
+        assert calls["embed"] == 1
+
+        # Survives a restart via SQLite (shutdown flushes the async cache writes)
+        database.DB_WRITER.flush()
+        cache.clear_memory()
+        analysis.get_gemini_analysis("Fed holds rates", "Powell: data dependent.", "Bloomberg")
+        assert calls["generate"] == 1
+
+        # A new prompt version or an expired entry goes back to the API
+        with patch.object(analysis, 'PROMPT_VERSION', 'v2'):
+            analysis.get_gemini_analysis("Fed holds rates", "Powell: data dependent.", "Bloomberg")
+        assert calls["generate"] == 2
+        cache.clear_memory()
+        cache.ttl = 0
+        time.sleep(0.01)
+        analysis.get_gemini_analysis("Fed holds rates", "Powell: data dependent.", "Bloomberg")
+        assert calls["generate"] == 3
+
+    counters = metrics.COUNTERS
+    assert counters["llm_cache.analysis.hit"] >= 2 and counters["llm_cache.embedding.hit"] >= 1
+    print(f"✅ Repeat headline served from cache in {hit_ms:.3f}ms.")
+
+if __name__ == "__main__":
+    test_llm_cache_hits_and_expiry()
@@ -2,8 +2,11 @@ import sys
 import os
 import json
 import sqlite3
+import tempfile
+from unittest.mock import patch
+import database
 from monitor import get_macro_context
-from database import log_transaction, DB_FILE
+from database import log_transaction
 
 # Mock data for logging
 mock_task = {
@@ -14,7 +17,7 @@ mock_task = {
     "icon": None
 }
 
-def test_macro_pipeline():
+def run_macro_pipeline():
     print("🚀 Starting Macro Pipeline Test...")
     
     # 1. Test Data Fetching
@@ -46,7 +49,7 @@ def test_macro_pipeline():
     # 3. Verify Data in DB
     print("\n3️⃣ Verifying Database Entry...")
     try:
-        with sqlite3.connect(DB_FILE) as conn:
+        with sqlite3.connect(database.DB_FILE) as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("SELECT * FROM logs WHERE source_app='TestScript' ORDER BY id DESC LIMIT 1")
@@ -68,5 +71,11 @@ def test_macro_pipeline():
     except Exception as e:
         print(f"❌ Verification Failed: {e}")
 
+def test_macro_pipeline():
+    with tempfile.TemporaryDirectory() as tmp, patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')):
+        database.init_db()
+        run_macro_pipeline()
+        database.DB_WRITER.flush()
+
 if __name__ == "__main__":
     test_macro_pipeline()
@@ -0,0 +1,260 @@
+import sys
+import os
+import tempfile
+import time
+import threading
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+import market_data
+import providers
+import fetch_scheduler
+from indicators import compute_watchlist_indicators, update_indicator_states
+
+def make_history(tickers, periods=200, freq='15min'):
+    end = pd.Timestamp.now(tz='UTC').floor(freq)
+    index = pd.date_range(end=end, periods=periods, freq=freq)
+    rng = np.random.default_rng(1)
+    frames = {}
+    for ticker in tickers:
+        close = 100 + np.cumsum(rng.normal(0, 1, periods))
+        frames[ticker] = pd.DataFrame({
+            'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+            'Volume': rng.integers(1_000, 5_000, periods).astype(float),
+        }, index=index)
+    return pd.concat(frames, axis=1)
+
+def test_bar_store_delta_downloads():
+    print("🚀 Testing local bar store...")
+    tickers = ['SPY', 'QQQ']
+    history = make_history(tickers)
+    calls = []
+
+    def fake_download(symbols, interval, period=None, start=None, **kwargs):
+        symbols = symbols if isinstance(symbols, list) else [symbols]
+        calls.append({"tickers": symbols, "period": period, "start": start})
+        df = history[symbols]
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+        return df
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch('providers.yf.download', side_effect=fake_download):
+        database.init_db()
+
+        # 1. Cold store: full period download
+        df = market_data.get_bars(tickers, '15m', '5d')
+        assert calls[-1]["period"] == '5d' and calls[-1]["start"] is None
+        assert len(df) == len(history)
+        assert np.allclose(df[('SPY', 'Close')].to_numpy(), history[('SPY', 'Close')].to_numpy())
+
+        # 2. Warm store: only the last stored bar onward is requested
+        df = market_data.get_bars(tickers, '15m', '5d')
+        assert calls[-1]["start"] is not None and calls[-1]["period"] is None
+        assert pd.Timestamp(calls[-1]["start"]) == history.index[-1]
+        assert len(df) == len(history)
+
+        # 3. A new ticker joins cold while the others stay on delta
+        calls.clear()
+        history[('IWM', 'Close')] = history[('SPY', 'Close')]
+        for field in ['Open', 'High', 'Low', 'Volume']:
+            history[('IWM', field)] = history[('SPY', field)]
+        df = market_data.get_bars(tickers + ['IWM'], '15m', '5d')
+        assert {tuple(c["tickers"]) for c in calls} == {('IWM',), ('SPY', 'QQQ')}
+        assert 'IWM' in df.columns.get_level_values(0)
+    print("✅ Bar store serves history from disk and downloads only deltas.")
+
+def test_replay_provider_step_mode():
+    print("🚀 Testing replay provider...")
+    history = make_history(['SPY', 'BTC-USD'], periods=600)
+    epochs = providers.to_epoch(history.index)
+    rows = [(t, int(ts), *history[t].iloc[i].to_list())
+            for t in ['SPY', 'BTC-USD'] for i, ts in enumerate(epochs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'replay.csv')
+        providers.record_replay_file(path, rows, '15m')
+        replay = providers.ReplayProvider(path, speed=0, start_at=int(epochs[400]))
+
+        df = replay.download(['SPY'], '15m', period='5d')
+        assert df.index[-1] == history.index[400]
+        assert list(df.columns.get_level_values(0).unique()) == ['SPY']
+
+        # Step mode: sleeping jumps the replay clock, no wall-clock wait
+        replay.sleep(900 * 10)
+        df = replay.download(['SPY', 'BTC-USD'], '15m', start=history.index[405])
+        assert df.index[0] == history.index[405] and df.index[-1] == history.index[410]
+
+        # The bar store works unchanged on top of the replay clock
+        with patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')):
+            database.init_db()
+            providers.set_provider(replay)
+            try:
+                df = market_data.get_bars(['SPY', 'BTC-USD'], '15m', '5d')
+            finally:
+                providers.set_provider(None)
+        assert df.index[-1] == history.index[410]
+        assert np.isclose(df[('BTC-USD', 'Close')].iloc[-1], history[('BTC-USD', 'Close')].iloc[410])
+    print("✅ Replay provider serves recorded bars on its own clock.")
+
+def test_sessions_grouped_in_exchange_time():
+    print("🚀 Testing exchange-time day boundaries...")
+    # One winter session with pre/post-market bars, 04:00-20:00 ET (09:00 UTC to 01:00 UTC next day)
+    index = pd.date_range("2025-01-14 04:00", "2025-01-14 20:00", freq="15min", tz="America/New_York")
+    epochs = providers.to_epoch(index)
+    prev = [("SPY", int(epochs[0]) - 86400 + 15 * 60 * i, 90.0, 91.0, 89.0, 90.0, 1000.0) for i in range(10)]
+    rows = prev + [("SPY", int(ts), 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, 1000.0) for i, ts in enumerate(epochs)]
+
+    df = providers.rows_to_frame(rows, '15m', '1d')
+    assert len(df) == len(index) and df.index[-1] == pd.Timestamp("2025-01-14 20:00", tz="America/New_York")
+
+    # The 20:00 ET bar belongs to the 04:00 ET open's session, not to the next UTC day
+    expected = (df[('SPY', 'Close')].iloc[-1] - 100.0) / 100.0 * 100
+    results, _ = compute_watchlist_indicators(df, ['SPY'])
+    assert np.isclose(results['SPY']['daily_change'], expected)
+    streamed, _ = update_indicator_states({}, df, ['SPY'])
+    assert np.isclose(streamed['SPY']['daily_change'], expected)
+    print(f"✅ Pre/post-market bars stay in their session: daily change {expected:.3f}%.")
+
+class FlakyProvider(providers.MarketDataProvider):
+    """Each history() call takes 0.2s; 'BAD' always fails, 'FLAKY' fails once."""
+
+    def __init__(self, history):
+        self.history_df = history
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.sleeps = []
+
+    def download(self, tickers, interval, period=None, start=None, prepost=None):
+        return pd.DataFrame()  # Only the per-ticker fallback is exercised
+
+    def sleep(self, seconds):
+        # Retry backoff runs on the provider's clock (replay step mode never waits)
+        with self.lock:
+            self.sleeps.append(seconds)
+
+    def history(self, ticker, interval, period=None, start=None, prepost=None, timeout=None):
+        with self.lock:
+            self.calls[ticker] = self.calls.get(ticker, 0) + 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            attempt = self.calls[ticker]
+        time.sleep(0.2)
+        with self.lock:
+            self.active -= 1
+        if ticker == 'BAD' or (ticker == 'FLAKY' and attempt == 1):
+            raise RuntimeError("timeout")
+        return self.history_df[[ticker]]
+
+def test_concurrent_fallback_with_cooldown():
+    print("🚀 Testing concurrent fallback downloads...")
+    tickers = ['A', 'B', 'C', 'D', 'FLAKY', 'BAD']
+    provider = FlakyProvider(make_history(tickers))
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch.object(market_data, 'FALLBACK_BACKOFF', 0.01), \
+         patch.object(market_data, 'FALLBACK_FAILURE_THRESHOLD', 2):
+        database.init_db()
+        providers.set_provider(provider)
+        market_data.TICKER_FAILURES.clear()
+        try:
+            t0 = time.time()
+            received = market_data.fetch_missing(tickers, '15m', '5d')
+            elapsed = time.time() - t0
+
+            assert received == {'A', 'B', 'C', 'D', 'FLAKY'}
+            assert provider.calls['FLAKY'] == 2 and provider.calls['BAD'] == 3
+            assert len(provider.sleeps) == 3  # One backoff for FLAKY, two for BAD
+            assert provider.max_active > 1
+            assert elapsed < 6 * 0.2  # Sequential would take 1.2s+ before retries
+
+            # Second failing cycle parks BAD; the third cycle skips it entirely
+            market_data.fetch_missing(['BAD'], '15m', '5d')
+            calls = provider.calls['BAD']
+            assert market_data.in_cooldown('BAD')
+            assert market_data.fetch_missing(['BAD'], '15m', '5d') == set()
+            assert provider.calls['BAD'] == calls
+        finally:
+            providers.set_provider(None)
+            market_data.TICKER_FAILURES.clear()
+    print(f"✅ Fallback fetched concurrently in {elapsed:.2f}s and parked the failing ticker.")
+
+class CountingProvider(providers.MarketDataProvider):
+    """Slow batch downloads that record which tickers each call asked for."""
+    min_request_gap = 0.0
+
+    def __init__(self, history):
+        self.history_df = history
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def download(self, tickers, interval, period=None, start=None, prepost=None):
+        with self.lock:
+            self.calls.append(list(tickers))
+        time.sleep(0.2)
+        df = self.history_df[tickers]
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+        return df
+
+def test_scheduler_coalesces_overlapping_requests():
+    print("🚀 Testing fetch scheduler...")
+    history = make_history(['SPY', 'QQQ', 'NVDA', 'AAPL'])
+    provider = CountingProvider(history)
+    scheduler = fetch_scheduler.FetchScheduler()
+    scheduler.register("vwap", ['SPY', 'QQQ', 'NVDA'], '15m', '5d')
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')):
+        database.init_db()
+        providers.set_provider(provider)
+        try:
+            # Monitor cycle and two confluence lookups at the same time: one batch call
+            results = {}
+            requests = {"vwap": ['SPY', 'QQQ', 'NVDA'], "nvda": ['NVDA'], "spy": ['SPY', 'QQQ']}
+            threads = [threading.Thread(target=lambda k=k, t=t: results.__setitem__(k, scheduler.get(t, '15m', '5d')))
+                       for k, t in requests.items()]
+            for th in threads: th.start()
+            for th in threads: th.join()
+
+            assert len(provider.calls) == 1
+            assert sorted(provider.calls[0]) == ['NVDA', 'QQQ', 'SPY']
+            assert list(results["nvda"].columns.get_level_values(0).unique()) == ['NVDA']
+            assert len(results["vwap"]) == len(history)
+
+            # Within max_age: served from the store, no download
+            scheduler.get(['NVDA'], '15m', '5d', max_age=60)
+            assert len(provider.calls) == 1
+
+            # A ticker nobody has fetched yet triggers a refresh of the union
+            scheduler.get(['AAPL'], '15m', '5d', max_age=60)
+            assert len(provider.calls) >= 2 and 'AAPL' in sum(provider.calls[1:], [])
+
+            # Staleness follows the provider's clock (replay), not the wall clock
+            calls = len(provider.calls)
+            provider.now = lambda: time.time() + 120
+            scheduler.get(['NVDA'], '15m', '5d', max_age=60)
+            assert len(provider.calls) == calls + 1
+
+            # A ticker that came back empty isn't marked fresh: the next get() retries it
+            scheduler.get(['MISSING'], '15m', '5d', max_age=60)
+            scheduler.get(['MISSING'], '15m', '5d', max_age=60)
+            assert sum('MISSING' in c for c in provider.calls) == 2
+            assert scheduler.stats["failed_tickers"] >= 2
+        finally:
+            providers.set_provider(None)
+    print(f"✅ Scheduler stats: {scheduler.stats}")
+
+if __name__ == "__main__":
+    test_bar_store_delta_downloads()
+    test_replay_provider_step_mode()
+    test_sessions_grouped_in_exchange_time()
+    test_concurrent_fallback_with_cooldown()
+    test_scheduler_coalesces_overlapping_requests()
@@ -0,0 +1,225 @@
+import sys
+import os
+import time
+import queue
+import threading
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import bot_logic
+import database
+import metrics
+from dedup import NearDuplicateIndex
+
+def test_parallel_enrichment_pool():
+    print("🚀 Testing news enrichment pool...")
+    lock = threading.Lock()
+    state = {"active": 0, "max_active": 0}
+    logged = []
+
+    def slow_analysis(title, body, source_app):
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        time.sleep(0.3)
+        with lock:
+            state["active"] -= 1
+        return {"ticker": "SPY", "impact_score": 1}, "raw"
+
+    def slow_batch(items):
+        slow_analysis(None, None, None)
+        return {str(i): {"ticker": "SPY", "impact_score": 1} for i, *_ in items}, "raw"
+
+    def record(task, analysis, **kwargs):
+        with lock:
+            logged.append((task["title"], task["body"]))
+
+    news_queue = queue.Queue()
+    # 6 independent headlines plus 3 revisions of one story that must stay in order
+    for i in range(6):
+        news_queue.put({"title": f"Story {i}", "body": "", "source": "PoolTest", "received_at": time.time()})
+    for rev in range(3):
+        news_queue.put({"title": "Developing", "body": f"rev {rev}", "source": "PoolTest", "received_at": time.time()})
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch('bot_logic.get_gemini_analysis', side_effect=slow_analysis), \
+         patch('bot_logic.get_gemini_analysis_batch', side_effect=slow_batch), \
+         patch('bot_logic.get_text_embedding', return_value=None), \
+         patch('bot_logic.log_news_event', side_effect=record), \
+         patch.object(bot_logic, 'LLM_SLOTS', threading.BoundedSemaphore(3)), \
+         patch.object(bot_logic, 'GEMINI_BATCHER', bot_logic.GeminiBatcher(max_items=2, max_wait=0.2, max_inflight=3)):
+        database.init_db()
+        t0 = time.time()
+        threading.Thread(target=bot_logic.process_news_queue, args=(4, news_queue), daemon=True).start()
+        deadline = time.time() + 5
+        while len(logged) < 9 and time.time() < deadline:
+            time.sleep(0.05)
+        elapsed = time.time() - t0
+        end_to_end = metrics.snapshot()["latency"]["news.end_to_end"]
+
+    assert len(logged) == 9
+    assert state["max_active"] <= 3  # Bounded by the LLM semaphore, not the worker count
+    assert elapsed < 9 * 0.3         # Serial processing would take 2.7s
+    assert [b for t, b in logged if t == "Developing"] == ["rev 0", "rev 1", "rev 2"]
+    assert end_to_end["count"] >= 9
+    print(f"✅ 9 items enriched in {elapsed:.2f}s with at most {state['max_active']} Gemini calls in flight.")
+
+def test_concurrent_stages_and_partial_logging():
+    print("🚀 Testing concurrent enrichment stages...")
+
+    def slow_embedding(text):
+        time.sleep(0.3)
+        return "[0.1, 0.2]"
+
+    def slow_analysis(title, body, source_app):
+        time.sleep(1.0 if title == "Stuck" else 0.3)
+        return {"ticker": "SPY", "impact_score": 1}, "raw"
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch('bot_logic.get_gemini_analysis', side_effect=slow_analysis), \
+         patch('bot_logic.get_text_embedding', side_effect=slow_embedding), \
+         patch.object(bot_logic, 'ANALYSIS_TIMEOUT', 0.6), \
+         patch.object(bot_logic.GEMINI_BATCHER, 'max_items', 1):
+        database.init_db()
+
+        # Both 0.3s stages overlap
+        t0 = time.time()
+        bot_logic.process_news_item({"title": "Fast", "body": "", "source": "StageTest"})
+        elapsed = time.time() - t0
+        assert elapsed < 0.55, elapsed
+
+        # Gemini times out: the item is still logged, marked PARTIAL with the reason
+        bot_logic.process_news_item({"title": "Stuck", "body": "", "source": "StageTest"})
+        with sqlite3.connect(database.DB_FILE) as conn:
+            rows = dict(conn.execute("SELECT title, status || '|' || IFNULL(error_msg, '') FROM logs").fetchall())
+    assert rows["Fast"] == "SUCCESS|"
+    assert rows["Stuck"] == "PARTIAL|analysis: timeout"
+    print(f"✅ Stages ran concurrently ({elapsed:.2f}s) and the timed-out item was logged as PARTIAL.")
+
+def test_micro_batched_analysis():
+    print("🚀 Testing micro-batched Gemini calls...")
+    batch_calls, single_calls = [], []
+
+    def fake_batch(items):
+        batch_calls.append([title for _, title, _, _ in items])
+        # The model "forgets" one item: it must be retried on its own
+        return {str(i): {"headline": title, "impact_score": 5} for i, title, _, _ in items if title != "Dropped"}, "raw"
+
+    def fake_single(title, body, source_app):
+        single_calls.append(title)
+        time.sleep(0.1)
+        return {"headline": title, "impact_score": 5}, "raw"
+
+    titles = ["CPI hot", "Yields spike", "NVDA halts", "Dropped", "Fed speaker"]
+    results, took = {}, {}
+
+    def analyze(title):
+        start = time.time()
+        results[title] = bot_logic._analyze(title, "", "Burst")
+        took[title] = time.time() - start
+
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch('bot_logic.get_gemini_analysis_batch', side_effect=fake_batch), \
+         patch('bot_logic.get_gemini_analysis', side_effect=fake_single), \
+         patch.object(bot_logic, 'GEMINI_BATCHER', bot_logic.GeminiBatcher(max_items=8, max_wait=0.5)):
+        database.init_db()
+        # Nothing in flight: the first headline is sent at once, without waiting out max_wait
+        threads = [threading.Thread(target=analyze, args=(titles[0],))]
+        threads[0].start()
+        time.sleep(0.03)
+        # The rest arrive during its round trip and share one request
+        threads += [threading.Thread(target=analyze, args=(t,)) for t in titles[1:]]
+        for th in threads[1:]: th.start()
+        for th in threads: th.join()
+
+    assert took["CPI hot"] < 0.3
+    assert len(batch_calls) == 1 and sorted(batch_calls[0]) == sorted(titles[1:])
+    assert single_calls == ["CPI hot", "Dropped"]
+    assert all(results[t][0]["headline"] == t for t in titles)
+    print(f"✅ {len(titles)} headlines took 1 single + 1 batch request + 1 fallback.")
+
+def test_near_duplicates_reuse_cluster_analysis():
+    print("🚀 Testing near-duplicate detection...")
+    analysed = []
+
+    def fake_analysis(title, body, source_app):
+        analysed.append(title)
+        time.sleep(0.2)
+        return {"tickers": ["SPY"], "impact_score": 9}, "raw"
+
+    stories = [
+        ("Bloomberg", "US CPI rises 0.3% in May, in line with forecasts"),
+        ("Reuters", "US CPI rose 0.3% in May, in line with forecasts - Reuters"),
+        ("Broker", "NVIDIA shares halted pending news"),
+    ]
+    alerts = []
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch('bot_logic.get_gemini_analysis', side_effect=fake_analysis), \
+         patch('bot_logic.get_text_embedding', return_value=None), \
+         patch('bot_logic.send_news_alert', side_effect=lambda a, t, s, **kw: alerts.append(t)), \
+         patch.object(bot_logic, 'STORY_INDEX', NearDuplicateIndex()), \
+         patch.object(bot_logic.GEMINI_BATCHER, 'max_items', 1):
+        database.init_db()
+        # The Reuters copy arrives while Bloomberg's analysis is still in flight
+        threads = [threading.Thread(target=bot_logic.process_news_item, args=({"title": t, "body": "", "source": s},))
+                   for s, t in stories]
+        for th in threads:
+            th.start()
+            time.sleep(0.05)
+        for th in threads: th.join()
+        with sqlite3.connect(database.DB_FILE) as conn:
+            rows = {r[0]: r[1:] for r in conn.execute("SELECT source_app, id, cluster_id, duplicate_of, impact_score FROM logs")}
+
+    assert sorted(analysed) == sorted([stories[0][1], stories[2][1]])
+    assert rows["Reuters"][1] == rows["Bloomberg"][1] and rows["Reuters"][2] == rows["Bloomberg"][0]
+    assert rows["Reuters"][3] == 9 and rows["Broker"][1] != rows["Bloomberg"][1]
+    assert len(alerts) == 2  # One alert per story, not per copy
+    print("✅ Reworded copy linked to its cluster without a second LLM call.")
+
+def test_near_duplicate_waiters_leave_the_pool_free():
+    print("🚀 Testing near-duplicate waiters under a small pool...")
+
+    def fake_analysis(title, body, source_app):
+        time.sleep(0.9 if "CPI" in title else 0.3)
+        return {"tickers": ["SPY"], "impact_score": 1}, "raw"
+
+    stories = [("Bloomberg", "US CPI rises 0.3% in May, in line with forecasts"),
+               ("Reuters", "US CPI rose 0.3% in May, in line with forecasts - Reuters"),
+               ("Wire", "US CPI rises 0.3% in May, in line with forecasts: wire"),
+               ("Broker", "NVIDIA shares halted pending news")]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch('bot_logic.get_gemini_analysis', side_effect=fake_analysis), \
+         patch('bot_logic.get_text_embedding', return_value=None), \
+         patch('bot_logic.send_news_alert'), \
+         patch.object(bot_logic, 'ENRICH_POOL', ThreadPoolExecutor(max_workers=2)), \
+         patch.object(bot_logic, 'ANALYSIS_TIMEOUT', 1.0), \
+         patch.object(bot_logic, 'STORY_INDEX', NearDuplicateIndex()), \
+         patch.object(bot_logic.GEMINI_BATCHER, 'max_items', 1):
+        database.init_db()
+        threads = [threading.Thread(target=lambda s=s, t=t: results.__setitem__(
+                       s, bot_logic.process_news_item({"title": t, "body": "", "source": s})))
+                   for s, t in stories]
+        for th in threads:
+            th.start()
+            time.sleep(0.03)
+        for th in threads: th.join()
+
+    # Two copies wait on the slow CPI story, yet the unrelated headline still gets a pool thread in time
+    assert all(results[s][0] is not None for s, _ in stories), results
+    print("✅ Near-duplicates wait outside the enrichment pool.")
+
+if __name__ == "__main__":
+    test_parallel_enrichment_pool()
+    test_concurrent_stages_and_partial_logging()
+    test_micro_batched_analysis()
+    test_near_duplicates_reuse_cluster_analysis()
+    test_near_duplicate_waiters_leave_the_pool_free()
@@ -0,0 +1,75 @@
+import sys
+import os
+import time
+import queue
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import metrics
+from news_queue import PriorityNewsQueue, score_news_item
+
+def item(title, source="SomeApp", body=""):
+    return {"title": title, "body": body, "source": source, "received_at": time.time()}
+
+def test_priority_scoring():
+    print("🚀 Testing news priority scoring...")
+    chatter = score_news_item(item("Your order has shipped"))
+    fed = score_news_item(item("BREAKING: Fed cuts rates, Powell says more to come", "Bloomberg"))
+    ticker = score_news_item(item("SMH and XLK rally into the close"))
+    stale = score_news_item({**item("Fed minutes released", "Bloomberg"), "received_at": time.time() - 3600})
+    assert fed > ticker > chatter
+    assert stale < score_news_item(item("Fed minutes released", "Bloomberg"))
+    print(f"✅ chatter={chatter} ticker={ticker} fed={fed} stale={stale}")
+
+def test_priority_order_and_shedding():
+    print("🚀 Testing priority news queue...")
+    q = PriorityNewsQueue(capacity=5, policy="drop")
+    for i in range(3):
+        q.put(item(f"Promo {i}"))
+    q.put(item("CPI hot", "Reuters"))
+    q.put(item("Promo 3"))
+    # Full: a headline pushes out the oldest low-priority item
+    q.put(item("FOMC statement: the Fed holds", "Bloomberg"))
+    assert q.qsize() == 5
+    order = [q.get()["title"] for _ in range(5)]
+    assert order[:2] == ["FOMC statement: the Fed holds", "CPI hot"]
+    assert order[2:] == ["Promo 1", "Promo 2", "Promo 3"]  # FIFO among equals, Promo 0 shed
+    for _ in range(5): q.task_done()
+    q.join()
+
+    # An item that ranks below everything queued is the one dropped
+    q = PriorityNewsQueue(capacity=2, policy="drop")
+    q.put(item("Fed speaker", "Bloomberg"))
+    q.put(item("CPI print", "Reuters"))
+    assert q.put(item("Promo")) is False and q.qsize() == 2
+
+    try:
+        PriorityNewsQueue().get(timeout=0.05)
+        assert False, "expected queue.Empty"
+    except queue.Empty:
+        pass
+    print("✅ High priority first, FIFO ties, lowest shed when full.")
+
+def test_summarize_policy():
+    print("🚀 Testing summarize shedding...")
+    q = PriorityNewsQueue(capacity=4, policy="summarize")
+    for i in range(3):
+        q.put(item(f"Game update {i}", "GameApp"))
+    q.put(item("Powell testimony", "Bloomberg"))
+    q.put(item("Payrolls beat", "Reuters"))
+    titles = [q.get()["title"] for _ in range(q.qsize())]
+    assert titles[:2] == ["Powell testimony", "Payrolls beat"]
+    assert titles[2] == "3 updates from GameApp"
+    for _ in titles: q.task_done()
+    done = threading.Event()
+    threading.Thread(target=lambda: (q.join(), done.set()), daemon=True).start()
+    assert done.wait(1)  # Folded items don't leave join() hanging
+
+    counters = metrics.COUNTERS
+    assert counters.get("news.shed.summarized", 0) >= 3 and counters.get("news.shed.dropped", 0) >= 1
+    print("✅ Low-priority items folded into one digest.")
+
+if __name__ == "__main__":
+    test_priority_scoring()
+    test_priority_order_and_shedding()
+    test_summarize_policy()
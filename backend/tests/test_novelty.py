@@ -0,0 +1,37 @@
+import sys
+import os
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import novelty
+
+def test_local_novelty_score():
+    print("🚀 Testing local novelty...")
+    rng = np.random.default_rng(3)
+    tracker = novelty.NoveltyTracker(window=3600, half_life=600, baseline_sim=0.5)
+    cpi = rng.normal(size=64)
+    t0 = 1_700_000_000
+
+    # Empty window: everything is new
+    assert tracker.score_and_add(cpi, t0) == 10.0
+
+    # The same story a minute later is old news; an unrelated one is not
+    reworded = cpi + 0.1 * rng.normal(size=64)
+    assert tracker.score(reworded, t0 + 60) < 3
+    assert tracker.score(rng.normal(size=64), t0 + 60) >= 9
+
+    # Deterministic, and decays with age: the same repeat scores higher later on
+    assert tracker.score(reworded, t0 + 60) == tracker.score(reworded, t0 + 60)
+    assert tracker.score(reworded, t0 + 1200) > tracker.score(reworded, t0 + 60)
+
+    # Past the window the story is forgotten
+    assert tracker.score(reworded, t0 + 7200) == 10.0 and len(tracker) == 0
+
+    # Window compaction keeps the live rows
+    for i in range(600):
+        tracker.add(rng.normal(size=64), t0 + 8000 + i * 10)
+    assert tracker.score(rng.normal(size=64), t0 + 8000 + 6000) is not None and len(tracker) <= 600
+    print("✅ Novelty is instant, deterministic and time-decayed.")
+
+if __name__ == "__main__":
+    test_local_novelty_score()
@@ -0,0 +1,42 @@
+import sys
+import os
+import datetime
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import monitor
+
+def epoch(y, m, d, hour_utc, minute=0):
+    return datetime.datetime(y, m, d, hour_utc, minute, tzinfo=datetime.timezone.utc).timestamp()
+
+def test_adaptive_polling_cadence():
+    print("🚀 Testing session-aware polling...")
+    tickers = ['SPY', 'XLK', '^VIX', 'BTC-USD', 'ETH-USD']
+    monitor.LAST_POLL.clear()
+    try:
+        # Wednesday 9:30 ET (14:30 UTC): everything is due on the first pass
+        t = epoch(2026, 3, 4, 14, 30)
+        assert monitor.get_poll_phase(t) == "MARKET_OPEN"
+        assert monitor.due_tickers(t, tickers) == tickers
+
+        # Two minutes later only the fast equity/index cadence is due, crypto stays steady
+        assert monitor.due_tickers(t + 60, tickers) == []
+        assert monitor.due_tickers(t + 120, tickers) == ['SPY', 'XLK', '^VIX']
+        assert monitor.due_tickers(t + 300, tickers) == ['SPY', 'XLK', '^VIX', 'BTC-USD', 'ETH-USD']
+
+        # Overnight: equities are not polled at all, crypto keeps going
+        night = epoch(2026, 3, 5, 3, 0)
+        assert monitor.get_poll_phase(night) == "OVN_FUTURES"
+        assert monitor.due_tickers(night, tickers) == ['^VIX', 'BTC-USD', 'ETH-USD']
+        assert monitor.due_tickers(night + 600, tickers) == ['BTC-USD', 'ETH-USD']
+
+        # Weekend: crypto only, and the loop never sleeps past POLL_MAX_SLEEP
+        saturday = epoch(2026, 3, 7, 18, 0)
+        assert monitor.get_poll_phase(saturday) == "WEEKEND"
+        assert monitor.due_tickers(saturday, tickers) == ['BTC-USD', 'ETH-USD']
+        assert 1 <= monitor.seconds_until_next_poll(saturday, tickers) <= monitor.POLL_MAX_SLEEP
+    finally:
+        monitor.LAST_POLL.clear()
+    print("✅ Poll cadence follows session phase and asset class.")
+
+if __name__ == "__main__":
+    test_adaptive_polling_cadence()
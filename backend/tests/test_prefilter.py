@@ -0,0 +1,69 @@
+import sys
+import os
+import random
+from unittest.mock import patch
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import prefilter
+from prefilter import PreFilter
+
+def item(title, source, body=""):
+    return {"title": title, "body": body, "source": source, "package": None}
+
+def test_prefilter_rules():
+    print("🚀 Testing pre-filter rules...")
+    pf = PreFilter(enabled=True)
+    assert pf.classify(item("Anything at all", "Bloomberg")) == ("analyze", "allow_source")
+    assert pf.classify(item("Your order has shipped", "Amazon Shopping")) == ("skip", "deny_source")
+    assert pf.classify(item("Weekend deal", "ShopApp", "Use promo code SAVE20 today")) == ("skip", "noise_pattern")
+    assert pf.classify(item("SPY breaks out, promo code inside", "ShopApp")) == ("analyze", "ticker_symbol")
+    # Aliases and keywords don't override the deny list or noise patterns
+    assert pf.classify(item("Your Amazon package was delivered", "Amazon Shopping")) == ("skip", "deny_source")
+    assert pf.classify(item("Apple Music", "Apple", "Get 3 months free with promo code MUSIC")) == ("skip", "noise_pattern")
+    assert pf.classify(item("Sam", "WhatsApp", "I fed the dog, back soon")) == ("analyze", "no_model")
+    assert pf.classify(item("Markets", "NewsApp", "Nvidia shares jump")) == ("analyze", "market_keyword")
+    assert pf.classify(item("Test Title", "TestApp", "Test Body")) == ("analyze", "no_model")
+    report = pf.report()
+    assert report["decisions"] == {"analyze": 5, "skip": 4} and report["hit_rates"]["skip"] == 0.444
+    print("✅ Allow/deny lists and patterns applied in order.")
+
+def test_prefilter_model():
+    print("🚀 Testing pre-filter model...")
+    rng = random.Random(7)
+    relevant = ["shares surge after analyst upgrade", "company misses revenue estimates", "chipmaker cuts outlook",
+                "oil prices jump on supply fears", "bank stocks slide as yields rise"]
+    noise = ["your energy is full, come back and play", "new level unlocked", "daily reward ready",
+             "friend request from alex", "weekly screen time report"]
+    rows = []
+    for _ in range(300):
+        if rng.random() < 0.3:
+            rows.append((rng.choice(relevant), "", "Benzinga", "com.benzinga", rng.randint(6, 9)))
+        else:
+            rows.append((rng.choice(noise), "", rng.choice(["GameApp", "Social"]), None, rng.randint(0, 3)))
+
+    pf = PreFilter(enabled=True)
+    with patch.object(prefilter, 'load_labelled_logs', return_value=rows):
+        assert pf.train() is not None
+    assert pf.skip_below <= prefilter.PREFILTER_SKIP_BELOW
+    assert pf.training["holdout_missed_relevant"] <= prefilter.PREFILTER_MAX_MISSED
+
+    decision, reason = pf.classify(item("daily reward ready", "GameApp"))
+    assert reason == "model" and decision in ("skip", "defer")
+    assert pf.classify(item("shares surge after analyst call", "Benzinga")) == ("analyze", "model")
+    print(f"✅ Model trained: {pf.report()['model']}")
+
+    # Too little history: the model stays off and items are analysed
+    pf = PreFilter(enabled=True)
+    with patch.object(prefilter, 'load_labelled_logs', return_value=rows[:10]):
+        assert pf.train() is None
+    assert pf.classify(item("daily reward ready", "GameApp")) == ("analyze", "no_model")
+
+    # Only one class (every logged item was relevant): nothing to learn from
+    only_relevant = [r for r in rows if r[4] >= 6] * 3
+    assert len(only_relevant) >= prefilter.PREFILTER_MIN_TRAIN_ROWS
+    with patch.object(prefilter, 'load_labelled_logs', return_value=only_relevant):
+        assert pf.train() is None
+
+if __name__ == "__main__":
+    test_prefilter_rules()
+    test_prefilter_model()
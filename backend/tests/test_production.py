@@ -1,4 +1,5 @@
 import sqlite3
+import tempfile
 import time
 import threading
 import queue
@@ -12,9 +13,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import monitor
 import bot_logic
-from database import init_db, DB_FILE
+import database
+from database import init_db, DB_WRITER
 
-def test_production_refactor():
+def run_production_refactor():
     print("🚀 Starting Production Verification...")
     
     # 1. Initialize DB (New Schema)
@@ -57,9 +59,11 @@ def test_production_refactor():
             {"ticker": "QQQ", "open": 400, "high": 405, "low": 395, "close": 402, "volume": 500000, "vwap": 401, "rsi": 55, "rvol": 1.1}
         ]
         log_market_data(timestamp, data)
+        # Market data is written asynchronously by the DB writer thread
+        DB_WRITER.flush()
         
     # Verify DB
-    with sqlite3.connect(DB_FILE) as conn:
+    with sqlite3.connect(database.DB_FILE) as conn:
         c = conn.cursor()
         c.execute("SELECT * FROM market_data WHERE timestamp=?", (timestamp,))
         rows = c.fetchall()
@@ -93,7 +97,7 @@ def test_production_refactor():
             time.sleep(2)
             
     # Verify DB
-    with sqlite3.connect(DB_FILE) as conn:
+    with sqlite3.connect(database.DB_FILE) as conn:
         c = conn.cursor()
         c.execute("SELECT * FROM news_events WHERE title='Prod Test News'")
         row = c.fetchone()
@@ -102,5 +106,14 @@ def test_production_refactor():
         else:
             print("❌ News Event Logging Failed.")
 
+def test_production_refactor():
+    # The worker would otherwise start the inbox pump, which outlives the temp database
+    with tempfile.TemporaryDirectory() as tmp, \
+         patch.object(database, 'DB_FILE', os.path.join(tmp, 'test.db')), \
+         patch.object(bot_logic.INBOX, 'start_pump'):
+        run_production_refactor()
+        bot_logic.INBOX.flush()
+        DB_WRITER.flush()
+
 if __name__ == "__main__":
     test_production_refactor()
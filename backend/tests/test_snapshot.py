@@ -0,0 +1,41 @@
+import sys
+import os
+import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import monitor
+
+def test_snapshot_publish():
+    print("🚀 Testing market snapshots...")
+    saved = monitor.SNAPSHOT
+    try:
+        first = monitor.publish_snapshot(vwap_updates={
+            "SPY": {"ticker": "SPY", "price": 500.0, "daily_change": 1.2},
+            "^VIX": {"ticker": "^VIX", "price": 14.5, "daily_change": -3.0},
+        })
+        second = monitor.publish_snapshot(macro_updates={"price_spy": 500.0})
+
+        # Each publish is a new version; the macro update keeps the VWAP data
+        assert second.version == first.version + 1
+        assert second.vwap is not first.vwap and dict(second.vwap["SPY"]) == dict(first.vwap["SPY"])
+        assert first.macro == {} and second.macro["price_spy"] == 500.0
+
+        # Payloads are serialized once at publish time
+        assert json.loads(second.signals_json)[0]["ticker"] == "SPY"
+        assert monitor.get_market_regime_from_cache() == (14.5, json.dumps({"SPY": 1.2, "^VIX": -3.0}))
+
+        # Readers can't mutate what they were handed
+        for mutate in (lambda: setattr(second, "version", 0),
+                       lambda: second.vwap.__setitem__("QQQ", {}),
+                       lambda: second.vwap["SPY"].__setitem__("price", 0)):
+            try:
+                mutate()
+                assert False, "snapshot was mutated"
+            except (AttributeError, TypeError):
+                pass
+    finally:
+        monitor.SNAPSHOT = saved
+    print("✅ Snapshots are versioned, pre-serialized and read-only.")
+
+if __name__ == "__main__":
+    test_snapshot_publish()
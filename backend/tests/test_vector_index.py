@@ -0,0 +1,63 @@
+import sys
+import os
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import vector_index
+
+def make_corpus(n, dim=64, topics=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim))
+    labels = rng.integers(0, topics, n)
+    return (centers[labels] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32), labels
+
+def test_brute_force_search():
+    print("🚀 Testing vector index (brute force)...")
+    vectors, labels = make_corpus(5000)
+    index = vector_index.VectorIndex(ivf_threshold=10**9)
+    index.add_many(np.arange(1, 4001), vectors[:4000])
+    for i in range(4000, 5000):  # Incremental adds, as log_news_event rows arrive
+        index.add(i + 1, vectors[i])
+    assert len(index) == 5000
+    index.add_many(np.array([7, 7, 5001]), vectors[[6, 6, 0]])  # Only new ids are appended
+    assert len(index) == 5001
+
+    hits = index.search(index.vector(42), k=5, exclude_id=42)
+    assert len(hits) == 5 and all(h[0] != 42 for h in hits)
+    assert all(labels[h[0] - 1] == labels[41] for h in hits)
+    assert hits[0][1] >= hits[-1][1]
+
+    # Exact: matches a full sort of the cosine scores
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(unit @ unit[41]))[1:6] + 1
+    assert [h[0] for h in hits] == list(expected)
+    print("✅ Brute-force top-k matches exact cosine ranking.")
+
+def test_ivf_mode_recall_and_speed():
+    print("🚀 Testing vector index (IVF)...")
+    vectors, labels = make_corpus(20000, dim=128)
+    brute = vector_index.VectorIndex(ivf_threshold=10**9)
+    ivf = vector_index.VectorIndex(ivf_threshold=10000, nprobe=8)
+    ids = np.arange(1, 20001)
+    brute.add_many(ids, vectors)
+    ivf.add_many(ids[:15000], vectors[:15000])
+    build = ivf._ivf_build  # k-means runs off the writer's path
+    ivf.add_many(ids[15000:], vectors[15000:])  # Tail rows after the build stay searchable
+    if build is not None: build.join()
+    assert ivf._ivf is not None and ivf._ivf[2] == 15000
+    ivf.add_many(ids[:100], vectors[:100])  # Startup load overlapping live adds: no duplicate rows
+    assert len(ivf) == 20000
+
+    recall, t0 = [], time.perf_counter()
+    for qid in range(1, 20001, 400):
+        exact = {h[0] for h in brute.search(brute.vector(qid), k=10)}
+        approx = {h[0] for h in ivf.search(ivf.vector(qid), k=10)}
+        recall.append(len(exact & approx) / 10)
+    per_query_ms = (time.perf_counter() - t0) / 50 * 1000
+    assert np.mean(recall) > 0.9, np.mean(recall)
+    print(f"✅ IVF recall@10 {np.mean(recall):.2f}, {per_query_ms:.2f}ms per query pair.")
+
+if __name__ == "__main__":
+    test_brute_force_search()
+    test_ivf_mode_recall_and_speed()
@@ -0,0 +1,154 @@
+import threading
+import time
+import numpy as np
+from config import VECTOR_IVF_THRESHOLD, VECTOR_IVF_NPROBE
+from database import load_log_embeddings
+from embeddings import decode_embedding
+import metrics
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def _top_k(scores, k):
+    if len(scores) <= k: return np.argsort(-scores)
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part])]
+
+class VectorIndex:
+    """
+    In-memory cosine index over logs embeddings: one float32 matrix of unit rows.
+    Writers append under a lock; readers use the current (matrix, ids, n) view without
+    locking. Past ivf_threshold rows an IVF layer (spherical k-means lists) is built on a
+    background thread and swapped in when ready; searches then only scan the nprobe
+    closest lists. Ids already indexed are ignored, so load() may overlap live adds.
+    """
+
+    def __init__(self, ivf_threshold=VECTOR_IVF_THRESHOLD, nprobe=VECTOR_IVF_NPROBE):
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._view = (np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64), 0)
+        self._row_of = {}       # log id -> row
+        self._ivf = None        # (centroids, [row arrays], rows covered)
+        self._ivf_build = None  # Background build thread, while one is running
+
+    def __len__(self):
+        return self._view[2]
+
+    def load(self, min_id=0):
+        """Bulk-loads stored embeddings (startup)."""
+        t0 = time.time()
+        ids, matrix = load_log_embeddings(min_id)
+        if len(ids): self.add_many(ids, matrix)
+        print(f"🧭 Vector index loaded {len(ids)} embeddings in {time.time() - t0:.2f}s")
+
+    def add(self, log_id, vector):
+        if log_id is None or vector is None: return
+        self.add_many(np.array([log_id], dtype=np.int64), np.asarray(vector, dtype=np.float32)[None, :])
+
+    def add_many(self, ids, matrix):
+        ids = np.asarray(ids, dtype=np.int64)
+        matrix = _normalize(np.asarray(matrix, dtype=np.float32))
+        with self._lock:
+            keep = [i for i, log_id in enumerate(ids.tolist()) if log_id not in self._row_of]
+            if len(keep) < len(ids):
+                # Already indexed (startup load racing live logging) or repeated within the batch
+                _, first = np.unique(ids[keep], return_index=True)
+                keep = [keep[i] for i in sorted(first)]
+                ids, matrix = ids[keep], matrix[keep]
+                if not len(ids): return
+            current, current_ids, n = self._view
+            if n and matrix.shape[1] != current.shape[1]:
+                print(f"⚠️ Vector index: skipping {len(ids)} vectors of dim {matrix.shape[1]} (index is {current.shape[1]})")
+                return
+            if n + len(ids) > len(current):
+                # Amortised growth: readers keep using the old arrays until the swap
+                capacity = max(1024, 2 * (n + len(ids)))
+                grown = np.zeros((capacity, matrix.shape[1]), dtype=np.float32)
+                grown_ids = np.zeros(capacity, dtype=np.int64)
+                if n: grown[:n], grown_ids[:n] = current[:n], current_ids[:n]
+                current, current_ids = grown, grown_ids
+            current[n:n + len(ids)] = matrix
+            current_ids[n:n + len(ids)] = ids
+            for offset, log_id in enumerate(ids):
+                self._row_of[int(log_id)] = n + offset
+            self._view = (current, current_ids, n + len(ids))
+            self._maybe_update_ivf()
+
+    def vector(self, log_id):
+        row = self._row_of.get(int(log_id))
+        return None if row is None else self._view[0][row]
+
+    def search(self, query, k=10, exclude_id=None):
+        """Top-k [(log id, cosine similarity)] for a query vector."""
+        start = time.perf_counter()
+        matrix, ids, n = self._view
+        if n == 0 or query is None: return []
+        q = _normalize(np.asarray(query, dtype=np.float32))
+        if q.shape[0] != matrix.shape[1]: return []
+
+        rows = self._candidate_rows(q, n)
+        scores = matrix[:n] @ q if rows is None else matrix[rows] @ q
+        order = _top_k(scores, k + 1)
+        hits = []
+        for i in order:
+            row = i if rows is None else rows[i]
+            if exclude_id is not None and ids[row] == exclude_id: continue
+            hits.append((int(ids[row]), float(scores[i])))
+        metrics.observe("vector_index.search", time.perf_counter() - start)
+        return hits[:k]
+
+    # --- IVF ---
+
+    def _candidate_rows(self, q, n):
+        ivf = self._ivf
+        if ivf is None: return None
+        centroids, lists, covered = ivf
+        probe = _top_k(centroids @ q, self.nprobe)
+        tail = np.arange(covered, n)  # Rows added since the last (re)assignment are always scanned
+        return np.concatenate([lists[c] for c in probe] + [tail])
+
+    def _maybe_update_ivf(self):
+        # Called with the lock held
+        matrix, _, n = self._view
+        if n < self.ivf_threshold or self._ivf_build is not None: return
+        if self._ivf is not None and n < 2 * self._ivf[2]: return
+        # (Re)build when crossing the threshold and whenever the index has doubled since.
+        # Rows below n are never rewritten, so the build can read them without the lock.
+        self._ivf_build = threading.Thread(target=self._run_ivf_build, args=(matrix[:n],), name="ivf-build", daemon=True)
+        self._ivf_build.start()
+
+    def _run_ivf_build(self, matrix):
+        try:
+            ivf = self._build_ivf(matrix)
+            self._ivf = ivf  # Readers pick up the new lists on their next search
+        except Exception as e:
+            print(f"⚠️ Vector index: IVF build failed: {e}")
+        finally:
+            with self._lock:
+                self._ivf_build = None
+                self._maybe_update_ivf()  # The index may have doubled again meanwhile
+
+    @staticmethod
+    def _build_ivf(matrix, iterations=8, sample=20000):
+        n = len(matrix)
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        train = matrix[rng.choice(n, min(n, sample), replace=False)]
+        centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = train[assign == c]
+                if len(members): centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        assign = np.concatenate([np.argmax(chunk @ centroids.T, axis=1) for chunk in np.array_split(matrix, max(1, n // 50000))])
+        lists = [np.flatnonzero(assign == c) for c in range(nlist)]
+        print(f"🧭 Vector index: IVF built with {nlist} lists over {n} rows")
+        return centroids, lists, n
+
+VECTOR_INDEX = VectorIndex()
+
+def index_logged_item(log_id, embedding_blob):
+    VECTOR_INDEX.add(log_id, decode_embedding(embedding_blob))